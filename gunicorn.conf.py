@@ -0,0 +1,47 @@
+"""Gunicorn configuration, read from the working directory.
+
+    gunicorn mngt.wsgi:app
+
+Runs GUNICORN_WORKERS processes of GUNICORN_THREADS threads each by default,
+see mngt.serving for the worker classes. The settings are checked against
+the database pool before any worker starts.
+"""
+import os
+import sys
+
+# The config is loaded before gunicorn changes to --chdir.
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mngt.config import Config  # noqa: E402
+from mngt.serving import check_worker_settings, worker_settings_from_env  # noqa: E402
+
+_settings = worker_settings_from_env()
+
+bind = os.getenv("GUNICORN_BIND", "localhost:5000")
+workers = _settings.workers
+worker_class = _settings.worker_class
+# Gunicorn silently turns sync workers with threads into gthread workers.
+threads = _settings.threads if worker_class == "gthread" else 1
+worker_connections = _settings.worker_connections
+# Requests are fast, anything this slow is stuck.
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "30"))
+keepalive = 5
+accesslog = "-"
+errorlog = "-"
+
+
+def on_starting(server) -> None:  # noqa: ANN001
+    """Refuse to start with more concurrent requests per worker than pooled connections."""
+    problems = check_worker_settings(_settings, Config.SQLALCHEMY_POOL_SIZE, Config.SQLALCHEMY_MAX_OVERFLOW)
+    for problem in problems:
+        server.log.error(problem)
+    if problems:
+        raise SystemExit(1)
+    server.log.info(
+        f"{_settings.workers} {_settings.worker_class} workers serving {_settings.concurrency} requests each"
+    )
+
+
+def post_fork(server, worker) -> None:  # noqa: ANN001
+    """Log the worker, its engine and cache connections are opened lazily in the worker itself."""
+    server.log.info(f"Worker {worker.pid} ready ({_settings.worker_class})")
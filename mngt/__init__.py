@@ -1,3 +1,4 @@
+import os
 from logging.config import dictConfig
 from typing import Optional
 
@@ -32,15 +33,15 @@ dictConfig(
                 "format": "[%(asctime)s] [%(process)d] [%(levelname)s] in %(module)s: %(message)s",
                 "datefmt": "%Y-%m-%d %H:%M:%S %z",
             },
-            "handlers": {
-                "wsgi": {
-                    "class": "logging.StreamHandler",
-                    "stream": "ext://flask.logging.wsgi_errors_stream",
-                    "formatter": "default",
-                }
-            },
-            "root": {"level": "DEBUG", "handlers": ["wsgi"]},
         },
+        "handlers": {
+            "wsgi": {
+                "class": "logging.StreamHandler",
+                "stream": "ext://flask.logging.wsgi_errors_stream",
+                "formatter": "default",
+            }
+        },
+        "root": {"level": os.getenv("LOG_LEVEL", "INFO"), "handlers": ["wsgi"]},
     }
 )
 
@@ -62,13 +63,26 @@ def create_app(test_config: Optional[dict] = None) -> Flask:
     def index() -> Response:
         return render_template("index.html")
 
-    from . import db
+    from . import (
+        assets, cache, compression, db, http_cache, instrumentation, jobs,
+        serialization
+    )
     from .blueprints.conference import conference_views
     from .login_views import login_views
-    from .proposal_api import NewPanel, ProposalDetail, ProposalList
+    from .proposal_api import (
+        ConferenceExport, JobStatus, NewPanel, PanelAssembly, ProposalBatch,
+        ProposalDetail, ProposalList
+    )
 
     api = Api(app, prefix="/api/v1/")
+    api.representation("application/json")(serialization.output_json)
     db.init_app(app)
+    cache.init_app(app)
+    instrumentation.init_app(app)
+    jobs.init_app(app)
+    http_cache.init_app(app)
+    compression.init_app(app)
+    assets.init_app(app)
     login_manager.init_app(app)
     oauth.init_app(app)
 
@@ -79,7 +93,11 @@ def create_app(test_config: Optional[dict] = None) -> Flask:
     # APIs
     api.add_resource(ProposalDetail, "/conferences/<slug>/proposals/<int:proposal_id>")
     api.add_resource(ProposalList, "/conferences/<slug>/proposals")
+    api.add_resource(ProposalBatch, "/conferences/<slug>/proposals/batch")
     api.add_resource(NewPanel, "/conferences/<slug>/panels/new")
+    api.add_resource(PanelAssembly, "/conferences/<slug>/panels/assemble")
+    api.add_resource(ConferenceExport, "/conferences/<slug>/export/<dataset>")
+    api.add_resource(JobStatus, "/jobs/<job_id>")
 
     app.logger.debug("Finalize the app creation")
 
@@ -0,0 +1,338 @@
+"""Automatic assembly of panels from the proposals of a conference.
+
+The proposals are grouped by topic, cut into panels of a few presentations
+and the panels are placed, earliest first, in the time slots of the
+conference window. A slot runs one panel per room, and a presenter is never
+in two panels of the same slot, nor twice in the same panel. The panels the
+conference already has keep their rooms and presenters, and the proposals of
+authors who already present are left out of the draft.
+
+Everything is a linear pass over the proposals (plus a sort), so a draft
+program for thousands of proposals takes well under a second.
+"""
+import math
+import re
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Set
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+
+from .counters import bump_counters
+from .fragment_cache import invalidate_fragments
+from .models import Conference, Panel, Participation, Proposal
+from .scheduling import PanelSlot, load_schedule
+
+ProgressCallback = Callable[[int, int], None]
+
+_WORD = re.compile(r"[^\W\d_]{4,}", re.UNICODE)
+_STOP_WORDS = frozenset(
+    """
+    about after also among analysis another based been being between both case could during each from have
+    into more most other over paper such than that their them then there these they this those through
+    under upon very were what when where which while with within would study studies research thai
+    thailand
+    """.split()
+)
+
+
+class AssemblyOptions(NamedTuple):
+    """How the panels are shaped and placed."""
+
+    presentations_per_panel: int = 4
+    presentation_minutes: int = 20
+    gap: int = 5
+    break_minutes: int = 15
+    rooms: int = 1
+    group_by_topic: bool = True
+
+    @property
+    def panel_minutes(self) -> int:
+        """The duration of a full panel, gaps between presentations included."""
+        n = self.presentations_per_panel
+        return n * self.presentation_minutes + (n - 1) * self.gap
+
+
+class ProposalItem(NamedTuple):
+    """The columns of a proposal the assembly looks at."""
+
+    id: int
+    title: str
+    abstract: Optional[str]
+    author_id: Optional[int]
+
+
+class DraftPanel(NamedTuple):
+    """A panel of the draft program."""
+
+    name: str
+    start: datetime
+    duration: int
+    gap: int
+    room: int
+    proposal_ids: List[int]
+    presenter_ids: List[int]
+
+
+class DraftProgram(NamedTuple):
+    """The panels placed in the conference window and the proposals left over."""
+
+    panels: List[DraftPanel]
+    unscheduled: List[int]
+
+    def as_dict(self) -> dict:
+        """Return a JSON-serializable version of the program."""
+        return {
+            "panels": [
+                dict(panel._asdict(), start=panel.start.isoformat()) for panel in self.panels
+            ],
+            "unscheduled": self.unscheduled,
+        }
+
+
+def room_url(room: int) -> str:
+    """Return the room URL the panels of draft room `room` are saved with."""
+    return f"room-{room}"
+
+
+def _terms(proposal: ProposalItem) -> Set[str]:
+    text = f"{proposal.title or ''} {proposal.abstract or ''}".lower()
+    return {word for word in _WORD.findall(text) if word not in _STOP_WORDS}
+
+
+def group_by_topic(proposals: List[ProposalItem]) -> Dict[str, List[ProposalItem]]:
+    """Group the proposals by their most distinctive shared term.
+
+    A term scores higher the fewer proposals use it (inverse document
+    frequency), but it has to be shared by at least two proposals to make a
+    topic. Proposals without such a term are grouped under "".
+    """
+    terms = {proposal.id: _terms(proposal) for proposal in proposals}
+    frequency = Counter(term for proposal_terms in terms.values() for term in proposal_terms)
+    total = len(proposals)
+
+    def score(term: str) -> float:
+        return math.log(total / frequency[term])
+
+    groups: Dict[str, List[ProposalItem]] = defaultdict(list)
+    for proposal in proposals:
+        shared = [term for term in terms[proposal.id] if frequency[term] > 1]
+        # Ties are broken alphabetically so the draft is deterministic.
+        topic = max(shared, key=lambda term: (score(term), term)) if shared else ""
+        groups[topic].append(proposal)
+    return groups
+
+
+def _cut_panels(proposals: List[ProposalItem], size: int) -> List[List[ProposalItem]]:
+    """Cut a run of proposals into panels in which every presenter appears once."""
+    panels: List[List[ProposalItem]] = []
+    open_panels: List[List[ProposalItem]] = []
+    for proposal in proposals:
+        for panel in open_panels:
+            if proposal.author_id is None or all(p.author_id != proposal.author_id for p in panel):
+                panel.append(proposal)
+                break
+        else:
+            panel = [proposal]
+            open_panels.append(panel)
+            panels.append(panel)
+        open_panels = [panel for panel in open_panels if len(panel) < size]
+    return panels
+
+
+def assemble(
+    proposals: List[ProposalItem],
+    begin: datetime,
+    end: datetime,
+    options: AssemblyOptions = AssemblyOptions(),
+    progress: Optional[ProgressCallback] = None,
+    existing: Iterable[PanelSlot] = (),
+) -> DraftProgram:
+    """Pack the proposals into panels placed between `begin` and `end`.
+
+    :param progress: Called with the number of proposals placed so far and the total.
+    :param existing: The panels already scheduled. They take a room and their
+        presenters in every slot they overlap.
+    """
+    if options.group_by_topic:
+        groups = group_by_topic(proposals)
+        # Big topics first, the proposals without a shared topic last.
+        ordered = sorted(groups.items(), key=lambda item: (item[0] == "", -len(item[1]), item[0]))
+    else:
+        ordered = [("", proposals)]
+
+    candidates = []
+    for topic, members in ordered:
+        members = sorted(members, key=lambda p: p.id)
+        for index, members_of_panel in enumerate(_cut_panels(members, options.presentations_per_panel), 1):
+            name = f"{topic.capitalize()} {index}" if topic else None
+            candidates.append((name, members_of_panel))
+
+    step = timedelta(minutes=options.panel_minutes + options.break_minutes)
+    slot_count = 0
+    if end > begin:
+        slot_count = int((end - begin - timedelta(minutes=options.panel_minutes)) // step) + 1
+    slot_count = max(slot_count, 0)
+    panel_length = timedelta(minutes=options.panel_minutes)
+    # Rooms taken, the URLs of those that have one, and presenters busy in each slot.
+    rooms_used = [0] * slot_count
+    room_urls: List[Set[str]] = [set() for _ in range(slot_count)]
+    busy: List[Set[int]] = [set() for _ in range(slot_count)]
+    for panel in existing:
+        first = max(int((panel.start - begin - panel_length) // step), 0)
+        last = min(int((panel.end - begin) // step) + 1, slot_count)
+        for slot in range(first, last):
+            start = begin + slot * step
+            if panel.start < start + panel_length and start < panel.end:
+                rooms_used[slot] += 1
+                busy[slot] |= panel.presenters
+                if panel.room is not None:
+                    room_urls[slot].add(panel.room)
+    # The earliest slot that may still have a free room.
+    first_open = 0
+
+    panels, unscheduled, placed = [], [], 0
+    for name, members in candidates:
+        presenters = {p.author_id for p in members if p.author_id is not None}
+        for slot in range(first_open, slot_count):
+            if rooms_used[slot] < options.rooms and not presenters & busy[slot]:
+                break
+        else:
+            slot = None
+
+        if slot is None:
+            unscheduled.extend(p.id for p in members)
+        else:
+            # At most rooms - 1 are taken, so one of the rooms is free.
+            room = next(n for n in range(1, options.rooms + 1) if room_url(n) not in room_urls[slot])
+            rooms_used[slot] += 1
+            room_urls[slot].add(room_url(room))
+            busy[slot] |= presenters
+            while first_open < slot_count and rooms_used[first_open] >= options.rooms:
+                first_open += 1
+            minutes = len(members) * options.presentation_minutes + (len(members) - 1) * options.gap
+            panels.append(
+                DraftPanel(
+                    name=name or f"Panel {len(panels) + 1}",
+                    start=begin + slot * step,
+                    duration=minutes,
+                    gap=options.gap,
+                    room=room,
+                    proposal_ids=[p.id for p in members],
+                    presenter_ids=[p.author_id for p in members if p.author_id is not None],
+                )
+            )
+
+        placed += len(members)
+        if progress is not None:
+            progress(placed, len(proposals))
+
+    panels.sort(key=lambda panel: (panel.start, panel.room))
+    return DraftProgram(panels, unscheduled)
+
+
+def load_proposals(session: Session, conference_id: int) -> List[ProposalItem]:
+    """Return the non-deleted proposals of a conference."""
+    stmt = (
+        select(Proposal.id, Proposal.title, Proposal.abstract, Proposal.author_id)
+        .where(Proposal.conference_id == conference_id)
+        .where(Proposal.is_deleted == False)  # noqa: E712
+        .order_by(Proposal.id)
+    )
+    return [ProposalItem(*row) for row in session.execute(stmt)]
+
+
+def assemble_conference(
+    session: Session,
+    conference_id: int,
+    options: AssemblyOptions = AssemblyOptions(),
+    progress: Optional[ProgressCallback] = None,
+) -> DraftProgram:
+    """Build a draft program for a conference around the panels it already has.
+
+    The proposals of authors who already present are scheduled, so saving a
+    second draft does not repeat the program.
+    """
+    begin, end = session.execute(
+        select(Conference.begin, Conference.end).where(Conference.id == conference_id)
+    ).one()
+    existing = list(load_schedule(session, conference_id))
+    presenting = {presenter_id for slot in existing for presenter_id in slot.presenters}
+    proposals = [p for p in load_proposals(session, conference_id) if p.author_id not in presenting]
+    return assemble(proposals, begin, end, options, progress, existing)
+
+
+def save_program(session: Session, conference_id: int, program: DraftProgram) -> int:
+    """Create the panels of a draft program and return how many were created.
+
+    The presenters are added to their panels in the order of their proposals.
+    """
+    now = datetime.utcnow()
+    for draft in program.panels:
+        panel_id = session.execute(
+            insert(Panel).values(
+                conference_id=conference_id,
+                name=draft.name,
+                start=draft.start,
+                duration=draft.duration,
+                gap=draft.gap,
+                url=room_url(draft.room),
+                created=now,
+                modified=now,
+            )
+        ).inserted_primary_key[0]
+        if draft.presenter_ids:
+            session.execute(
+                insert(Participation),
+                [
+                    {"panel_id": panel_id, "participant_id": presenter_id, "role": "presenter", "order": order}
+                    for order, presenter_id in enumerate(draft.presenter_ids, 1)
+                ],
+            )
+    bump_counters(session, conference_id, panels=len(program.panels))
+    return len(program.panels)
+
+
+@click.command("assemble-panels")
+@click.argument("slug")
+@click.option("--per-panel", default=4, show_default=True, help="Presentations per panel.")
+@click.option("--minutes", default=20, show_default=True, help="Minutes per presentation.")
+@click.option("--gap", default=5, show_default=True, help="Minutes between presentations.")
+@click.option("--break-minutes", default=15, show_default=True, help="Minutes between panels.")
+@click.option("--rooms", default=1, show_default=True, help="Panels running at the same time.")
+@click.option("--no-topics", is_flag=True, help="Keep the proposals in submission order.")
+@click.option("--save", is_flag=True, help="Create the panels instead of only printing the draft.")
+@with_appcontext
+def assemble_panels_command(
+    slug: str, per_panel: int, minutes: int, gap: int, break_minutes: int, rooms: int, no_topics: bool, save: bool
+) -> None:
+    """Draft a program for the conference SLUG from its proposals."""
+    from .db import get_engine
+
+    options = AssemblyOptions(per_panel, minutes, gap, break_minutes, rooms, not no_topics)
+    with Session(get_engine(), future=True) as session:
+        conference_id = session.execute(select(Conference.id).where(Conference.slug == slug)).scalar()
+        if conference_id is None:
+            raise click.ClickException(f"There is no conference {slug!r}.")
+
+        with click.progressbar(length=1, label="Assembling panels") as bar:
+
+            def progress(done: int, total: int) -> None:
+                bar.length = max(total, 1)
+                bar.update(done - bar.pos)
+
+            program = assemble_conference(session, conference_id, options, progress)
+
+        for panel in program.panels:
+            click.echo(f"{panel.start:%Y-%m-%d %H:%M} room {panel.room}: {panel.name} {panel.proposal_ids}")
+        if program.unscheduled:
+            click.echo(f"{len(program.unscheduled)} proposals did not fit in the conference window.")
+
+        if save:
+            created = save_program(session, conference_id, program)
+            session.commit()
+            invalidate_fragments(conference_id)
+            click.echo(f"Created {created} panels.")
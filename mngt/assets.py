@@ -0,0 +1,193 @@
+"""Fingerprinted CSS and JavaScript bundles.
+
+`flask build-assets` concatenates and minifies the sources of each bundle of
+`BUNDLES` (files of mngt/static, or URLs which are downloaded) into
+`ASSETS_DIR`, named after the hash of their content, e.g. app.3f2a9c1d0b7e.css,
+with gzip (and brotli, when installed) versions next to them. A manifest
+maps the bundles to these names.
+
+Templates link the bundles with `asset_urls`. Their content never changes
+under a name, so they are served from /assets with a cache lifetime of a
+year, and a browser only downloads a bundle again after a build changed it.
+Before any build, `asset_urls` gives the sources themselves.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import urllib.request
+from typing import Dict, List, Optional
+
+import click
+from flask import (
+    Blueprint, Flask, Response, current_app, request, send_from_directory,
+    url_for
+)
+from flask.cli import with_appcontext
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+BUNDLES: Dict[str, List[str]] = {
+    "app.css": [
+        "https://cdn.jsdelivr.net/npm/uikit@3.10.0/dist/css/uikit.min.css",
+        "src/app.css",
+    ],
+    "app.js": [
+        "https://unpkg.com/htmx.org@1.4.1/dist/htmx.min.js",
+        "https://cdn.jsdelivr.net/npm/uikit@3.10.0/dist/js/uikit.min.js",
+        "https://cdn.jsdelivr.net/npm/uikit@3.10.0/dist/js/uikit-icons.min.js",
+    ],
+    "panel.css": ["src/panel.css"],
+    "panel.js": [
+        "https://cdnjs.cloudflare.com/ajax/libs/dragula/3.7.3/dragula.min.js",
+        "src/panel.js",
+    ],
+}
+MANIFEST = "manifest.json"
+ONE_YEAR = 365 * 24 * 3600
+
+assets_views = Blueprint("assets", __name__)
+
+
+def _is_url(source: str) -> bool:
+    return source.startswith(("http://", "https://"))
+
+
+def minify_css(text: str) -> str:
+    """Remove the comments and the whitespace of a stylesheet."""
+    text = re.sub(r"/\*.*?\*/", "", text, flags=re.S)
+    text = re.sub(r"\s+", " ", text)
+    text = re.sub(r"\s*([{};,>])\s*", r"\1", text)
+    text = re.sub(r":\s+", ":", text)
+    return text.replace(";}", "}").strip()
+
+
+def minify_js(text: str) -> str:
+    """Remove the indentation, the blank lines and the comment lines of a script.
+
+    The line breaks are kept so semicolon insertion is unchanged. Our scripts
+    have no multi-line strings, whose indentation this would change.
+    """
+    lines = (line.strip() for line in text.splitlines())
+    return "\n".join(line for line in lines if line and not line.startswith("//"))
+
+
+def _read(source: str, static_folder: str) -> str:
+    if _is_url(source):
+        with urllib.request.urlopen(source, timeout=30) as response:  # noqa: S310
+            return response.read().decode("utf-8")
+    with open(os.path.join(static_folder, source), encoding="utf-8") as f:
+        return f.read()
+
+
+def build_bundle(name: str, sources: List[str], static_folder: str) -> str:
+    """Return the minified content of a bundle.
+
+    Sources which are minified already (.min.css, .min.js) are taken as they are.
+    """
+    parts = []
+    for source in sources:
+        text = _read(source, static_folder)
+        if ".min." not in source:
+            text = minify_css(text) if name.endswith(".css") else minify_js(text)
+        parts.append(text.strip())
+    # A script missing its final semicolon must not run into the next one.
+    return ("\n" if name.endswith(".css") else ";\n").join(parts) + "\n"
+
+
+def build_assets(
+    output_dir: str, static_folder: str, bundles: Optional[Dict[str, List[str]]] = None
+) -> Dict[str, str]:
+    """Write the bundles and their manifest, and return the manifest.
+
+    :param output_dir: Where the bundles go, created if needed.
+    :param static_folder: The folder the sources which are not URLs are relative to.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = {}
+    for name, sources in (bundles or BUNDLES).items():
+        content = build_bundle(name, sources, static_folder).encode("utf-8")
+        stem, ext = os.path.splitext(name)
+        filename = f"{stem}.{hashlib.sha256(content).hexdigest()[:12]}{ext}"
+        path = os.path.join(output_dir, filename)
+        with open(path, "wb") as f:
+            f.write(content)
+        with open(path + ".gz", "wb") as f:
+            f.write(gzip.compress(content, 9, mtime=0))
+        if brotli is not None:
+            with open(path + ".br", "wb") as f:
+                f.write(brotli.compress(content))
+        manifest[name] = filename
+
+    with open(os.path.join(output_dir, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def _output_dir(app: Flask) -> str:
+    return app.config.get("ASSETS_DIR") or os.path.join(app.static_folder, "dist")
+
+
+def _manifest() -> Dict[str, str]:
+    manifest = current_app.extensions.get("assets")
+    if manifest is None or current_app.debug:
+        try:
+            with open(os.path.join(_output_dir(current_app), MANIFEST)) as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            manifest = {}
+        current_app.extensions["assets"] = manifest
+    return manifest
+
+
+def asset_urls(name: str) -> List[str]:
+    """Return the URL of a built bundle, or the URLs of its sources before a build."""
+    filename = _manifest().get(name)
+    if filename is not None:
+        return [url_for("assets.bundle", filename=filename)]
+    return [source if _is_url(source) else url_for("static", filename=source) for source in BUNDLES[name]]
+
+
+@assets_views.route("/assets/<path:filename>")
+def bundle(filename: str) -> Response:
+    """Serve a built bundle, compressed ahead of time when the client accepts it."""
+    directory = _output_dir(current_app)
+    encoding, suffix = None, ""
+    for candidate, extension in (("br", ".br"), ("gzip", ".gz")):
+        if request.accept_encodings[candidate] and os.path.isfile(os.path.join(directory, filename + extension)):
+            encoding, suffix = candidate, extension
+            break
+
+    response = send_from_directory(
+        directory, filename + suffix, mimetype=mimetypes.guess_type(filename)[0], max_age=ONE_YEAR
+    )
+    response.cache_control.immutable = True
+    response.vary.add("Accept-Encoding")
+    if encoding is not None:
+        response.headers["Content-Encoding"] = encoding
+    return response
+
+
+@click.command("build-assets")
+@with_appcontext
+def build_assets_command() -> None:
+    """Build the CSS and JavaScript bundles, downloading the third-party sources."""
+    output_dir = _output_dir(current_app)
+    try:
+        manifest = build_assets(output_dir, current_app.static_folder)
+    except OSError as e:
+        raise click.ClickException(f"Could not build the bundles: {e}")
+    for name, filename in manifest.items():
+        size = os.path.getsize(os.path.join(output_dir, filename))
+        click.echo(f"{name} -> {filename} ({size} bytes)")
+
+
+def init_app(app: Flask) -> None:
+    """Initialize application."""
+    app.register_blueprint(assets_views)
+    app.add_template_global(asset_urls)
@@ -1,209 +1,214 @@
 from datetime import datetime
-from math import ceil
 
 from flask import (
     Response, abort, current_app, flash, redirect, render_template, request,
     url_for
 )
-from sqlalchemy import func
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import load_only, selectinload, undefer_group
 from sqlalchemy.sql.expression import select
 
-from mngt.db import get_engine
+from mngt.counters import bump_counters
+from mngt.db import get_session
 from mngt.forms import NewPanelForm
-from mngt.models import Conference, Panel
+from mngt.fragment_cache import cached_fragment
+from mngt.http_cache import conditional, panel_list_version, panel_version
+from mngt.models import LONG_TEXT, Panel
+from mngt.pagination import paginate
+from mngt.resolvers import ConferenceRef, with_conference
+from mngt.scheduling import (
+    ROOM, describe, editing_schedule, make_slot, reading_schedule
+)
 
 from . import conference_views
 
 
 @conference_views.route("/conferences/<slug>/panels/new", methods=["GET", "POST"])
-def create_panel(slug: str) -> Response:
+@with_conference
+def create_panel(conference: ConferenceRef, slug: str) -> Response:
     """Create a panel for the conference `cid`."""
-    conf_list_page = request.args.get("clp", 1, type=int)
-    # page = request.args.get("page", 1, type=int)
+    conf_list_cursor = request.args.get("clp")
     # TODO: Add param for stating panel after another panel.
     #       The start time of the next panel will then be used.
 
-    engine = get_engine()
-    with Session(engine, future=True) as session:
-        # Get the conference by its slug.
-        conf_get_stmt = select(Conference).where(Conference.slug == slug)
-        conference = session.execute(conf_get_stmt).scalars().first()
-        if conference is None:
-            abort(404)
+    session = get_session()
 
-        form = NewPanelForm(request.form)
+    form = NewPanelForm(request.form)
 
-        if request.method == "POST" and form.validate():
-            panel = Panel()
-            form.populate_obj(panel)
-            panel.conference_id = conference.id
-            panel.created = datetime.utcnow()
-            panel.modified = datetime.utcnow()
+    if request.method == "POST" and form.validate():
+        panel = Panel()
+        form.populate_obj(panel)
+        panel.conference_id = conference.id
+        panel.created = datetime.utcnow()
+        panel.modified = datetime.utcnow()
 
-            # TODO: Couple checks
-            # - Check if the gap is grater than the duration
-            # - Check if the panel is overlaping with the others (may have to allow overlapping
-            #   if that is want the user want.).
-            # - The amount fo time for each presentation will be
+        # Overlapping panels are allowed, the user is only warned about them.
+        with editing_schedule(session, conference.id) as schedule:
+            conflicts = schedule.conflicts_with(make_slot(None, panel.name, panel.start, panel.duration, panel.url))
 
             session.add(panel)
+            bump_counters(session, conference.id, panels=1)
             session.commit()
+            schedule.add(make_slot(panel.id, panel.name, panel.start, panel.duration, panel.url))
 
-            return redirect(url_for("conferences.panel_detail", slug=slug, pid=panel.id))
+        for conflict in conflicts:
+            flash(describe(conflict), "warning")
 
-        return render_template(
-            "conference/panel/create.html",
-            conference=conference,
-            cid=conference.id,
-            slug=slug,
-            conf_list_page=conf_list_page,
-            utcnow=datetime.utcnow(),
-            form=form,
-        )
+        return redirect(url_for("conferences.panel_detail", slug=slug, pid=panel.id))
+
+    return render_template(
+        "conference/panel/create.html",
+        conference=conference,
+        cid=conference.id,
+        slug=slug,
+        conf_list_cursor=conf_list_cursor,
+        utcnow=datetime.utcnow(),
+        form=form,
+    )
 
 
 @conference_views.route("/conferences/<slug>/panels", methods=["GET", "POST"])
-def list_panels(slug: str) -> Response:
+@with_conference
+@conditional(panel_list_version)
+@cached_fragment(per_user=True)
+def list_panels(conference: ConferenceRef, slug: str) -> Response:
     """Return list of panels."""
-    conf_list_page = request.args.get("clp", 1, type=int)
-    page = request.args.get("page", 1, type=int)
+    conf_list_cursor = request.args.get("clp")
+    cursor = request.args.get("cursor")
 
     # TODO: Allow panel to be moved around, and allow
     #       user to save the updated order.
 
-    engine = get_engine()
-    with Session(engine, future=True) as session:
-        # Get the conference by its slug.
-        conf_get_stmt = select(Conference).where(Conference.slug == slug)
-        conference = session.execute(conf_get_stmt).scalars().first()
-        if conference is None:
-            abort(404)
-
-        total_stmt = (
-            select(func.count())
-            .select_from(Panel)
-            .where(Panel.conference_id == conference.id)
-        )
-        limit_stmt = (
-            select(Panel)
-            .where(Panel.conference_id == conference.id)
-            .order_by(Panel.start.asc())
-            .offset((page - 1) * current_app.config["ENTRY_PER_PAGE"])
-            .limit(current_app.config["ENTRY_PER_PAGE"])
-        )
-
-        total = session.execute(total_stmt).scalars().first()
-        panels = session.execute(limit_stmt).scalars().all()
-
-        number_of_pages = int(ceil(total / current_app.config["ENTRY_PER_PAGE"] * 1.0))
-        pagination = {
-            "curr_page": page,
-            "has_prev": page > 1,
-            "has_next": page < number_of_pages,
-            "prev_num": page - 1,  # has_prev should be checked before using this value.
-            "next_num": page + 1,  # has_next should be checked before using this value.
-        }
-        prev_url = (
-            url_for("conferences.list_panels", slug=slug, page=pagination["prev_num"])
-            if pagination["has_prev"]
-            else None
-        )
-        next_url = (
-            url_for("conferences.list_panels", slug=slug, page=pagination["next_num"])
-            if pagination["has_next"]
-            else None
-        )
-        current_app.logger.debug(pagination)
-        current_app.logger.debug(prev_url)
-        current_app.logger.debug(next_url)
-
-        return render_template(
-            "conference/panel/list.html",
-            conference=conference,
-            cid=conference.id,
-            slug=slug,
-            conf_list_page=conf_list_page,
-            items=panels,
-            utcnow=datetime.utcnow(),
-            pagination=pagination,
-            prev_url=prev_url,
-            next_url=next_url,
-        )
+    session = get_session()
+
+    page = paginate(
+        session,
+        select(Panel)
+        .options(load_only(Panel.id, Panel.name, Panel.start))
+        .where(Panel.conference_id == conference.id),
+        (Panel.start, Panel.id),
+        current_app.config["ENTRY_PER_PAGE"],
+        cursor,
+    )
+    prev_url = (
+        url_for("conferences.list_panels", slug=slug, cursor=page.prev_cursor, clp=conf_list_cursor)
+        if page.prev_cursor
+        else None
+    )
+    next_url = (
+        url_for("conferences.list_panels", slug=slug, cursor=page.next_cursor, clp=conf_list_cursor)
+        if page.next_cursor
+        else None
+    )
+
+    return render_template(
+        "conference/panel/list.html",
+        conference=conference,
+        cid=conference.id,
+        slug=slug,
+        conf_list_cursor=conf_list_cursor,
+        items=page.items,
+        utcnow=datetime.utcnow(),
+        cursor=cursor,
+        prev_url=prev_url,
+        next_url=next_url,
+    )
 
 
 @conference_views.route("/conferences/<slug>/panels/<int:pid>", methods=["GET", "POST"])
-def panel_detail(slug: str, pid: int) -> Response:
+@with_conference
+@conditional(panel_version)
+def panel_detail(conference: ConferenceRef, slug: str, pid: int) -> Response:
     """Return panel detail.
 
     TODO: Separate the role for each participant?
     """
-    conf_list_page = request.args.get("clp", 1, type=int)
-
-    engine = get_engine()
-    with Session(engine, future=True) as session:
-        conf_get_stmt = select(Conference).where(Conference.slug == slug)
-        conference = session.execute(conf_get_stmt).scalars().first()
-        if conference is None:
-            abort(404)
-
-        panel_get_stmt = select(Panel).where(Panel.id == pid)
-        panel = session.execute(panel_get_stmt).scalars().first()
-        if panel is None:
-            abort(404)
-
-        return render_template(
-                "conference/panel/detail.html",
-                conference=conference,
-                cid=conference.id,
-                slug=slug,
-                conf_list_page=conf_list_page,
-                panel=panel,
-                utcnow=datetime.utcnow()
-            )
+    conf_list_cursor = request.args.get("clp")
+
+    session = get_session()
+    panel_get_stmt = (
+        select(Panel)
+        .options(selectinload(Panel.participants))
+        .where(Panel.conference_id == conference.id)
+        .where(Panel.id == pid)
+    )
+    panel = session.execute(panel_get_stmt).scalars().first()
+    if panel is None:
+        abort(404)
+
+    return render_template(
+            "conference/panel/detail.html",
+            conference=conference,
+            cid=conference.id,
+            slug=slug,
+            conf_list_cursor=conf_list_cursor,
+            panel=panel,
+            utcnow=datetime.utcnow()
+        )
 
 
 @conference_views.route(
     "/conferences/<slug>/panels/<int:pid>/edit", methods=["GET", "POST"]
 )
-def panel_edit(slug: str, pid: int) -> Response:
+@with_conference
+def panel_edit(conference: ConferenceRef, slug: str, pid: int) -> Response:
     """Return panel detail."""
-    conf_list_page = request.args.get("clp", 1, type=int)
+    conf_list_cursor = request.args.get("clp")
+
+    session = get_session()
+    panel_get_stmt = (
+        select(Panel)
+        .options(undefer_group(LONG_TEXT))
+        .where(Panel.conference_id == conference.id)
+        .where(Panel.id == pid)
+    )
+    panel = session.execute(panel_get_stmt).scalars().first()
+    if panel is None:
+        abort(404)
 
     if request.method == "GET":
-        engine = get_engine()
-        with Session(engine, future=True) as session:
-            conf = session.query(Conference).filter(Conference.slug == slug).first()
-            if conf is None:
-                abort(404)
-
-            panel_get_stmt = select(Panel).where(Panel.id == pid)
-            panel = session.execute(panel_get_stmt).scalars().first()
-            if panel is None:
-                abort(404)
-
-            form = NewPanelForm(obj=panel)
-            return render_template(
-                "conference/panel/edit.html", slug=slug, conference=conf, panel=panel, form=form, conf_list_page=conf_list_page
-            )
+        form = NewPanelForm(obj=panel)
+        return render_template(
+            "conference/panel/edit.html", slug=slug, conference=conference, panel=panel, form=form, conf_list_cursor=conf_list_cursor
+        )
 
     elif request.method == "POST":
         form = NewPanelForm(request.form)
-        if form.validate():
-            engine = get_engine()
-            with Session(engine, future=True) as session:
-                conf = session.query(Conference).filter(Conference.slug == slug).first()
-                if conf is None:
-                    abort(404)
-
-                panel_get_stmt = select(Panel).where(Panel.id == pid)
-                panel = session.execute(panel_get_stmt).scalars().first()
-                if panel is None:
-                    abort(404)
-
-                form.populate_obj(panel)
-                conf.modified = datetime.utcnow()
-                session.commit()
-
-                flash(f"Panel #{conf.id} was successfully modified")
-                return redirect(url_for("conferences.panel_detail", slug=slug, pid=pid))
+        if not form.validate():
+            return render_template(
+                "conference/panel/edit.html", slug=slug, conference=conference, panel=panel, form=form,
+                conf_list_cursor=conf_list_cursor
+            )
+
+        form.populate_obj(panel)
+        panel.modified = datetime.utcnow()
+
+        with editing_schedule(session, conference.id) as schedule:
+            presenters = schedule.get(pid).presenters if pid in schedule else ()
+            slot = make_slot(pid, panel.name, panel.start, panel.duration, panel.url, presenters)
+            conflicts = schedule.conflicts_with(slot)
+            session.commit()
+            schedule.add(slot)
+
+        flash(f"Panel #{pid} was successfully modified")
+        for conflict in conflicts:
+            flash(describe(conflict), "warning")
+        return redirect(url_for("conferences.panel_detail", slug=slug, pid=pid))
+
+
+@conference_views.route("/conferences/<slug>/panels/conflicts", methods=["GET"])
+@with_conference
+def panel_conflicts(conference: ConferenceRef, slug: str) -> Response:
+    """Return the panels that share a room or a presenter at the same time."""
+    conf_list_cursor = request.args.get("clp")
+
+    with reading_schedule(get_session(), conference.id) as schedule:
+        conflicts, panel_total = schedule.report(), len(schedule)
+    return render_template(
+        "conference/panel/conflicts.html",
+        conference=conference,
+        slug=slug,
+        conf_list_cursor=conf_list_cursor,
+        conflicts=conflicts,
+        panel_total=panel_total,
+        room_kind=ROOM,
+    )
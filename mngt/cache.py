@@ -0,0 +1,406 @@
+"""Caching shared by the workers of the app.
+
+`Cache` is what the app uses. Values are pickled into a backend:
+
+- `LocalBackend`, an LRU in the process, for a single worker and the tests.
+- `SQLiteBackend`, a file shared by the processes of a host.
+- `RedisBackend`, a Redis server, or anything speaking its protocol.
+
+With a shared backend the recently read entries are also kept in a small LRU
+in each process. Deleting a key, or bumping a generation, publishes an
+invalidation event through the backend, and every process reads the new
+events at the start of its requests to drop those keys from its LRU. So a
+worker never keeps serving an entry that another worker invalidated.
+
+The backend is chosen with `CACHE_BACKEND` ("local", "sqlite" or "redis")
+and `CACHE_URL` (the SQLite file or the Redis URL).
+"""
+import os
+import pickle  # noqa: S403
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional
+
+from flask import Flask, current_app
+
+_MISSING = object()
+
+
+class TTLCache:
+    """A thread-safe LRU cache whose entries expire after `ttl` seconds.
+
+    :param maxsize: The number of entries kept before the least recently used is evicted.
+    :param ttl: The lifetime of an entry in seconds.
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: float = 60.0) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value, or `default` if it is missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """Store a value, evicting the least recently used entry when full."""
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        """Drop an entry if present."""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """Drop every entry."""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class LocalBackend:
+    """Backend keeping the entries in the process."""
+
+    shared = False
+
+    def __init__(self, maxsize: int = 4096) -> None:
+        # The entries carry their own TTL, this one is only a fallback.
+        self._entries = TTLCache(maxsize=maxsize, ttl=300)
+        # Counters are never evicted, a generation going back to 0 would revive old entries.
+        self._counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Return the value of a key."""
+        if key in self._counters:
+            return str(self._counters[key]).encode()
+        return self._entries.get(key)
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        """Store a value, for `ttl` seconds or forever."""
+        self._entries.set(key, value, ttl if ttl is not None else float("inf"))
+
+    def delete(self, key: str) -> None:
+        """Drop a key."""
+        self._counters.pop(key, None)
+        self._entries.delete(key)
+
+    def incr(self, key: str) -> int:
+        """Increment the integer stored at a key, starting from 0."""
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def publish(self, key: str) -> None:
+        """Announce that a key was invalidated, nobody else needs to know."""
+
+    def poll(self) -> List[str]:
+        """Return the keys invalidated by the other processes."""
+        return []
+
+
+class SQLiteBackend:
+    """Backend shared by the processes of a host through a SQLite file.
+
+    :param path: The database file, created if needed.
+    :param maxsize: The number of entries kept, the ones expiring first are evicted first.
+    """
+
+    shared = True
+
+    _SCHEMA = [
+        "CREATE TABLE IF NOT EXISTS entry (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS ix_entry_expires ON entry (expires)",
+        "CREATE TABLE IF NOT EXISTS event (id INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT NOT NULL, created REAL NOT NULL)",
+    ]
+    # Expired entries and old events are purged once every this many writes.
+    _PURGE_EVERY = 100
+    # How long the invalidation events are kept, processes polling less often miss them.
+    _EVENT_RETENTION = 600
+    _FOREVER = 1e18
+
+    def __init__(self, path: str, maxsize: int = 10000) -> None:
+        self.path = path
+        self.maxsize = maxsize
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._pid: Optional[int] = None
+        self._last_event = 0
+        conn = self._connection()
+        for ddl in self._SCHEMA:
+            conn.execute(ddl)
+
+    def _connection(self) -> sqlite3.Connection:
+        # Connections are per thread, and per process: a forked worker opens its own.
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Return the value of a key."""
+        row = self._connection().execute(
+            "SELECT value FROM entry WHERE key = ? AND expires > ?", (key, time.time())
+        ).fetchone()
+        return row[0] if row is not None else None
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        """Store a value, for `ttl` seconds or forever."""
+        expires = time.time() + ttl if ttl is not None else self._FOREVER
+        self._connection().execute(
+            "INSERT OR REPLACE INTO entry (key, value, expires) VALUES (?, ?, ?)", (key, value, expires)
+        )
+        self._writes += 1
+        if self._writes % self._PURGE_EVERY == 0:
+            self.purge()
+
+    def delete(self, key: str) -> None:
+        """Drop a key."""
+        self._connection().execute("DELETE FROM entry WHERE key = ?", (key,))
+
+    def incr(self, key: str) -> int:
+        """Increment the integer stored at a key, starting from 0."""
+        conn = self._connection()
+        # RETURNING needs SQLite 3.35, a transaction does the same on any version.
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("INSERT OR IGNORE INTO entry (key, value, expires) VALUES (?, 0, ?)", (key, self._FOREVER))
+            conn.execute("UPDATE entry SET value = CAST(value AS INTEGER) + 1 WHERE key = ?", (key,))
+            value = conn.execute("SELECT value FROM entry WHERE key = ?", (key,)).fetchone()[0]
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return int(value)
+
+    def purge(self) -> None:
+        """Drop the expired entries, the ones above `maxsize` and the old events."""
+        conn = self._connection()
+        now = time.time()
+        conn.execute("DELETE FROM entry WHERE expires <= ?", (now,))
+        conn.execute(
+            "DELETE FROM entry WHERE key IN (SELECT key FROM entry ORDER BY expires DESC LIMIT -1 OFFSET ?)",
+            (self.maxsize,),
+        )
+        conn.execute("DELETE FROM event WHERE created < ?", (now - self._EVENT_RETENTION,))
+
+    def publish(self, key: str) -> None:
+        """Announce to every process that a key was invalidated."""
+        self._connection().execute("INSERT INTO event (key, created) VALUES (?, ?)", (key, time.time()))
+
+    def poll(self) -> List[str]:
+        """Return the keys invalidated since the last poll of this process."""
+        conn = self._connection()
+        with self._lock:
+            if self._pid != os.getpid():
+                # Only the events published from now on are news to a new process.
+                self._pid = os.getpid()
+                self._last_event = conn.execute("SELECT COALESCE(MAX(id), 0) FROM event").fetchone()[0]
+                return []
+            rows = conn.execute("SELECT id, key FROM event WHERE id > ? ORDER BY id", (self._last_event,)).fetchall()
+            if rows:
+                self._last_event = rows[-1][0]
+        return [key for _, key in rows]
+
+
+class RedisBackend:
+    """Backend shared through a Redis server.
+
+    Invalidation events go through a pub/sub channel.
+
+    :param client: A `redis.Redis` client, or any object with the same methods.
+    :param prefix: Prepended to the keys and the channel, so several apps can share a server.
+    """
+
+    shared = True
+
+    def __init__(self, client: Any, prefix: str = "mngt:") -> None:
+        self.client = client
+        self.prefix = prefix
+        self.channel = f"{prefix}invalidate"
+        self._lock = threading.Lock()
+        self._pubsub: Any = None
+        self._pid: Optional[int] = None
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs) -> "RedisBackend":
+        """Connect to the server at `url`, this needs the `redis` package."""
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("CACHE_BACKEND=redis needs the redis package, pip install redis") from None
+        return cls(redis.Redis.from_url(url), **kwargs)
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Return the value of a key."""
+        return self.client.get(self.prefix + key)
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        """Store a value, for `ttl` seconds or forever."""
+        self.client.set(self.prefix + key, value, ex=max(1, int(ttl)) if ttl is not None else None)
+
+    def delete(self, key: str) -> None:
+        """Drop a key."""
+        self.client.delete(self.prefix + key)
+
+    def incr(self, key: str) -> int:
+        """Increment the integer stored at a key, starting from 0."""
+        return int(self.client.incr(self.prefix + key))
+
+    def publish(self, key: str) -> None:
+        """Announce to every process that a key was invalidated."""
+        self.client.publish(self.channel, key)
+
+    def poll(self) -> List[str]:
+        """Return the keys invalidated since the last poll of this process."""
+        keys = []
+        with self._lock:
+            if self._pid != os.getpid():
+                # A subscription is a connection, each process needs its own.
+                self._pid = os.getpid()
+                self._pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                self._pubsub.subscribe(self.channel)
+            while True:
+                message = self._pubsub.get_message(timeout=0)
+                if message is None:
+                    break
+                data = message["data"]
+                keys.append(data.decode() if isinstance(data, bytes) else data)
+        return keys
+
+
+class Cache:
+    """Pickled values in a backend, fronted by a process LRU when the backend is shared.
+
+    :param backend: Where the values are stored.
+    :param local_size: The number of entries of the process LRU, 0 disables it.
+    :param local_ttl: How long the process LRU keeps an entry. It is also the longest
+        a process can miss an invalidation, e.g. in a thread that never polls.
+    """
+
+    def __init__(self, backend: Any, local_size: int = 1024, local_ttl: float = 5) -> None:
+        self.backend = backend
+        self._local = TTLCache(maxsize=local_size, ttl=local_ttl) if backend.shared and local_size else None
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Return the value of a key, or `default` if it is missing or expired."""
+        if self._local is not None:
+            value = self._local.get(key, _MISSING)
+            if value is not _MISSING:
+                return value
+        raw = self.backend.get(key)
+        if raw is None:
+            return default
+        value = pickle.loads(raw)  # noqa: S301
+        if self._local is not None:
+            self._local.set(key, value)
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """Store a value, for `ttl` seconds or until it is deleted.
+
+        Other processes may keep serving the value they read before, a value
+        that changed has to be deleted.
+        """
+        self.backend.set(key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), ttl)
+        if self._local is not None:
+            self._local.set(key, value)
+
+    def delete(self, key: str) -> None:
+        """Drop a key in every process."""
+        self.backend.delete(key)
+        self._invalidate(key)
+
+    def generation(self, name: str) -> int:
+        """Return the generation of `name`, a counter that is part of the keys of a group of entries."""
+        key = f"generation:{name}"
+        if self._local is not None:
+            value = self._local.get(key)
+            if value is not None:
+                return value
+        raw = self.backend.get(key)
+        value = int(raw) if raw is not None else 0
+        if self._local is not None:
+            self._local.set(key, value)
+        return value
+
+    def bump(self, name: str) -> int:
+        """Move `name` to its next generation, which makes its group of entries unreachable.
+
+        :return: The new generation.
+        """
+        key = f"generation:{name}"
+        value = int(self.backend.incr(key))
+        self._invalidate(key)
+        return value
+
+    def _invalidate(self, key: str) -> None:
+        if self._local is not None:
+            self._local.delete(key)
+            self.backend.publish(key)
+
+    def sync(self) -> None:
+        """Drop the entries that other processes invalidated."""
+        if self._local is not None:
+            for key in self.backend.poll():
+                self._local.delete(key)
+
+    def clear_local(self) -> None:
+        """Drop the entries of the process LRU."""
+        if self._local is not None:
+            self._local.clear()
+
+
+def get_cache() -> Cache:
+    """Return the cache of the current app."""
+    return current_app.extensions["cache"]
+
+
+def make_backend(app: Flask) -> Any:
+    """Return the backend configured by `CACHE_BACKEND` and `CACHE_URL`."""
+    name = app.config.get("CACHE_BACKEND", "local")
+    url = app.config.get("CACHE_URL")
+    size = app.config.get("CACHE_SIZE", 4096)
+    if name == "local":
+        return LocalBackend(maxsize=size)
+    if name == "sqlite":
+        path = url or os.path.join(app.instance_path, "cache.db")
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        return SQLiteBackend(path, maxsize=size)
+    if name == "redis":
+        return RedisBackend.from_url(url or "redis://localhost:6379/0")
+    raise ValueError(f"Unknown CACHE_BACKEND {name!r}")
+
+
+def init_app(app: Flask) -> None:
+    """Initialize application."""
+    cache = Cache(
+        make_backend(app),
+        local_size=app.config.get("CACHE_LOCAL_SIZE", 1024),
+        local_ttl=app.config.get("CACHE_LOCAL_TTL", 5),
+    )
+    app.extensions["cache"] = cache
+    app.before_request(cache.sync)
@@ -0,0 +1,102 @@
+"""Compression of the responses.
+
+Text responses (`COMPRESS_MIMETYPES`) of at least `COMPRESS_MIN_SIZE` bytes
+are compressed with brotli when the client accepts it and the brotli package
+is installed, with gzip otherwise. Streamed responses, like the exports, are
+compressed chunk by chunk as they are sent. The bundles of `mngt.assets` are
+compressed once when they are built.
+"""
+import zlib
+from typing import Iterable, Iterator, Optional
+
+from flask import Flask, Response, current_app, request
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+COMPRESS_MIMETYPES = (
+    "text/html",
+    "text/css",
+    "text/csv",
+    "text/plain",
+    "application/javascript",
+    "application/json",
+    "application/x-ndjson",
+    "image/svg+xml",
+)
+# Cheap enough to run on every response, brotli 4 still beats gzip 6 on size.
+BROTLI_QUALITY = 4
+
+
+def _encoding() -> Optional[str]:
+    accepted = request.accept_encodings
+    if brotli is not None and accepted["br"]:
+        return "br"
+    if accepted["gzip"]:
+        return "gzip"
+    return None
+
+
+def _compressor(encoding: str, level: int) -> object:
+    if encoding == "br":
+        return brotli.Compressor(quality=BROTLI_QUALITY)
+    # wbits 31 writes the gzip header and trailer.
+    return zlib.compressobj(level, zlib.DEFLATED, 31)
+
+
+def compress(data: bytes, encoding: str, level: int = 6) -> bytes:
+    """Return the data compressed with "br" or "gzip"."""
+    compressor = _compressor(encoding, level)
+    if encoding == "br":
+        return compressor.process(data) + compressor.finish()
+    return compressor.compress(data) + compressor.flush()
+
+
+def _compress_stream(chunks: Iterable[bytes], encoding: str, level: int) -> Iterator[bytes]:
+    compressor = _compressor(encoding, level)
+    try:
+        for chunk in chunks:
+            data = compressor.process(chunk) if encoding == "br" else compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.finish() if encoding == "br" else compressor.flush()
+    finally:
+        # Closing the stream tears down the request context it keeps.
+        close = getattr(chunks, "close", None)
+        if close is not None:
+            close()
+
+
+def _compress_response(response: Response) -> Response:
+    if (
+        response.direct_passthrough
+        or response.status_code < 200
+        or response.status_code in (204, 206, 304)
+        or request.method == "HEAD"
+        or "Content-Encoding" in response.headers
+        or response.mimetype not in current_app.config.get("COMPRESS_MIMETYPES", COMPRESS_MIMETYPES)
+    ):
+        return response
+    response.vary.add("Accept-Encoding")
+    encoding = _encoding()
+    if encoding is None:
+        return response
+
+    level = current_app.config.get("COMPRESS_LEVEL", 6)
+    if response.is_streamed:
+        response.response = _compress_stream(response.response, encoding, level)
+        response.headers.pop("Content-Length", None)
+    else:
+        data = response.get_data()
+        if len(data) < current_app.config.get("COMPRESS_MIN_SIZE", 500):
+            return response
+        response.set_data(compress(data, encoding, level))
+    response.headers["Content-Encoding"] = encoding
+    return response
+
+
+def init_app(app: Flask) -> None:
+    """Initialize application."""
+    app.after_request(_compress_response)
@@ -11,6 +11,45 @@ class Config:
     # "sqlite+pysqlite://" is for in-memory.
     # "sqlite+pysqlite:///" is for file.
     SQLALCHEMY_DATABASE_URI = os.getenv("DATABASE_URI", "")
+    # Connection pool of the per-process engine. Ignored for in-memory SQLite.
+    SQLALCHEMY_POOL_SIZE = int(os.getenv("DATABASE_POOL_SIZE", "5"))
+    SQLALCHEMY_MAX_OVERFLOW = int(os.getenv("DATABASE_MAX_OVERFLOW", "10"))
+    SQLALCHEMY_POOL_PRE_PING = True if os.getenv("DATABASE_POOL_PRE_PING", "True") == "True" else False
+    SQLALCHEMY_POOL_RECYCLE = int(os.getenv("DATABASE_POOL_RECYCLE", "1800"))
+    # Log every SQL statement, for development only.
+    SQLALCHEMY_ECHO = True if os.getenv("DATABASE_ECHO", "False") == "True" else False
+    # Statements slower than this are logged, see mngt.instrumentation.
+    SLOW_QUERY_THRESHOLD_MS = int(os.getenv("SLOW_QUERY_THRESHOLD_MS", "100"))
+    # Fraction of the requests whose query statistics are logged.
+    QUERY_LOG_SAMPLE_RATE = float(os.getenv("QUERY_LOG_SAMPLE_RATE", "0.01"))
+    # Send the query statistics back in a Server-Timing header.
+    SERVER_TIMING = True if os.getenv("SERVER_TIMING", "False") == "True" else False
     AZURE_CLIENT_ID = os.getenv("AZURE_CLIENT_ID", "")
     AZURE_CLIENT_SECRET = os.getenv("AZURE_CLIENT_SECRET", "")
     ENTRY_PER_PAGE = 10
+    SEARCH_RESULT_LIMIT = 25
+    # The cache shared by the workers: "local" (each process on its own), "sqlite" (the
+    # processes of a host, CACHE_URL is the file) or "redis" (CACHE_URL is the server).
+    CACHE_BACKEND = os.getenv("CACHE_BACKEND", "local")
+    CACHE_URL = os.getenv("CACHE_URL", "")
+    CACHE_SIZE = int(os.getenv("CACHE_SIZE", "4096"))
+    # Entries read from a shared backend are also kept this long (seconds) in each process.
+    CACHE_LOCAL_SIZE = int(os.getenv("CACHE_LOCAL_SIZE", "1024"))
+    CACHE_LOCAL_TTL = int(os.getenv("CACHE_LOCAL_TTL", "5"))
+    # How long conferences resolved from the URL slug, and their counters, are cached.
+    CONFERENCE_CACHE_TTL = int(os.getenv("CONFERENCE_CACHE_TTL", "60"))
+    # How long rendered search results and list pages are cached, 0 disables it.
+    FRAGMENT_CACHE_TTL = int(os.getenv("FRAGMENT_CACHE_TTL", "300"))
+    # Threads running background jobs in each process, and how long finished jobs are kept (seconds).
+    JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+    JOB_RETENTION = int(os.getenv("JOB_RETENTION", "3600"))
+    # Text responses at least this large (bytes) are compressed, with this gzip level (1-9).
+    COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "500"))
+    COMPRESS_LEVEL = int(os.getenv("COMPRESS_LEVEL", "6"))
+    # Where `flask build-assets` writes the bundles, mngt/static/dist by default.
+    ASSETS_DIR = os.getenv("ASSETS_DIR", "")
+    # Cache-Control of the conditional GET views, by endpoint. "no-cache" lets browsers
+    # keep the page but revalidate it with its ETag every time.
+    HTTP_CACHE_CONTROL = {
+        "default": os.getenv("HTTP_CACHE_CONTROL", "private, no-cache"),
+    }
@@ -0,0 +1,130 @@
+"""Denormalized per-conference counters.
+
+`Conference.proposal_count`, `panel_count` and `participant_count` are kept
+up to date by the code that writes the rows, in the same transaction, so the
+conference list can sort by them and the detail page does not count.
+`recount-conferences` recomputes them from the tables if they ever drift.
+
+`conference_counts` reads them through the app cache, under the fragment
+generation of the conference (see `mngt.fragment_cache`). The writers move it
+on with `invalidate_fragments` once they committed, so a read between the
+bump and the commit cannot keep the old counts cached.
+"""
+from typing import NamedTuple, Optional, Union
+
+import click
+from flask import current_app, has_app_context
+from flask.cli import with_appcontext
+from sqlalchemy import func, select, update
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from .cache import get_cache
+from .fragment_cache import fragment_generation
+from .models import Conference, Panel, Participant, Proposal
+
+
+class ConferenceCounts(NamedTuple):
+    """The counters of a conference."""
+
+    proposals: int
+    panels: int
+    participants: int
+
+
+def _counts_key(conference_id: int) -> str:
+    return f"counts:{get_cache().generation('counts')}:{conference_id}:{fragment_generation(conference_id)}"
+
+
+def invalidate_counts(conference_id: Optional[int] = None) -> None:
+    """Forget the cached counters of one conference, or of every conference.
+
+    Call it once the changed counters are committed.
+    """
+    if not has_app_context():
+        return
+    if conference_id is None:
+        get_cache().bump("counts")
+    else:
+        get_cache().delete(_counts_key(conference_id))
+
+
+def conference_counts(session: Session, conference_id: int) -> ConferenceCounts:
+    """Return the counters of a conference."""
+    cache = get_cache()
+    key = _counts_key(conference_id)
+    counts = cache.get(key)
+    if counts is None:
+        counts = ConferenceCounts(
+            *session.execute(
+                select(Conference.proposal_count, Conference.panel_count, Conference.participant_count).where(
+                    Conference.id == conference_id
+                )
+            ).one()
+        )
+        cache.set(key, counts, current_app.config.get("CONFERENCE_CACHE_TTL", 60))
+    return counts
+
+
+def bump_counters(
+    conn: Union[Connection, Session],
+    conference_id: int,
+    proposals: int = 0,
+    panels: int = 0,
+    participants: int = 0,
+) -> None:
+    """Add the given deltas to the counters of a conference.
+
+    The increment is done by the database so concurrent writers do not lose updates.
+    The caller commits, then calls `invalidate_fragments`, which drops the cached counts.
+    """
+    values = {}
+    if proposals:
+        values["proposal_count"] = Conference.proposal_count + proposals
+    if panels:
+        values["panel_count"] = Conference.panel_count + panels
+    if participants:
+        values["participant_count"] = Conference.participant_count + participants
+    if values:
+        conn.execute(update(Conference).where(Conference.id == conference_id).values(**values))
+
+
+def recount(conn: Union[Connection, Session], conference_id: Optional[int] = None) -> None:
+    """Recompute the counters of one conference, or of every conference.
+
+    The caller commits, then calls `invalidate_counts`.
+    """
+    proposal_count = (
+        select(func.count())
+        .select_from(Proposal)
+        .where(Proposal.conference_id == Conference.id)
+        .where(Proposal.is_deleted == False)  # noqa: E712
+        .scalar_subquery()
+    )
+    panel_count = (
+        select(func.count()).select_from(Panel).where(Panel.conference_id == Conference.id).scalar_subquery()
+    )
+    participant_count = (
+        select(func.count())
+        .select_from(Participant)
+        .where(Participant.conference_id == Conference.id)
+        .scalar_subquery()
+    )
+    stmt = update(Conference).values(
+        proposal_count=proposal_count, panel_count=panel_count, participant_count=participant_count
+    )
+    if conference_id is not None:
+        stmt = stmt.where(Conference.id == conference_id)
+    conn.execute(stmt.execution_options(synchronize_session=False))
+
+
+@click.command("recount-conferences")
+@with_appcontext
+def recount_command() -> None:
+    """Recompute the proposal, panel and participant counters of every conference."""
+    from .db import get_engine
+
+    with get_engine().begin() as conn:
+        recount(conn)
+    invalidate_counts()
+    click.echo("Recounted the conferences.")
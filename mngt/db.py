@@ -2,19 +2,21 @@
 
 :author: Krerkkiat Chusap
 """
+import os
 import sys
+import threading
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Tuple
+from typing import Any, Dict, List, Mapping, Optional
 
 import arrow
 import click
 from flask import Flask, current_app, g
 from flask.cli import with_appcontext
-from openpyxl import load_workbook
-from sqlalchemy import create_engine
-from sqlalchemy.engine import Engine
+from sqlalchemy import bindparam, create_engine, inspect, select, update
+from sqlalchemy.engine import Connection, Engine, make_url
 from sqlalchemy.orm import Session
+from sqlalchemy.pool import QueuePool
 
 # The password is not used.
 _users = {
@@ -24,6 +26,7 @@ _users = {
 _conferences = [
     {
         "name": "COTS 2021",
+        "slug": "cots-2021",
         "description": "2021 Meeting of the Council on Thai Studies (COTS)",
         "begin": arrow.get(datetime(2021, 11, 12, 16, 30), "US/Eastern")
         .to("utc")
@@ -82,192 +85,140 @@ Siam, and subsequently adapted the idea to suit its own political purposes.",
 ]
 
 
-def get_engine() -> Engine:
-    """Initialize engine.
-
-    :rtype: sqlalchemy.engine.Engine
-    """
-    if "engine" not in g:
-        g.engine = create_engine(
-            current_app.config["SQLALCHEMY_DATABASE_URI"], echo=True, future=True
-        )
-    return g.engine
+# One engine (and therefore one connection pool) per database URI per process.
+_engines: Dict[str, Engine] = {}
+_engines_lock = threading.Lock()
+# Engines inherited from the parent process across a fork. They are kept
+# referenced so the garbage collector does not close connections that
+# still belong to the parent.
+_inherited_engines: List[Engine] = []
 
 
-def close_engine(e: Any = None) -> None:
-    """Close the database connection."""
-    engine = g.pop("engine", None)
-    if engine is not None:
-        engine.dispose()
+def _forget_engines() -> None:
+    """Stop using the engines inherited from the parent process."""
+    _inherited_engines.extend(_engines.values())
+    _engines.clear()
 
 
-def init_db() -> None:
-    """Create table."""
-    engine = get_engine()
+if hasattr(os, "register_at_fork"):
+    # Gunicorn forks its workers; each worker has to build its own pool.
+    os.register_at_fork(after_in_child=_forget_engines)
 
-    from mngt.models import Base
 
-    Base.metadata.create_all(engine)
+def _engine_options(config: Mapping) -> dict:
+    """Build the `create_engine` keyword arguments from the app config."""
+    url = make_url(config["SQLALCHEMY_DATABASE_URI"])
+    options = {"echo": config.get("SQLALCHEMY_ECHO", False), "future": True}
 
+    if url.get_backend_name() == "sqlite":
+        if url.database in (None, "", ":memory:"):
+            # An in-memory database lives and dies with its only connection,
+            # so leave SQLAlchemy's default singleton pool in place.
+            return options
+        # The pysqlite dialect defaults to NullPool for files, which opens a
+        # new connection on every checkout.
+        options["poolclass"] = QueuePool
+        options["connect_args"] = {"check_same_thread": False}
 
-def row_is_all_none_or_empty(row: Tuple) -> bool:
-    """True if the entire row is None or an empty string."""
-    return all(
-        col.value is None or (isinstance(col.value, str) and len(col.value) == 0)
-        for col in row
-    )
+    options["pool_size"] = config.get("SQLALCHEMY_POOL_SIZE", 5)
+    options["max_overflow"] = config.get("SQLALCHEMY_MAX_OVERFLOW", 10)
+    options["pool_pre_ping"] = config.get("SQLALCHEMY_POOL_PRE_PING", True)
+    options["pool_recycle"] = config.get("SQLALCHEMY_POOL_RECYCLE", 1800)
+    return options
 
 
-def get_short_title(title: str) -> str:
-    """Get the short version of a text."""
-    titles = [title, title.split("\n")[0], title.split(".")[0]]
-    lens = [len(title) for title in titles]
-    short_titles = sorted(zip(lens, titles), key=lambda v: v[0])
-    return short_titles[0][1]
+def get_engine() -> Engine:
+    """Return the process-wide engine for the configured database.
 
+    The engine is created on first use and reused by every request handled
+    by this process.
 
-def import_cots2021_proposals(file_path: Path, worksheet_name: str = None) -> None:
-    """Import the COTS 2021's Excel Containing Proposals.
+    :rtype: sqlalchemy.engine.Engine
+    """
+    uri = current_app.config["SQLALCHEMY_DATABASE_URI"]
+    engine = _engines.get(uri)
+    if engine is None:
+        # Threaded workers must not build two pools for the same database.
+        with _engines_lock:
+            engine = _engines.get(uri)
+            if engine is None:
+                engine = create_engine(uri, **_engine_options(current_app.config))
+                _engines[uri] = engine
+    return engine
+
+
+def dispose_engines() -> None:
+    """Close every pooled connection held by this process."""
+    for engine in _engines.values():
+        engine.dispose()
+    _engines.clear()
 
-    :param file_path: The path to the Excel file.
-    :param worksheet_name: The name of the worksheet to import.
 
-    This assumes that the tables are already created.
-    """
-    from . import models
+def get_session() -> Session:
+    """Return the session of the current request.
 
-    click.echo("Opening the workbook ...")
-    wb = load_workbook(file_path, data_only=True)
+    The session is created on first use and closed when the app context is
+    torn down, so views and API resources share it within a request.
 
-    if len(wb.worksheets) == 0:
-        raise Exception("No worksheet found.")
+    :rtype: sqlalchemy.orm.Session
+    """
+    if "db_session" not in g:
+        g.db_session = Session(get_engine(), future=True)
+    return g.db_session
 
-    if worksheet_name is not None:
-        if worksheet_name not in wb.worksheets:
-            raise Exception(f"Worksheet {worksheet_name} not found.")
-        ws = wb.get_sheet_by_name(worksheet_name)
-    else:
-        ws = wb.worksheets[0]
 
-    # For each row, create participant object
-    # if it does not already exist.
-    # Then create the proposal object.
+def close_session(e: Any = None) -> None:
+    """Return the request's connection to the pool."""
+    session = g.pop("db_session", None)
+    if session is not None:
+        session.close()
 
-    participants = []
-    participant_emails = []
 
+def init_db() -> None:
+    """Create the tables of a new database, or bring an existing one up to date."""
     engine = get_engine()
-    with Session(engine, future=True) as session:
-        # NOTE: Hard coded value fot COTS 2021.
-        cot2021_conf = models.Conference(
-            name=_conferences[0]["name"],
-            description=_conferences[0]["description"],
-            slug="cots-2021",
-            begin=_conferences[0]["begin"],
-            end=_conferences[0]["end"],
-            created=datetime.utcnow(),
-            modified=datetime.utcnow(),
-        )
-        session.add(cot2021_conf)
-        session.commit
-
-        # min_row is 1-based index.
-        for row in ws.iter_rows(min_row=2):
-            # if row.participant.email not in participant_emails
-            # create new object.
-            if row_is_all_none_or_empty(row):
-                continue
 
-            if row[1].value is None:
-                print([col.value for col in row])
+    from mngt.migrations import stamp, upgrade
+    from mngt.models import Base
+    from mngt.search import install_search_index
 
-            timestamp, email_address = row[0].value, row[1].value  # noqa: F841
-            first_name, last_name = row[2].value, row[3].value  # noqa: F841
-            affiliation, proposal_type = row[4].value, row[5].value  # noqa: F841
+    # An existing database may predate columns that create_all does not add.
+    new = not inspect(engine).get_table_names()
+    if not new:
+        upgrade(engine)
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        install_search_index(conn)
+    if new:
+        stamp(engine)
 
-            if email_address in participant_emails:
-                participant = None
-                for p in participants:
-                    if p.email == email_address:
-                        participant = p
-                        break
-            else:
-                participant = models.Participant(
-                    email=email_address,
-                    first_name=first_name,
-                    last_name=last_name,
-                    affiliation="" if affiliation is None else affiliation,
-                    created=datetime.utcnow(),
-                    modified=datetime.utcnow(),
-                    conference=cot2021_conf,
-                )
-                participants.append(participant)
-                participant_emails.append(email_address)
-                session.add(participant)
 
-            # create new proposal objets.
-            if (
-                proposal_type
-                == "A proposal for an individual paper, film screening or other presentationtation"
-            ):
-                # Individual presentation.
-                print(f"Process individual presentation proposal from {email_address}")
-
-                abstract = row[6].value
-                first_line = abstract.split("\n")[0]
-                participant.proposals.append(
-                    models.Proposal(
-                        conference=cot2021_conf,
-                        created=datetime.utcnow(),
-                        modified=datetime.utcnow(),
-                        title=first_line,
-                        type=proposal_type,
-                        abstract=abstract,
-                        is_deleted=False,
-                    )
-                )
-            elif proposal_type == "A proposal for a paper panel":
-                # Panel presentation.
-                print(f"Process panel presentation proposal from {email_address}")
-
-                panel_topic = row[7].value
-                panelist_names = row[8].value  # noqa: F841
-                panelist_emails = row[9].value  # noqa: F841
-                panelist_abstracts = row[10].value
-
-                participant.proposals.append(
-                    models.Proposal(
-                        conference=cot2021_conf,
-                        created=datetime.utcnow(),
-                        modified=datetime.utcnow(),
-                        title=panel_topic,
-                        type=proposal_type,
-                        abstract=panelist_abstracts,
-                    )
-                )
-            elif proposal_type == "A proposal for a routable":
-                # Roundtable.
-                print(f"Process roundtable presentation proposal from {email_address}")
-
-                roundtable_names = row[11].value
-                roundtable_emails = row[12].value  # noqa: F841
-
-                short_title = get_short_title(roundtable_names)
-                abstract = ""
-                if short_title != roundtable_names:
-                    abstract = roundtable_names
-
-                participant.proposals.append(
-                    models.Proposal(
-                        conference=cot2021_conf,
-                        created=datetime.utcnow(),
-                        modified=datetime.utcnow(),
-                        title=short_title,
-                        type=proposal_type,
-                        abstract=abstract,
-                    )
-                )
-        session.commit()
+def get_short_title(title: Optional[str]) -> Optional[str]:
+    """Get the short version of a text.
+
+    The shortest of the whole text, its first line and its first sentence.
+    """
+    if title is None:
+        return None
+    return min((title, title.split("\n")[0], title.split(".")[0]), key=len)
+
+
+def backfill_short_titles(conn: Connection, batch_size: int = 1000) -> int:
+    """Recompute the stored short title of every proposal and return the number of proposals."""
+    from .models import Proposal
+
+    last_id, total = 0, 0
+    while True:
+        rows = conn.execute(
+            select(Proposal.id, Proposal.title).where(Proposal.id > last_id).order_by(Proposal.id).limit(batch_size)
+        ).all()
+        if not rows:
+            return total
+        conn.execute(
+            update(Proposal).where(Proposal.id == bindparam("proposal_id")),
+            [{"proposal_id": proposal_id, "short_title": get_short_title(title)} for proposal_id, title in rows],
+        )
+        last_id, total = rows[-1][0], total + len(rows)
 
 
 @click.command("init-db")
@@ -278,72 +229,121 @@ def init_db_comamnd() -> None:
     click.echo("Initialized the database.")
 
 
+@click.command("backfill-short-titles")
+@with_appcontext
+def backfill_short_titles_command() -> None:
+    """Recompute the short title of every proposal."""
+    with get_engine().begin() as conn:
+        total = backfill_short_titles(conn)
+    click.echo(f"Updated the short title of {total} proposals.")
+
+
 @click.command("seed-db")
 @with_appcontext
 def seed_db_command() -> None:
     """Seed the table with some data."""
     from . import models
+    from .counters import invalidate_counts, recount
 
     click.echo("Seeding the database ...")
     engine = get_engine()
     with Session(engine, future=True) as session:
+        now = datetime.utcnow()
         for item in _conferences:
+            conf = session.execute(select(models.Conference).where(models.Conference.slug == item["slug"])).scalar()
+            if conf is not None:
+                click.echo(f"Conference {item['slug']} already exists.")
+                continue
             conf = models.Conference(
                 name=item["name"],
+                slug=item["slug"],
                 description=item["description"],
                 begin=item["begin"],
                 end=item["end"],
+                created=now,
+                modified=now,
             )
             session.add(conf)
 
-        proposal_objects = []
-        for item in _participants:
-            participant = models.Participant(
-                email=item["email"],
-                first_name=item["first_name"],
-                last_name=item["last_name"],
-                affiliation=item["affiliation"],
-                created=datetime.utcnow(),
-                modified=datetime.utcnow(),
-            )
-            session.add(participant)
-
-            for proposal_item in item["proposals"]:
-                participant.proposals.append(
-                    models.Proposal(
-                        created=datetime.utcnow(),
-                        modified=datetime.utcnow(),
-                        title=proposal_item["title"],
-                        type=proposal_item["type"],
-                        abstract=proposal_item["abstract"],
-                    )
+            for participant_item in _participants:
+                participant = models.Participant(
+                    conference=conf,
+                    email=participant_item["email"],
+                    first_name=participant_item["first_name"],
+                    last_name=participant_item["last_name"],
+                    affiliation=participant_item["affiliation"],
+                    created=now,
+                    modified=now,
                 )
+                session.add(participant)
+
+                for proposal_item in participant_item["proposals"]:
+                    participant.proposals.append(
+                        models.Proposal(
+                            conference=conf,
+                            created=now,
+                            modified=now,
+                            title=proposal_item["title"],
+                            type=proposal_item["type"],
+                            abstract=proposal_item["abstract"],
+                            is_deleted=False,
+                        )
+                    )
 
-        session.bulk_save_objects(proposal_objects)
+            session.flush()
+            recount(session, conf.id)
         session.commit()
+        invalidate_counts()
 
 
 @click.command("import-cots2021")
 @click.argument("filepath", type=click.Path(exists=True))
+@click.option("--worksheet", default=None, help="Name of the worksheet to import.")
+@click.option("--chunk-size", default=500, show_default=True, help="Rows written per transaction.")
+@click.option(
+    "--incremental",
+    is_flag=True,
+    help="Skip responses older than the last import. Edits made to older rows of the sheet need a full run.",
+)
 @with_appcontext
-def import_cots2021_proposals_command(filepath: str) -> None:
+def import_cots2021_proposals_command(filepath: str, worksheet: str, chunk_size: int, incremental: bool) -> None:
     """
     A command to import Excel file from Google Form response.
 
+    Running it again only writes the new and edited responses.
+
     :param filepath: The path to Excel file.
     """
+    from .importer import import_cots2021_proposals
+
     if isinstance(filepath, str):
         filepath = Path(filepath)
     if not filepath.is_file():
         click.echo("Supplied path is not a file.")
         sys.exit(-1)
 
-    import_cots2021_proposals(filepath)
+    import_cots2021_proposals(filepath, worksheet_name=worksheet, chunk_size=chunk_size, incremental=incremental)
 
 
 def init_app(app: Flask) -> None:
     """Initialize application."""
-    app.teardown_appcontext(close_engine)
+    from .assembly import assemble_panels_command
+    from .assets import build_assets_command
+    from .counters import recount_command
+    from .export import export_conference_command
+    from .migrations import migrate_db_command
+    from .search import rebuild_search_index_command
+    from .seeder import seed_synthetic_command
+
+    app.teardown_appcontext(close_session)
     app.cli.add_command(init_db_comamnd)
+    app.cli.add_command(migrate_db_command)
     app.cli.add_command(seed_db_command)
+    app.cli.add_command(seed_synthetic_command)
     app.cli.add_command(import_cots2021_proposals_command)
+    app.cli.add_command(rebuild_search_index_command)
+    app.cli.add_command(recount_command)
+    app.cli.add_command(assemble_panels_command)
+    app.cli.add_command(backfill_short_titles_command)
+    app.cli.add_command(export_conference_command)
+    app.cli.add_command(build_assets_command)
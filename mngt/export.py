@@ -0,0 +1,227 @@
+"""Streaming export of the proposals, panels and participants of a conference.
+
+The rows are read in chunks of `EXPORT_YIELD_PER` from a server-side cursor
+(where the database has them) and written out as they come, so an export
+of any size needs the same memory. The formats are:
+
+- "csv": a header line, then a line per row.
+- "ndjson": a JSON object per line, see `mngt.serialization.dumps`.
+- "xlsx": a workbook with a single sheet, built with the write-only mode of
+  openpyxl. The rows go to a temporary file, which is streamed once done.
+"""
+import csv
+import sys
+import tempfile
+from typing import (
+    Callable, Dict, Iterable, Iterator, List, NamedTuple, Sequence
+)
+
+import click
+from flask.cli import with_appcontext
+from openpyxl import Workbook
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+from sqlalchemy.sql.expression import select
+
+from .models import Conference, Panel, Participant, Participation, Proposal
+from .serialization import dumps
+
+EXPORT_YIELD_PER = 1000
+# Rows per chunk of a text export, few enough to start the response early.
+_ROWS_PER_CHUNK = 200
+_FILE_CHUNK_SIZE = 64 * 1024
+# Spreadsheets evaluate a cell starting with one of these, the CSV and XLSX exports quote them.
+_FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+def _proposals(conference_id: int) -> Select:
+    return (
+        select(
+            Proposal.id.label("proposal_id"),
+            Proposal.title,
+            Proposal.type,
+            Proposal.abstract,
+            Proposal.created,
+            Proposal.modified,
+            Participant.id.label("author_id"),
+            Participant.first_name.label("author_first_name"),
+            Participant.last_name.label("author_last_name"),
+            Participant.email.label("author_email"),
+            Participant.affiliation.label("author_affiliation"),
+        )
+        .outerjoin(Participant, Proposal.author_id == Participant.id)
+        .where(Proposal.conference_id == conference_id)
+        .where(Proposal.is_deleted == False)  # noqa: E712
+        .order_by(Proposal.id)
+    )
+
+
+def _panels(conference_id: int) -> Select:
+    # A row per participation, in order, and one for each panel without any.
+    return (
+        select(
+            Panel.id.label("panel_id"),
+            Panel.name,
+            Panel.start,
+            Panel.duration,
+            Panel.gap,
+            Panel.url,
+            Participation.c.order,
+            Participation.c.role,
+            Participant.id.label("participant_id"),
+            Participant.first_name,
+            Participant.last_name,
+            Participant.affiliation,
+        )
+        .select_from(Panel)
+        .outerjoin(Participation, Participation.c.panel_id == Panel.id)
+        .outerjoin(Participant, Participation.c.participant_id == Participant.id)
+        .where(Panel.conference_id == conference_id)
+        .order_by(Panel.start, Panel.id, Participation.c.order, Participation.c.id)
+    )
+
+
+def _participants(conference_id: int) -> Select:
+    return (
+        select(
+            Participant.id.label("participant_id"),
+            Participant.email,
+            Participant.first_name,
+            Participant.last_name,
+            Participant.affiliation,
+            Participant.created,
+            Participant.modified,
+        )
+        .where(Participant.conference_id == conference_id)
+        .order_by(Participant.id)
+    )
+
+
+DATASETS: Dict[str, Callable[[int], Select]] = {
+    "proposals": _proposals,
+    "panels": _panels,
+    "participants": _participants,
+}
+
+
+def _chunks(lines: Iterable[bytes]) -> Iterator[bytes]:
+    chunk: List[bytes] = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) == _ROWS_PER_CHUNK:
+            yield b"".join(chunk)
+            chunk = []
+    if chunk:
+        yield b"".join(chunk)
+
+
+class _Line:
+    """A file whose `write` returns what was written, for `csv.writer`."""
+
+    def write(self, value: str) -> str:
+        return value
+
+
+def _text(value: object) -> object:
+    """Quote text that a spreadsheet would evaluate as a formula."""
+    if isinstance(value, str) and value.startswith(_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def write_csv(columns: Sequence[str], rows: Iterable[Sequence]) -> Iterator[bytes]:
+    """Write the rows as CSV."""
+    writer = csv.writer(_Line())
+    yield writer.writerow(columns).encode()
+    yield from _chunks(writer.writerow([_text(value) for value in row]).encode() for row in rows)
+
+
+def write_ndjson(columns: Sequence[str], rows: Iterable[Sequence]) -> Iterator[bytes]:
+    """Write the rows as newline-delimited JSON objects."""
+    yield from _chunks(dumps(dict(zip(columns, row))) + b"\n" for row in rows)
+
+
+def _cell(value: object) -> object:
+    # Control characters from pasted text make the workbook invalid.
+    return _text(ILLEGAL_CHARACTERS_RE.sub("", value)) if isinstance(value, str) else value
+
+
+def write_xlsx(columns: Sequence[str], rows: Iterable[Sequence], title: str = "Export") -> Iterator[bytes]:
+    """Write the rows as a workbook."""
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title[:31])
+    sheet.append(list(columns))
+    for row in rows:
+        sheet.append([_cell(value) for value in row])
+
+    with tempfile.TemporaryFile() as f:
+        workbook.save(f)
+        f.seek(0)
+        while True:
+            chunk = f.read(_FILE_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+
+class ExportFormat(NamedTuple):
+    """How an export is written and served."""
+
+    mimetype: str
+    write: Callable[..., Iterator[bytes]]
+
+
+FORMATS = {
+    "csv": ExportFormat("text/csv", write_csv),
+    "ndjson": ExportFormat("application/x-ndjson", write_ndjson),
+    "xlsx": ExportFormat("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", write_xlsx),
+}
+
+
+def export_conference(
+    session: Session, conference_id: int, dataset: str, fmt: str, yield_per: int = EXPORT_YIELD_PER
+) -> Iterator[bytes]:
+    """Export a dataset of a conference, chunk by chunk.
+
+    The query runs when the first chunk is asked for, within the context of the caller.
+
+    :param dataset: One of `DATASETS`.
+    :param fmt: One of `FORMATS`.
+    """
+    stmt = DATASETS[dataset](conference_id)
+    columns = [column.key for column in stmt.selected_columns]
+    result = session.execute(stmt.execution_options(yield_per=yield_per))
+    if fmt == "xlsx":
+        yield from FORMATS[fmt].write(columns, result, title=dataset)
+    else:
+        yield from FORMATS[fmt].write(columns, result)
+
+
+def export_filename(slug: str, dataset: str, fmt: str) -> str:
+    """Return the name an export is downloaded as."""
+    return f"{slug}-{dataset}.{fmt}"
+
+
+@click.command("export-conference")
+@click.argument("slug")
+@click.argument("dataset", type=click.Choice(list(DATASETS)))
+@click.option("--format", "fmt", type=click.Choice(list(FORMATS)), default="csv", show_default=True)
+@click.option("--output", "-o", type=click.Path(dir_okay=False, writable=True), help="Defaults to the standard output.")
+@with_appcontext
+def export_conference_command(slug: str, dataset: str, fmt: str, output: str) -> None:
+    """Export the proposals, panels or participants of a conference."""
+    from .db import get_session
+
+    session = get_session()
+    conference_id = session.execute(select(Conference.id).where(Conference.slug == slug)).scalar()
+    if conference_id is None:
+        raise click.ClickException(f"No conference {slug}")
+
+    if output is None and fmt == "xlsx" and sys.stdout.isatty():
+        raise click.ClickException("Refusing to write a workbook to the terminal, use --output")
+    with click.open_file(output or "-", "wb") as f:
+        for chunk in export_conference(session, conference_id, dataset, fmt):
+            f.write(chunk)
+    if output:
+        click.echo(f"Exported the {dataset} of {slug} to {output}", err=True)
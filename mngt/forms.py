@@ -1,7 +1,9 @@
 """Colection of forms."""
 from flask_wtf import FlaskForm
-from wtforms import DateTimeLocalField, IntegerField, SelectField, StringField
-from wtforms.validators import DataRequired
+from wtforms import (
+    DateTimeLocalField, Field, IntegerField, SelectField, StringField
+)
+from wtforms.validators import DataRequired, Optional, ValidationError
 from wtforms.widgets import TextArea
 
 
@@ -39,3 +41,9 @@ class NewPanelForm(FlaskForm):
     )
     duration = IntegerField("Duration", validators=[DataRequired()])
     gap = IntegerField("Gap", validators=[DataRequired()])
+    url = StringField("Room URL", validators=[Optional()])
+
+    def validate_gap(self, field: Field) -> None:
+        """Check that the gap between presentations fits in the panel."""
+        if self.duration.data is not None and field.data is not None and field.data >= self.duration.data:
+            raise ValidationError("The gap must be shorter than the duration of the panel.")
@@ -0,0 +1,95 @@
+"""Cache of rendered pages and htmx fragments.
+
+Entries are keyed on the conference, the endpoint, the normalized query
+string (search terms lower-cased, arguments sorted) and, for full pages, the
+user. Every conference has a generation number that is part of the key:
+writing a proposal, participant or panel bumps it, which makes every cached
+entry of the conference unreachable at once.
+
+The fragments are stored in the app cache (see `mngt.cache`), so with a
+shared backend every worker serves the fragments the others rendered and sees
+their invalidations. `FRAGMENT_CACHE_TTL=0` disables the cache.
+"""
+import hashlib
+from functools import wraps
+from typing import Any, Callable, Optional
+
+import flask_login
+from flask import current_app, has_app_context, request, session
+
+from .cache import get_cache
+from .search import terms
+
+
+def _generation(conference_id: int) -> str:
+    return f"fragments:{conference_id}"
+
+
+def _normalized_args() -> str:
+    args = []
+    for name in sorted(request.args):
+        for value in request.args.getlist(name):
+            if name == "q":
+                value = " ".join(term.lower() for term in terms(value))
+            args.append(f"{name}={value}")
+    return "&".join(args)
+
+
+def cached_fragment(per_user: bool = False) -> Callable:
+    """Serve the rendered response of a conference view from the fragment cache.
+
+    Must be applied below `with_conference`. Only successful GET requests
+    rendering a template (a `str`) are stored.
+
+    :param per_user: Keep a copy per user, for full pages showing who is logged in.
+    """
+
+    def decorator(view: Callable) -> Callable:
+        @wraps(view)
+        def wrapper(*args, **kwargs) -> Any:
+            ttl = current_app.config.get("FRAGMENT_CACHE_TTL", 300)
+            # A page showing flashed messages is for one request only.
+            if not ttl or request.method != "GET" or session.get("_flashes"):
+                return view(*args, **kwargs)
+
+            cache = get_cache()
+            conference_id = kwargs["conference"].id
+            user_id = flask_login.current_user.get_id() if per_user and flask_login.current_user else None
+            key = repr(
+                (
+                    conference_id,
+                    cache.generation(_generation(conference_id)),
+                    request.endpoint,
+                    request.view_args.get("pid"),
+                    _normalized_args(),
+                    user_id,
+                )
+            )
+            key = "fragment:" + hashlib.sha1(key.encode("utf-8")).hexdigest()  # noqa: S303, S324
+
+            fragment = cache.get(key)
+            if fragment is not None:
+                return fragment
+            fragment = view(*args, **kwargs)
+            if isinstance(fragment, str):
+                cache.set(key, fragment, ttl)
+            return fragment
+
+        return wrapper
+
+    return decorator
+
+
+def fragment_generation(conference_id: int) -> int:
+    """Return the generation of the cached entries of a conference, which every write moves on."""
+    return get_cache().generation(_generation(conference_id))
+
+
+def invalidate_fragments(conference_id: int) -> Optional[int]:
+    """Forget the cached pages and fragments of a conference after a write.
+
+    :return: The new generation of the conference, None outside of an app.
+    """
+    if has_app_context():
+        return get_cache().bump(_generation(conference_id))
+    return None
@@ -0,0 +1,168 @@
+"""HTTP validators and conditional GET.
+
+A view decorated with `conditional` first asks its validator for the version
+of what it shows, which is one aggregate query over the `modified` columns.
+The version, the URL and the user make a weak ETag. When the client already
+has that version (`If-None-Match`, or `If-Modified-Since` for the
+last-modified time) the view is not run and 304 is returned, so the page is
+neither queried nor rendered.
+
+The `Cache-Control` header of each endpoint comes from `HTTP_CACHE_CONTROL`,
+keyed by endpoint name with a "default" entry.
+"""
+import hashlib
+from datetime import datetime, timezone
+from functools import wraps
+from typing import Any, Callable, Optional, Tuple
+
+import flask_login
+from flask import Flask, Response, current_app, g, request, session
+from sqlalchemy import func, select
+
+from .db import get_session
+from .models import Conference, Panel, Participant, Participation, Proposal
+from .resolvers import ConferenceRef
+
+# Browsers may keep the page but have to revalidate it every time.
+DEFAULT_CACHE_CONTROL = "private, no-cache"
+
+# The last modification time and whatever else identifies the version.
+Version = Tuple[Optional[datetime], ...]
+
+
+def _etag(version: Version, conference: Optional[ConferenceRef]) -> str:
+    user_id = flask_login.current_user.get_id() if flask_login.current_user else None
+    # Every page shows the name of its conference, renaming it changes them all.
+    conference_modified = conference.modified if conference is not None else None
+    key = repr((request.endpoint, request.full_path, user_id, conference_modified, tuple(version)))
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()  # noqa: S303, S324
+
+
+def _utc(value: Optional[datetime]) -> Optional[datetime]:
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.replace(microsecond=0)
+
+
+def _is_fresh(etag: str, last_modified: Optional[datetime]) -> bool:
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if request.if_modified_since and last_modified is not None:
+        return last_modified <= request.if_modified_since
+    return False
+
+
+def conditional(validator: Callable[..., Optional[Version]]) -> Callable:
+    """Answer GET requests with 304 when the client has the current version.
+
+    :param validator: Called with the keyword arguments of the view, returns the
+        version of the content, or None to skip caching (e.g. when the view
+        is going to 404).
+    """
+
+    def decorator(view: Callable) -> Callable:
+        @wraps(view)
+        def wrapper(*args, **kwargs) -> Any:
+            # A page showing flashed messages must not be served again from the cache.
+            if request.method not in ("GET", "HEAD") or session.get("_flashes"):
+                return view(*args, **kwargs)
+            version = validator(**kwargs)
+            if version is None:
+                return view(*args, **kwargs)
+
+            etag, last_modified = _etag(version, kwargs.get("conference")), _utc(version[0])
+            g.http_cache = (etag, last_modified)
+            if _is_fresh(etag, last_modified):
+                return Response(status=304)
+            return view(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def _set_validators(response: Response) -> Response:
+    validators = g.pop("http_cache", None)
+    if validators is None or response.status_code not in (200, 304):
+        return response
+
+    etag, last_modified = validators
+    response.set_etag(etag, weak=True)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    policies = current_app.config.get("HTTP_CACHE_CONTROL", {"default": DEFAULT_CACHE_CONTROL})
+    policy = policies.get(request.endpoint, policies.get("default"))
+    if policy:
+        response.headers["Cache-Control"] = policy
+    return response
+
+
+def conference_version(conference: ConferenceRef, **kwargs) -> Optional[Version]:
+    """Return the version of a conference and its counters."""
+    return get_session().execute(
+        select(Conference.modified, Conference.proposal_count, Conference.panel_count).where(
+            Conference.id == conference.id
+        )
+    ).first()
+
+
+def _with_authors(row: Optional[Tuple]) -> Optional[Version]:
+    # The pages show the names of the authors, the later of the two is the last modification.
+    if row is None:
+        return None
+    modified, *rest, authors_modified = row
+    latest = max((value for value in (modified, authors_modified) if value is not None), default=None)
+    return (latest, *rest, authors_modified)
+
+
+def proposal_list_version(conference: ConferenceRef, **kwargs) -> Version:
+    """Return the version of the non-deleted proposals of a conference and of their authors.
+
+    Soft-deleting a proposal changes the count even though the other rows keep their `modified`.
+    """
+    return _with_authors(
+        get_session().execute(
+            select(func.max(Proposal.modified), func.count(), func.max(Participant.modified))
+            .select_from(Proposal)
+            .outerjoin(Participant, Proposal.author_id == Participant.id)
+            .where(Proposal.conference_id == conference.id)
+            .where(Proposal.is_deleted == False)  # noqa: E712
+        ).one()
+    )
+
+
+def proposal_version(conference: ConferenceRef, pid: int = None, proposal_id: int = None, **kwargs) -> Version:
+    """Return the version of a proposal and of its author."""
+    return _with_authors(
+        get_session().execute(
+            select(Proposal.modified, Proposal.is_deleted, Participant.modified)
+            .select_from(Proposal)
+            .outerjoin(Participant, Proposal.author_id == Participant.id)
+            .where(Proposal.conference_id == conference.id)
+            .where(Proposal.id == (pid if pid is not None else proposal_id))
+        ).first()
+    )
+
+
+def panel_list_version(conference: ConferenceRef, **kwargs) -> Version:
+    """Return the version of the panels of a conference."""
+    return get_session().execute(
+        select(func.max(Panel.modified), func.count()).where(Panel.conference_id == conference.id)
+    ).one()
+
+
+def panel_version(conference: ConferenceRef, pid: int, **kwargs) -> Optional[Version]:
+    """Return the version of a panel and its participants."""
+    participants = select(func.count()).select_from(Participation).where(Participation.c.panel_id == pid)
+    return get_session().execute(
+        select(Panel.modified, participants.scalar_subquery())
+        .where(Panel.id == pid)
+        .where(Panel.conference_id == conference.id)
+    ).first()
+
+
+def init_app(app: Flask) -> None:
+    """Initialize application."""
+    app.after_request(_set_validators)
@@ -0,0 +1,334 @@
+"""Import of the Google Form responses exported as Excel.
+
+The workbook is streamed in read-only mode and written with batched Core
+inserts, one transaction per chunk of rows.
+"""
+import hashlib
+import time
+from datetime import datetime
+from itertools import islice
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+import click
+from openpyxl import load_workbook
+from sqlalchemy import bindparam, insert, select, update
+from sqlalchemy.engine import Connection
+
+from .counters import bump_counters
+from .db import _conferences, get_engine, get_short_title
+from .fragment_cache import invalidate_fragments
+from .models import Conference, ImportWatermark, Participant, Proposal
+
+# The proposal types as spelled by the form.
+INDIVIDUAL_PROPOSAL = "A proposal for an individual paper, film screening or other presentationtation"
+PANEL_PROPOSAL = "A proposal for a paper panel"
+ROUNDTABLE_PROPOSAL = "A proposal for a routable"
+
+COTS2021_SLUG = "cots-2021"
+WATERMARK_SOURCE = "cots2021-google-form"
+
+
+def row_is_all_none_or_empty(row: Tuple) -> bool:
+    """True if the entire row is None or an empty string."""
+    return all(
+        value is None or (isinstance(value, str) and len(value) == 0)
+        for value in row
+    )
+
+
+def iter_worksheet_rows(file_path: Path, worksheet_name: str = None) -> Iterator[Tuple]:
+    """Yield the values of each response row without loading the whole workbook.
+
+    :param file_path: The path to the Excel file.
+    :param worksheet_name: The name of the worksheet to read, the first one by default.
+    """
+    wb = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        if len(wb.sheetnames) == 0:
+            raise Exception("No worksheet found.")
+
+        if worksheet_name is not None:
+            if worksheet_name not in wb.sheetnames:
+                raise Exception(f"Worksheet {worksheet_name} not found.")
+            ws = wb[worksheet_name]
+        else:
+            ws = wb.worksheets[0]
+
+        # min_row is 1-based index; the first row is the header.
+        yield from ws.iter_rows(min_row=2, values_only=True)
+    finally:
+        # Read-only workbooks keep the file open until closed.
+        wb.close()
+
+
+def _cell(row: Tuple, index: int) -> Optional[object]:
+    """Return a cell value, rows of a read-only sheet may be shorter than the header."""
+    return row[index] if index < len(row) else None
+
+
+def parse_cots2021_row(row: Tuple) -> Tuple[dict, Optional[dict]]:
+    """Split a COTS 2021 response into participant and proposal column values.
+
+    The proposal is None when the type of proposal is not recognized.
+    """
+    email_address = _cell(row, 1)
+    first_name, last_name = _cell(row, 2), _cell(row, 3)
+    affiliation, proposal_type = _cell(row, 4), _cell(row, 5)
+
+    participant = {
+        "email": email_address,
+        "first_name": first_name,
+        "last_name": last_name,
+        "affiliation": "" if affiliation is None else affiliation,
+    }
+
+    if proposal_type == INDIVIDUAL_PROPOSAL:
+        abstract = _cell(row, 6) or ""
+        title = abstract.split("\n")[0]
+    elif proposal_type == PANEL_PROPOSAL:
+        title = _cell(row, 7)
+        abstract = _cell(row, 10)
+    elif proposal_type == ROUNDTABLE_PROPOSAL:
+        roundtable_names = _cell(row, 11) or ""
+        title = get_short_title(roundtable_names)
+        abstract = ""
+        if title != roundtable_names:
+            abstract = roundtable_names
+    else:
+        return participant, None
+
+    proposal = {"title": title, "type": proposal_type, "abstract": abstract}
+    return participant, proposal
+
+
+def _chunks(rows: Iterable[Tuple], size: int) -> Iterator[List[Tuple]]:
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class ImportResult(NamedTuple):
+    """Number of response rows by outcome."""
+
+    inserted: int
+    updated: int
+    unchanged: int
+    skipped: int
+
+
+def response_key(timestamp: object, email_address: str) -> str:
+    """Identify a form response by its timestamp and email address."""
+    return hashlib.sha256(f"{timestamp}|{email_address}".encode("utf-8")).hexdigest()
+
+
+def response_hash(row: Tuple) -> str:
+    """Hash the content of a form response to detect edits."""
+    values = list(row)
+    # Read-only sheets do not pad rows to the width of the header.
+    while values and values[-1] is None:
+        values.pop()
+    return hashlib.sha256("\x1f".join(repr(value) for value in values).encode("utf-8")).hexdigest()
+
+
+def _get_or_create_conference(conn: Connection) -> int:
+    conference_id = conn.execute(
+        select(Conference.id).where(Conference.slug == COTS2021_SLUG)
+    ).scalar()
+    if conference_id is not None:
+        return conference_id
+
+    now = datetime.utcnow()
+    result = conn.execute(
+        insert(Conference).values(
+            name=_conferences[0]["name"],
+            description=_conferences[0]["description"],
+            slug=COTS2021_SLUG,
+            begin=_conferences[0]["begin"],
+            end=_conferences[0]["end"],
+            created=now,
+            modified=now,
+        )
+    )
+    return result.inserted_primary_key[0]
+
+
+def import_cots2021_proposals(
+    file_path: Path, worksheet_name: str = None, chunk_size: int = 500, incremental: bool = False
+) -> ImportResult:
+    """Import the COTS 2021's Excel Containing Proposals.
+
+    Re-importing is idempotent: a response is identified by its timestamp and
+    email address (column 0/1), unchanged responses are skipped and edited
+    ones update the proposal they created.
+
+    :param file_path: The path to the Excel file.
+    :param worksheet_name: The name of the worksheet to import.
+    :param chunk_size: The number of rows written per transaction.
+    :param incremental: Skip responses older than the last import without looking at them.
+
+    This assumes that the tables are already created.
+    """
+    engine = get_engine()
+    started = time.perf_counter()
+    inserted = updated = unchanged = skipped = 0
+
+    with engine.begin() as conn:
+        # NOTE: Hard coded value fot COTS 2021.
+        conference_id = _get_or_create_conference(conn)
+
+        # Participants are shared by email, including the ones created by earlier imports.
+        participant_ids: Dict[str, int] = dict(
+            conn.execute(select(Participant.email, Participant.id)).all()
+        )
+        # source_key -> (proposal id, source_hash) of the responses imported so far.
+        imported: Dict[str, Tuple[int, str]] = {
+            key: (proposal_id, content_hash)
+            for key, proposal_id, content_hash in conn.execute(
+                select(Proposal.source_key, Proposal.id, Proposal.source_hash)
+                .where(Proposal.conference_id == conference_id)
+                .where(Proposal.source_key != None)  # noqa: E711
+            )
+        }
+        watermark = conn.execute(
+            select(ImportWatermark.last_timestamp).where(ImportWatermark.source == WATERMARK_SOURCE)
+        ).scalar()
+
+    if incremental and watermark is not None:
+        click.echo(f"Skipping responses older than {watermark}")
+    newest = watermark
+    seen = set()
+
+    click.echo("Streaming the workbook ...")
+    rows = iter_worksheet_rows(file_path, worksheet_name)
+    for chunk_index, chunk in enumerate(_chunks(rows, chunk_size)):
+        now = datetime.utcnow()
+        new_participants: Dict[str, dict] = {}
+        changed_participants: Dict[str, dict] = {}
+        new_proposals = []
+        changed_proposals = []
+
+        for offset, row in enumerate(chunk):
+            if row_is_all_none_or_empty(row):
+                continue
+
+            timestamp = _cell(row, 0)
+            participant, proposal = parse_cots2021_row(row)
+            email_address = participant["email"]
+            if email_address is None:
+                click.echo(f"Skip row {chunk_index * chunk_size + offset + 2}, it has no email address.")
+                skipped += 1
+                continue
+
+            if isinstance(timestamp, datetime):
+                if incremental and watermark is not None and timestamp < watermark:
+                    skipped += 1
+                    continue
+                newest = timestamp if newest is None else max(newest, timestamp)
+
+            key = response_key(timestamp, email_address)
+            if key in seen:
+                click.echo(f"Skip row {chunk_index * chunk_size + offset + 2}, it is a duplicate response.")
+                skipped += 1
+                continue
+            seen.add(key)
+
+            content_hash = response_hash(row)
+            previous = imported.get(key)
+            if previous is not None and previous[1] == content_hash:
+                unchanged += 1
+                continue
+
+            if email_address in participant_ids:
+                if previous is not None:
+                    changed_participants[email_address] = dict(
+                        participant, participant_id=participant_ids[email_address], modified=now
+                    )
+            elif email_address not in new_participants:
+                new_participants[email_address] = dict(
+                    participant, conference_id=conference_id, created=now, modified=now
+                )
+
+            if proposal is None:
+                skipped += 1
+                continue
+
+            proposal.update(
+                short_title=get_short_title(proposal["title"]), source_key=key, source_hash=content_hash, modified=now
+            )
+            if previous is not None:
+                changed_proposals.append(dict(proposal, proposal_id=previous[0]))
+                updated += 1
+            else:
+                new_proposals.append(
+                    dict(
+                        proposal,
+                        email=email_address,
+                        conference_id=conference_id,
+                        created=now,
+                        is_deleted=False,
+                    )
+                )
+                inserted += 1
+
+        with engine.begin() as conn:
+            if new_participants:
+                conn.execute(insert(Participant), list(new_participants.values()))
+                participant_ids.update(
+                    conn.execute(
+                        select(Participant.email, Participant.id).where(
+                            Participant.email.in_(list(new_participants))
+                        )
+                    ).all()
+                )
+
+            if changed_participants:
+                conn.execute(
+                    update(Participant).where(Participant.id == bindparam("participant_id")),
+                    list(changed_participants.values()),
+                )
+
+            if new_proposals:
+                for proposal in new_proposals:
+                    proposal["author_id"] = participant_ids[proposal.pop("email")]
+                conn.execute(insert(Proposal), new_proposals)
+
+            bump_counters(
+                conn, conference_id, proposals=len(new_proposals), participants=len(new_participants)
+            )
+
+            if changed_proposals:
+                conn.execute(
+                    update(Proposal).where(Proposal.id == bindparam("proposal_id")),
+                    changed_proposals,
+                )
+
+        if new_proposals or changed_proposals or new_participants or changed_participants:
+            invalidate_fragments(conference_id)
+
+        elapsed = time.perf_counter() - started
+        processed = inserted + updated + unchanged + skipped
+        click.echo(
+            f"Processed {processed} rows: {inserted} new, {updated} updated, {unchanged} unchanged, "
+            f"{skipped} skipped ({processed / elapsed:.0f} rows/s)"
+        )
+
+    with engine.begin() as conn:
+        now = datetime.utcnow()
+        if watermark is None and newest is not None:
+            conn.execute(
+                insert(ImportWatermark).values(
+                    source=WATERMARK_SOURCE, conference_id=conference_id, last_timestamp=newest, modified=now
+                )
+            )
+        elif newest != watermark:
+            conn.execute(
+                update(ImportWatermark)
+                .where(ImportWatermark.source == WATERMARK_SOURCE)
+                .values(last_timestamp=newest, modified=now)
+            )
+
+    return ImportResult(inserted, updated, unchanged, skipped)
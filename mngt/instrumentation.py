@@ -0,0 +1,131 @@
+"""Per-request database instrumentation.
+
+Every statement run while handling a request is timed through the SQLAlchemy
+cursor events. At the end of the request the number of statements, the time
+spent in the database and the slowest statement are
+
+- logged as a JSON line for a sample of the requests (`QUERY_LOG_SAMPLE_RATE`)
+  and for every request that ran a slow statement,
+- returned in a `Server-Timing` header when `SERVER_TIMING` is enabled.
+
+Statements slower than `SLOW_QUERY_THRESHOLD_MS` are also logged on their own.
+"""
+import json
+import logging
+import random
+import time
+from typing import Any, Dict, Optional
+
+from flask import Flask, Response, current_app, g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger("mngt.instrumentation")
+
+_STATEMENT_LOG_LENGTH = 500
+
+
+class QueryStats:
+    """Statements run while handling one request."""
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.slowest = 0.0
+        self.slowest_statement: Optional[str] = None
+        self.slow_count = 0
+
+    def record(self, statement: str, duration: float, slow: bool) -> None:
+        """Account for a statement that took `duration` seconds."""
+        self.count += 1
+        self.total += duration
+        if slow:
+            self.slow_count += 1
+        if duration > self.slowest:
+            self.slowest = duration
+            self.slowest_statement = statement
+
+
+def _short(statement: Optional[str]) -> Optional[str]:
+    if statement is None:
+        return None
+    statement = " ".join(statement.split())
+    if len(statement) > _STATEMENT_LOG_LENGTH:
+        return statement[:_STATEMENT_LOG_LENGTH] + "..."
+    return statement
+
+
+def _current_stats() -> Optional[QueryStats]:
+    if not has_app_context():
+        return None
+    return g.get("query_stats")
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:  # noqa: ANN001
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:  # noqa: ANN001
+    started = conn.info["query_started"].pop()
+    stats = _current_stats()
+    if stats is None:
+        return
+
+    duration = time.perf_counter() - started
+    threshold = current_app.config.get("SLOW_QUERY_THRESHOLD_MS", 100) / 1000
+    slow = duration >= threshold
+    stats.record(statement, duration, slow)
+    if slow:
+        record = {"event": "slow_query", "duration_ms": round(duration * 1000, 2), "statement": _short(statement)}
+        logger.warning(json.dumps(record))
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(context) -> None:  # noqa: ANN001
+    # The statement failed, after_cursor_execute will not pop its start time.
+    if context.connection is not None and context.connection.info.get("query_started"):
+        context.connection.info["query_started"].pop()
+
+
+def _start_request() -> None:
+    g.request_started = time.perf_counter()
+    g.query_stats = QueryStats()
+
+
+def _finish_request(response: Response) -> Response:
+    stats = g.pop("query_stats", None)
+    started = g.pop("request_started", None)
+    if stats is None or started is None:
+        return response
+    elapsed = time.perf_counter() - started
+
+    if current_app.config.get("SERVER_TIMING", False):
+        response.headers.add(
+            "Server-Timing",
+            f'db;dur={stats.total * 1000:.2f};desc="{stats.count} queries", app;dur={elapsed * 1000:.2f}',
+        )
+
+    if stats.slow_count or random.random() < current_app.config.get("QUERY_LOG_SAMPLE_RATE", 0.0):
+        record: Dict[str, Any] = {
+            "event": "request",
+            "method": request.method,
+            "endpoint": request.endpoint,
+            "path": request.path,
+            "status": response.status_code,
+            "duration_ms": round(elapsed * 1000, 2),
+            "queries": stats.count,
+            "db_ms": round(stats.total * 1000, 2),
+            "slow_queries": stats.slow_count,
+            "slowest_ms": round(stats.slowest * 1000, 2),
+            "slowest": _short(stats.slowest_statement),
+        }
+        logger.info(json.dumps(record))
+    return response
+
+
+def init_app(app: Flask) -> None:
+    """Initialize application."""
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
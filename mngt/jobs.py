@@ -0,0 +1,122 @@
+"""Background jobs run in threads of the web process.
+
+Good for work that takes seconds, like drafting a program: the request that
+starts a job returns right away with the job id, and the client polls the job
+for its progress and result. The state of the jobs is kept in the backend of
+`mngt.cache`, so any worker can answer the polls when the backend is shared,
+and is forgotten `JOB_RETENTION` seconds after the job last changed.
+"""
+import json
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from flask import Flask, current_app
+
+from .serialization import dumps
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+# The progress of a running job is saved at most this often (seconds).
+PROGRESS_INTERVAL = 0.5
+
+
+class Job:
+    """The state of a background job."""
+
+    def __init__(self, name: str, save: Optional[Callable[["Job"], None]] = None) -> None:
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.status = PENDING
+        self.done = 0
+        self.total = 0
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self._save = save
+        self._saved = 0.0
+
+    def save(self) -> None:
+        """Publish the state of the job."""
+        if self._save is not None:
+            self._save(self)
+        self._saved = time.monotonic()
+
+    def progress(self, done: int, total: int) -> None:
+        """Record how much of the work is done."""
+        self.done, self.total = done, total
+        if time.monotonic() - self._saved >= PROGRESS_INTERVAL:
+            self.save()
+
+    def as_dict(self) -> dict:
+        """Return a JSON-serializable version of the job."""
+        return {
+            "id": self.id,
+            "name": self.name,
+            "status": self.status,
+            "progress": {"done": self.done, "total": self.total},
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class JobRunner:
+    """Run jobs in a thread pool and keep their state in a cache backend.
+
+    :param backend: A backend of `mngt.cache`, shared by the workers that answer the polls.
+    """
+
+    def __init__(self, app: Flask, backend: Any, workers: int = 2, retention: float = 3600) -> None:
+        self.app = app
+        self.backend = backend
+        self.retention = retention
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="mngt-job")
+
+    def submit(self, name: str, func: Callable[[Job], Any]) -> Job:
+        """Start `func(job)` in the background inside an app context and return its job.
+
+        The return value of `func` becomes the result of the job.
+        """
+        job = Job(name, save=self._save)
+        job.save()
+        self._executor.submit(self._run, job, func)
+        return job
+
+    def _save(self, job: Job) -> None:
+        self.backend.set(f"job:{job.id}", dumps(job.as_dict()), self.retention)
+
+    def _run(self, job: Job, func: Callable[[Job], Any]) -> None:
+        job.status = RUNNING
+        with self.app.app_context():
+            try:
+                job.save()
+                job.result = func(job)
+                job.status = DONE
+            except Exception as e:
+                self.app.logger.exception(f"Job {job.name} {job.id} failed")
+                job.error = str(e)
+                job.status = FAILED
+            finally:
+                job.save()
+
+    def get(self, job_id: str) -> Optional[dict]:
+        """Return the state of a job, see `Job.as_dict`, None if it is unknown or expired."""
+        raw = self.backend.get(f"job:{job_id}")
+        return json.loads(raw) if raw is not None else None
+
+
+def get_runner() -> JobRunner:
+    """Return the job runner of the current app."""
+    return current_app.extensions["job_runner"]
+
+
+def init_app(app: Flask) -> None:
+    """Initialize application."""
+    app.extensions["job_runner"] = JobRunner(
+        app,
+        app.extensions["cache"].backend,
+        workers=app.config.get("JOB_WORKERS", 2),
+        retention=app.config.get("JOB_RETENTION", 3600),
+    )
@@ -0,0 +1,145 @@
+"""Schema migrations.
+
+`init-db` creates the current schema with `create_all` and stamps it with the
+latest version. Databases created by an older version of the application are
+brought up to date with `migrate-db` (or `init-db`, which runs it on databases
+that have tables), which applies the pending migrations in order, each in its
+own transaction.
+
+Migrations check what already exists, so they also work on databases that
+were created by `create_all` before the migration was written.
+"""
+from datetime import datetime
+from typing import Callable, List, NamedTuple, Optional
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import Column, inspect, select, text
+from sqlalchemy.engine import Connection, Engine
+
+from .models import Base, Conference, ImportWatermark, Proposal, SchemaVersion
+
+
+class Migration(NamedTuple):
+    """A numbered schema change."""
+
+    version: int
+    description: str
+    apply: Callable[[Connection], None]
+
+
+def add_column(conn: Connection, table_name: str, column: Column) -> None:
+    """Add a nullable column to an existing table unless it is already there."""
+    if column.name in {c["name"] for c in inspect(conn).get_columns(table_name)}:
+        return
+    column_type = column.type.compile(dialect=conn.dialect)
+    preparer = conn.dialect.identifier_preparer
+    conn.execute(
+        text(f"ALTER TABLE {preparer.quote(table_name)} ADD COLUMN {preparer.quote(column.name)} {column_type}")
+    )
+
+
+def create_indexes(conn: Connection) -> None:
+    """Create every index declared on the models that does not exist yet.
+
+    Indexes over columns that a later migration adds are left to that migration.
+    """
+    inspector = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {c["name"] for c in inspector.get_columns(table.name)}
+        for index in table.indexes:
+            if {c.name for c in index.columns} <= existing:
+                index.create(conn, checkfirst=True)
+
+
+def _import_sources(conn: Connection) -> None:
+    add_column(conn, "proposal", Proposal.__table__.c.source_key)
+    add_column(conn, "proposal", Proposal.__table__.c.source_hash)
+    # SQLite cannot add a UNIQUE column, a unique index does the same job.
+    conn.execute(
+        text("CREATE UNIQUE INDEX IF NOT EXISTS ix_proposal_source_key ON proposal (source_key)")
+    )
+    ImportWatermark.__table__.create(conn, checkfirst=True)
+
+
+def _conference_counters(conn: Connection) -> None:
+    from .counters import recount
+
+    for name in ("proposal_count", "panel_count", "participant_count"):
+        add_column(conn, "conference", Conference.__table__.c[name])
+    create_indexes(conn)
+    recount(conn)
+
+
+def _short_titles(conn: Connection) -> None:
+    from .db import backfill_short_titles
+
+    add_column(conn, "proposal", Proposal.__table__.c.short_title)
+    backfill_short_titles(conn)
+    create_indexes(conn)
+
+
+def _search_index(conn: Connection) -> None:
+    from .search import rebuild_search_index
+
+    rebuild_search_index(conn)
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "Track the form response of imported proposals", _import_sources),
+    Migration(2, "Build the full-text search index", _search_index),
+    Migration(3, "Index the conference, proposal, panel and participation filter columns", create_indexes),
+    Migration(4, "Count the proposals, panels and participants of each conference", _conference_counters),
+    Migration(5, "Store the short title of the proposals", _short_titles),
+]
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+def current_version(conn: Connection) -> Optional[int]:
+    """Return the schema version, None if the database was never stamped."""
+    if not inspect(conn).has_table(SchemaVersion.__tablename__):
+        return None
+    return conn.execute(select(SchemaVersion.version).order_by(SchemaVersion.id.desc())).scalar()
+
+
+def _record(conn: Connection, version: int) -> None:
+    conn.execute(SchemaVersion.__table__.insert().values(version=version, applied=datetime.utcnow()))
+
+
+def stamp(engine: Engine, version: int = LATEST_VERSION) -> None:
+    """Mark the database as being at `version` without running anything."""
+    with engine.begin() as conn:
+        SchemaVersion.__table__.create(conn, checkfirst=True)
+        _record(conn, version)
+
+
+def upgrade(engine: Engine) -> List[Migration]:
+    """Apply the pending migrations and return them."""
+    with engine.begin() as conn:
+        version = current_version(conn) or 0
+        SchemaVersion.__table__.create(conn, checkfirst=True)
+
+    applied = []
+    for migration in MIGRATIONS:
+        if migration.version <= version:
+            continue
+        with engine.begin() as conn:
+            migration.apply(conn)
+            _record(conn, migration.version)
+        applied.append(migration)
+    return applied
+
+
+@click.command("migrate-db")
+@with_appcontext
+def migrate_db_command() -> None:
+    """Bring the database schema up to date."""
+    from .db import get_engine
+
+    applied = upgrade(get_engine())
+    for migration in applied:
+        click.echo(f"Applied {migration.version}: {migration.description}")
+    click.echo(f"The database is at version {LATEST_VERSION}.")
@@ -1,12 +1,23 @@
+from typing import Optional
+
 import flask_login
 from sqlalchemy import (
-    Boolean, Column, DateTime, ForeignKey, Integer, String, Text
+    Boolean, Column, DateTime, ForeignKey, Index, Integer, String, Text
+)
+from sqlalchemy.engine.default import DefaultExecutionContext
+from sqlalchemy.orm import (
+    declarative_base, deferred, relationship, validates
 )
-from sqlalchemy.orm import declarative_base, relationship
 from sqlalchemy.schema import Table
 
+from .db import get_short_title
+
 Base = declarative_base()
 
+# Group of the long text columns, loaded on first access or with
+# `undefer_group(LONG_TEXT)` where a view shows them.
+LONG_TEXT = "long_text"
+
 
 class User(flask_login.UserMixin):
     """User model."""
@@ -18,6 +29,11 @@ class Conference(Base):
     """ORM model for Conference table."""
 
     __tablename__ = "conference"
+    __table_args__ = (
+        Index("ix_conference_begin", "begin", "id"),
+        Index("ix_conference_proposal_count", "proposal_count", "id"),
+        Index("ix_conference_panel_count", "panel_count", "id"),
+    )
 
     id = Column(Integer, primary_key=True)
     created = Column(DateTime)
@@ -29,6 +45,11 @@ class Conference(Base):
     begin = Column(DateTime)
     end = Column(DateTime)
 
+    # Maintained by `mngt.counters`, the proposal count excludes soft-deleted proposals.
+    proposal_count = Column(Integer, nullable=False, default=0, server_default="0")
+    panel_count = Column(Integer, nullable=False, default=0, server_default="0")
+    participant_count = Column(Integer, nullable=False, default=0, server_default="0")
+
     panels = relationship("Panel", back_populates="conference")
     proposals = relationship("Proposal", back_populates="conference")
     participants = relationship("Participant", back_populates="conference")
@@ -38,6 +59,7 @@ class Participant(Base):
     """ORM model for Participant table."""
 
     __tablename__ = "participant"
+    __table_args__ = (Index("ix_participant_conference_id", "conference_id"),)
 
     id = Column(Integer, primary_key=True)
     # Let overshoot it; https://stackoverflow.com/questions/386294/what-is-the-maximum-length-of-a-valid-email-address
@@ -55,10 +77,21 @@ class Participant(Base):
     proposals = relationship("Proposal", back_populates="author")
 
 
+def _default_short_title(context: DefaultExecutionContext) -> Optional[str]:
+    """Compute the short title of the proposals inserted without one."""
+    return get_short_title(context.get_current_parameters().get("title"))
+
+
 class Proposal(Base):
     """ORM model for Proposal table."""
 
     __tablename__ = "proposal"
+    __table_args__ = (
+        # Listing of a conference, newest first, without the soft-deleted ones.
+        Index("ix_proposal_conference_listing", "conference_id", "is_deleted", "created", "id"),
+        Index("ix_proposal_author_id", "author_id"),
+        Index("ix_proposal_conference_short_title", "conference_id", "is_deleted", "short_title", "id"),
+    )
 
     id = Column(Integer, primary_key=True)
     conference_id = Column(Integer, ForeignKey("conference.id"))
@@ -69,19 +102,49 @@ class Proposal(Base):
     author_id = Column(Integer, ForeignKey("participant.id"))
     author = relationship("Participant", back_populates="proposals")
     title = Column(String(length=300))
+    # Derived from the title when it is written, see `get_short_title`.
+    short_title = Column(String(length=300), default=_default_short_title)
     type = Column(String(length=200))
-    abstract = Column(Text)
+    abstract = deferred(Column(Text), group=LONG_TEXT)
 
     is_deleted = Column(Boolean, default=False)
 
-    @property
-    def short_title(self) -> str:
-        """Return short title."""
-        title = self.title
-        titles = [title, title.split("\n")[0], title.split(".")[0]]
-        lens = [len(title) for title in titles]
-        short_titles = sorted(zip(lens, titles), key=lambda v: v[0])
-        return short_titles[0][1]
+    # Identity and content hash of the form response the proposal was imported from.
+    source_key = Column(String(length=64), unique=True)
+    source_hash = Column(String(length=64))
+
+    @validates("title")
+    def _set_short_title(self, key: str, title: str) -> str:
+        self.short_title = get_short_title(title)
+        return title
+
+
+class SchemaVersion(Base):
+    """ORM model for SchemaVersion table.
+
+    Hold the number of the last migration applied to the database.
+    """
+
+    __tablename__ = "schema_version"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False)
+    applied = Column(DateTime)
+
+
+class ImportWatermark(Base):
+    """ORM model for ImportWatermark table.
+
+    Remember the newest response imported from each source.
+    """
+
+    __tablename__ = "import_watermark"
+
+    id = Column(Integer, primary_key=True)
+    source = Column(String(length=100), unique=True)
+    conference_id = Column(Integer, ForeignKey("conference.id"))
+    last_timestamp = Column(DateTime)
+    modified = Column(DateTime)
 
 
 Participation = Table(
@@ -92,6 +155,8 @@ Participation = Table(
     Column("participant_id", Integer, ForeignKey("participant.id")),
     Column("role", String(length=150)),
     Column("order", Integer),  # Order if the role is speaking, presenting.
+    Index("ix_participation_panel_id", "panel_id"),
+    Index("ix_participation_participant_id", "participant_id"),
 )
 
 
@@ -99,6 +164,7 @@ class Panel(Base):
     """ORM model for Panel table."""
 
     __tablename__ = "panel"
+    __table_args__ = (Index("ix_panel_conference_start", "conference_id", "start", "id"),)
 
     id = Column(Integer, primary_key=True)
     conference_id = Column(Integer, ForeignKey("conference.id"))
@@ -110,7 +176,7 @@ class Panel(Base):
     start = Column(DateTime)
     duration = Column(Integer)
     gap = Column(Integer)
-    url = Column(String(length=4096))
+    url = deferred(Column(String(length=4096)), group=LONG_TEXT)
 
     participants = relationship(
         "Participant", secondary=Participation, backref="panels"
@@ -0,0 +1,140 @@
+"""Keyset (cursor) pagination.
+
+A page is located by the sort key of the row next to it, so every page costs
+the same index range scan no matter how deep it is. Cursors are opaque
+tokens that record the direction, the key values of that row and the name
+of the sort they belong to.
+"""
+import base64
+import json
+from datetime import date, datetime
+from typing import Any, List, NamedTuple, Optional, Sequence, Tuple
+
+from flask import abort
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+
+NEXT = "n"
+PREV = "p"
+
+
+class KeysetPage(NamedTuple):
+    """A page of items and the cursors of its neighbours."""
+
+    items: List[Any]
+    next_cursor: Optional[str]
+    prev_cursor: Optional[str]
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    if isinstance(value, date):
+        return {"d": value.isoformat()}
+    return value
+
+
+def _decode_value(value: Any) -> Any:
+    if isinstance(value, dict):
+        if "dt" in value:
+            return datetime.fromisoformat(value["dt"])
+        if "d" in value:
+            return date.fromisoformat(value["d"])
+    return value
+
+
+def encode_cursor(direction: str, values: Sequence[Any], sort: Optional[str] = None) -> str:
+    """Return the token of a cursor."""
+    payload = [direction, [_encode_value(v) for v in values]]
+    if sort is not None:
+        payload.append(sort)
+    data = json.dumps(payload, separators=(",", ":"))
+    return base64.urlsafe_b64encode(data.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str) -> Tuple[str, List[Any], Optional[str]]:
+    """Return the direction, key values and sort of a cursor token.
+
+    :raises ValueError: when the token is malformed.
+    """
+    try:
+        payload = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        # Cursors made before the sort was recorded have none.
+        direction, values, *sort = json.loads(payload)
+    except (TypeError, ValueError) as e:
+        raise ValueError("Malformed cursor.") from e
+    if direction not in (NEXT, PREV) or not isinstance(values, list) or len(sort) > 1:
+        raise ValueError("Malformed cursor.")
+    return direction, [_decode_value(v) for v in values], sort[0] if sort else None
+
+
+def cursor_sort(token: Optional[str]) -> Optional[str]:
+    """Return the sort a cursor token belongs to, None without one or when it is malformed."""
+    if not token:
+        return None
+    try:
+        return decode_cursor(token)[2]
+    except ValueError:
+        return None
+
+
+def paginate(
+    session: Session,
+    stmt: Select,
+    keys: Sequence,
+    per_page: int,
+    cursor: Optional[str] = None,
+    descending: bool = False,
+    scalars: bool = True,
+    sort: Optional[str] = None,
+) -> KeysetPage:
+    """Return a page of `stmt` ordered by `keys`.
+
+    :param keys: The columns of a unique sort key, e.g. (Proposal.created, Proposal.id).
+    :param cursor: A token from a previous page, None for the first page.
+    :param descending: Sort every key in descending order.
+    :param scalars: Return the first entity of each row instead of the rows.
+    :param sort: The name of the order of `keys`, recorded in the cursors. A
+        cursor of another sort would compare its values with the wrong columns.
+
+    A malformed cursor, or one of another sort, aborts the request with 400.
+    """
+    direction, values = NEXT, None
+    if cursor:
+        try:
+            direction, values, cursor_sort_name = decode_cursor(cursor)
+        except ValueError:
+            abort(400)
+        if len(values) != len(keys) or cursor_sort_name not in (None, sort):
+            abort(400)
+
+    # Walking backwards flips the comparison and the order, the rows are
+    # reversed again once fetched.
+    backwards = direction == PREV
+    ascending = descending == backwards
+    if values is not None:
+        row_key, cursor_key = tuple_(*keys), tuple_(*values)
+        stmt = stmt.where(row_key > cursor_key if ascending else row_key < cursor_key)
+    stmt = stmt.order_by(*[key.asc() if ascending else key.desc() for key in keys]).limit(per_page + 1)
+
+    result = session.execute(stmt)
+    rows = result.scalars().all() if scalars else result.all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+
+    if not rows:
+        return KeysetPage(rows, None, None)
+
+    def key_of(row: Any) -> List[Any]:
+        return [getattr(row, key.key) for key in keys]
+
+    if backwards:
+        next_cursor = encode_cursor(NEXT, key_of(rows[-1]), sort)
+        prev_cursor = encode_cursor(PREV, key_of(rows[0]), sort) if has_more else None
+    else:
+        next_cursor = encode_cursor(NEXT, key_of(rows[-1]), sort) if has_more else None
+        prev_cursor = encode_cursor(PREV, key_of(rows[0]), sort) if values is not None else None
+    return KeysetPage(rows, next_cursor, prev_cursor)
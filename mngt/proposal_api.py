@@ -1,14 +1,34 @@
-from math import ceil
+from collections import defaultdict
+from datetime import datetime
+from typing import List
 
-from flask import abort, current_app, request, url_for
+from flask import (
+    Response, abort, current_app, request, stream_with_context, url_for
+)
+from flask_login import login_required
 from flask_restful import Resource
-from sqlalchemy import func
-from sqlalchemy.orm import Session
+from marshmallow import ValidationError
+from sqlalchemy import bindparam, func, insert, update
+from sqlalchemy.engine import Connection
 from sqlalchemy.sql.expression import select
 
-from .db import get_engine
-from .models import Conference, Proposal
-from .schemas import NewPanelSchema
+from .assembly import AssemblyOptions, assemble_conference, save_program
+from .counters import bump_counters
+from .db import get_session, get_short_title
+from .export import DATASETS, FORMATS, export_conference, export_filename
+from .fragment_cache import invalidate_fragments
+from .http_cache import conditional, proposal_list_version, proposal_version
+from .jobs import Job, get_runner
+from .models import Panel, Participant, Participation, Proposal
+from .pagination import paginate
+from .resolvers import ConferenceRef, with_conference
+from .scheduling import describe, editing_schedule, make_slot
+from .schemas import (
+    NewPanelSchema, PanelAssemblySchema, ProposalBatchSchema
+)
+from .serialization import (
+    PROPOSAL_FIELDS, field_columns, rows_as_dicts, sparse_fields
+)
 
 # TODO: Add login_required.
 
@@ -16,100 +36,359 @@ from .schemas import NewPanelSchema
 class ProposalDetail(Resource):
     """Proposal detail endpoint."""
 
-    def get(self, slug: str, proposal_id: int) -> dict:
+    method_decorators = [conditional(proposal_version), with_conference]
+
+    def get(self, conference: ConferenceRef, slug: str, proposal_id: int) -> dict:
         """
         Return detail of the proposal.
 
+        `fields` selects the fields returned, see `PROPOSAL_FIELDS`.
+
         :param proposal_id: The ID of the proposal.
         """
-        engine = get_engine()
-        with Session(engine, future=True) as session:
-            conf = session.query(Conference).filter(Conference.slug == slug).first()
-            if conf is None:
-                abort(404)
+        try:
+            fields = sparse_fields(PROPOSAL_FIELDS, ("proposal_id", "title", "abstract"))
+        except ValueError as e:
+            return {"errors": {"fields": [str(e)]}}, 400
 
-            stmt = select(Proposal).where(Proposal.conference_id == conf.id).where(Proposal.id == proposal_id)
-            row = session.execute(stmt).scalars().first()
-            return {"proposal_id": row.id, "title": row.title, "abstract": row.abstract}
+        session = get_session()
+        stmt = (
+            select(*field_columns(PROPOSAL_FIELDS, fields))
+            .where(Proposal.conference_id == conference.id)
+            .where(Proposal.id == proposal_id)
+        )
+        row = session.execute(stmt).first()
+        if row is None:
+            abort(404)
+        return rows_as_dicts([row], fields)[0]
 
 
 class ProposalList(Resource):
     """Proposal list endpoint."""
 
-    def get(self, slug: str) -> dict:
-        """Return list of proposals."""
-        page = request.args.get("page", 1, type=int)
-
-        engine = get_engine()
-        with Session(engine, future=True) as session:
-            conf = session.query(Conference).filter(Conference.slug == slug).first()
-            if conf is None:
-                abort(404)
-
-            total_stmt = select(func.count()).select_from(Proposal)
-            # TODO: Limit the proposal to the conference.
-            limit_stmt = (
-                select(Proposal)
-                .where(Proposal.conference_id == conf.id)
-                .order_by(Proposal.created.desc())
-                .offset((page - 1) * current_app.config["ENTRY_PER_PAGE"])
-                .limit(current_app.config["ENTRY_PER_PAGE"])
-            )
+    method_decorators = [conditional(proposal_list_version), with_conference]
 
-            total = session.execute(total_stmt).scalars().first()
-            proposals = session.execute(limit_stmt).scalars().all()
+    def get(self, conference: ConferenceRef, slug: str) -> dict:
+        """Return list of proposals.
 
-            number_of_pages = int(
-                ceil(total / current_app.config["ENTRY_PER_PAGE"] * 1.0)
+        Pages are walked with the opaque `cursor` of the `next`/`prev` links.
+        The number of proposals is only counted when `total=true` is given.
+        `fields` selects the fields returned, see `PROPOSAL_FIELDS`.
+        """
+        cursor = request.args.get("cursor")
+        with_total = request.args.get("total", "false").lower() in ("1", "true")
+        try:
+            fields = sparse_fields(PROPOSAL_FIELDS, ("title", "abstract"))
+        except ValueError as e:
+            return {"errors": {"fields": [str(e)]}}, 400
+
+        session = get_session()
+        keys = (Proposal.created, Proposal.id)
+        stmt = (
+            select(*keys, *field_columns(PROPOSAL_FIELDS, fields))
+            .where(Proposal.conference_id == conference.id)
+            .where(Proposal.is_deleted == False)  # noqa: E712
+        )
+        page = paginate(
+            session,
+            stmt,
+            keys,
+            current_app.config["ENTRY_PER_PAGE"],
+            cursor,
+            descending=True,
+            scalars=False,
+        )
+        # The links keep the fieldset of the request.
+        fieldset = request.args.get("fields")
+        prev_url = (
+            url_for("proposallist", slug=slug, cursor=page.prev_cursor, fields=fieldset)
+            if page.prev_cursor
+            else None
+        )
+        next_url = (
+            url_for("proposallist", slug=slug, cursor=page.next_cursor, fields=fieldset)
+            if page.next_cursor
+            else None
+        )
+
+        result = {
+            "result": {"proposals": rows_as_dicts(page.items, fields)},
+            "next": next_url,
+            "prev": prev_url,
+        }
+        if with_total:
+            total_stmt = (
+                select(func.count())
+                .select_from(Proposal)
+                .where(Proposal.conference_id == conference.id)
+                .where(Proposal.is_deleted == False)  # noqa: E712
             )
-            pagination = {
-                "has_prev": page > 1,
-                "has_next": page < number_of_pages,
-                "prev_num": page
-                - 1,  # has_prev should be checked before using this value.
-                "next_num": page
-                + 1,  # has_next should be checked before using this value.
-            }
-            prev_url = (
-                url_for("conferences.list_proposals", slug=conf.slug, page=pagination["prev_num"])
-                if pagination["has_prev"]
-                else None
+            result["total"] = session.execute(total_stmt).scalar()
+        return result
+
+
+def _insert_proposals(conn: Connection, conference_id: int, rows: List[dict]) -> List[int]:
+    """Insert the proposals with a single statement and return their ids, in order."""
+    stmt = insert(Proposal).values(rows)
+    if conn.dialect.full_returning:
+        return list(conn.execute(stmt.returning(Proposal.id)).scalars())
+    # SQLite holds the write lock of the transaction from the insert on, so
+    # the newest proposals of the conference are the ones just inserted.
+    conn.execute(stmt)
+    ids = conn.execute(
+        select(Proposal.id)
+        .where(Proposal.conference_id == conference_id)
+        .order_by(Proposal.id.desc())
+        .limit(len(rows))
+    ).scalars().all()
+    return ids[::-1]
+
+
+class ProposalBatch(Resource):
+    """Endpoint applying many changes to the proposals at once."""
+
+    method_decorators = [with_conference, login_required]
+
+    def post(self, conference: ConferenceRef, slug: str) -> tuple:
+        """Create, update and soft-delete proposals of the conference.
+
+        The body has arrays of proposals to `create`, of changes to `update`
+        (with their `proposal_id`) and of proposal ids to `delete`. Each array
+        is applied with set-based statements, all in one transaction, and
+        answered with the status of each of its items, in order. Updating or
+        deleting a proposal which is not in the conference (or is deleted
+        already) gives "not_found" for that item only.
+        """
+        try:
+            batch = ProposalBatchSchema().load(request.get_json(silent=True) or {})
+        except ValidationError as e:
+            return {"errors": e.messages}, 400
+
+        session = get_session()
+        conn = session.connection()
+        author_ids = {item["author_id"] for item in batch["create"] + batch["update"] if "author_id" in item}
+        if author_ids:
+            known = set(
+                conn.execute(
+                    select(Participant.id)
+                    .where(Participant.conference_id == conference.id)
+                    .where(Participant.id.in_(author_ids))
+                ).scalars()
             )
-            next_url = (
-                url_for("conferences.list_proposals", slug=conf.slug, page=pagination["next_num"])
-                if pagination["has_next"]
-                else None
+            unknown = sorted(author_ids - known)
+            if unknown:
+                return {"errors": {"author_id": [f"Unknown participants: {unknown}"]}}, 400
+
+        proposal_ids = {item["proposal_id"] for item in batch["update"]} | set(batch["delete"])
+        live = set()
+        if proposal_ids:
+            live = set(
+                conn.execute(
+                    select(Proposal.id)
+                    .where(Proposal.conference_id == conference.id)
+                    .where(Proposal.id.in_(proposal_ids))
+                    .where(Proposal.is_deleted == False)  # noqa: E712
+                ).scalars()
             )
 
-        proposals_dicts = []
-        for proposal in proposals:
-            p = {
-                "title": proposal.title,
-                "abstract": proposal.abstract,
-            }
-            proposals_dicts.append(p)
+        now = datetime.utcnow()
+        created = []
+        if batch["create"]:
+            rows = [
+                dict(
+                    item,
+                    conference_id=conference.id,
+                    short_title=get_short_title(item["title"]),
+                    is_deleted=False,
+                    created=now,
+                    modified=now,
+                )
+                for item in batch["create"]
+            ]
+            created = _insert_proposals(conn, conference.id, rows)
+
+        # An executemany per set of changed columns.
+        changes = defaultdict(list)
+        for item in batch["update"]:
+            if item["proposal_id"] in live:
+                values = dict(item, modified=now)
+                if "title" in values:
+                    values["short_title"] = get_short_title(values["title"])
+                changes[tuple(sorted(values))].append(values)
+        for params in changes.values():
+            conn.execute(update(Proposal).where(Proposal.id == bindparam("proposal_id")), params)
+
+        deleted = [pid for pid in batch["delete"] if pid in live]
+        if deleted:
+            conn.execute(update(Proposal).where(Proposal.id.in_(deleted)).values(is_deleted=True, modified=now))
+
+        bump_counters(conn, conference.id, proposals=len(created) - len(deleted))
+        session.commit()
+        if created or changes or deleted:
+            invalidate_fragments(conference.id)
 
         return {
-            "result": {"proposals": proposals_dicts},
-            "next": next_url,
-            "prev": prev_url,
-        }
+            "create": [{"proposal_id": pid, "status": "created"} for pid in created],
+            "update": [
+                {"proposal_id": pid, "status": "updated" if pid in live else "not_found"}
+                for pid in (item["proposal_id"] for item in batch["update"])
+            ],
+            "delete": [
+                {"proposal_id": pid, "status": "deleted" if pid in live else "not_found"} for pid in batch["delete"]
+            ],
+        }, 200
 
 
 class NewPanel(Resource):
     """Endpoints for panel."""
 
-    def post(self, slug: str) -> str:
-        """Create new panel on the conference."""
-        engine = get_engine()
-        with Session(engine, future=True) as session:
-            conf = session.query(Conference).filter(Conference.slug == slug).first()
-            if conf is None:
-                abort(404)
+    method_decorators = [with_conference, login_required]
+
+    def post(self, conference: ConferenceRef, slug: str) -> tuple:
+        """Create new panels on the conference.
+
+        The body is a panel or an array of panels. All of them and their
+        presentations are created in one transaction, the presentations with a
+        single multi-row insert. Overlaps with the other panels are allowed and
+        reported in `conflicts`.
+        """
+        raw_data = request.get_json(silent=True)
+        many = isinstance(raw_data, list)
+        try:
+            panels = NewPanelSchema(many=many).load(raw_data if raw_data is not None else {})
+        except ValidationError as e:
+            return {"errors": e.messages}, 400
+        if not many:
+            panels = [panels]
+        if not panels:
+            return {"panels": [], "conflicts": []}, 201
+
+        session = get_session()
+        participant_ids = {p["participant_id"] for panel in panels for p in panel["presentations"]}
+        if participant_ids:
+            known = set(
+                session.execute(
+                    select(Participant.id)
+                    .where(Participant.conference_id == conference.id)
+                    .where(Participant.id.in_(participant_ids))
+                ).scalars()
+            )
+            unknown = sorted(participant_ids - known)
+            if unknown:
+                return {"errors": {"participant_id": [f"Unknown participants: {unknown}"]}}, 400
+
+        now = datetime.utcnow()
+        created, conflicts, participations = [], [], []
+        with editing_schedule(session, conference.id) as schedule:
+            for panel in panels:
+                panel_id = session.execute(
+                    insert(Panel).values(
+                        conference_id=conference.id,
+                        name=panel["name"],
+                        start=panel["start"],
+                        duration=panel["duration"],
+                        gap=panel["gap"],
+                        url=panel["url"],
+                        created=now,
+                        modified=now,
+                    )
+                ).inserted_primary_key[0]
+                created.append(panel_id)
+
+                presentations = panel["presentations"]
+                for order, presentation in enumerate(presentations, 1):
+                    participations.append(
+                        {
+                            "panel_id": panel_id,
+                            "participant_id": presentation["participant_id"],
+                            "role": presentation["role"],
+                            "order": presentation.get("order", order),
+                        }
+                    )
+
+                # Check against the panels created before this one too.
+                slot = make_slot(
+                    panel_id, panel["name"], panel["start"], panel["duration"], panel["url"],
+                    [p["participant_id"] for p in presentations],
+                )
+                conflicts.extend(describe(conflict) for conflict in schedule.conflicts_with(slot))
+                schedule.add(slot)
+
+            if participations:
+                session.execute(insert(Participation).values(participations))
+            bump_counters(session, conference.id, panels=len(created))
+            session.commit()
+
+        return {"panels": created, "conflicts": conflicts}, 201
+
+
+class PanelAssembly(Resource):
+    """Endpoint drafting the panels of a conference in the background."""
+
+    method_decorators = [with_conference, login_required]
+
+    def post(self, conference: ConferenceRef, slug: str) -> tuple:
+        """Start drafting the panels from the non-deleted proposals.
+
+        The response points to the job, whose result is the draft program.
+        The panels are only created when `save` is true.
+        """
+        try:
+            data = PanelAssemblySchema().load(request.get_json(silent=True) or {})
+        except ValidationError as e:
+            return {"errors": e.messages}, 400
+        save = data.pop("save")
+        options = AssemblyOptions(**data)
+        conference_id = conference.id
+
+        def run(job: Job) -> dict:
+            session = get_session()
+            program = assemble_conference(session, conference_id, options, job.progress)
+            if save:
+                save_program(session, conference_id, program)
+                session.commit()
+                invalidate_fragments(conference_id)
+            return program.as_dict()
+
+        job = get_runner().submit(f"assemble-panels {slug}", run)
+        return job.as_dict(), 202, {"Location": url_for("jobstatus", job_id=job.id)}
+
+
+class ConferenceExport(Resource):
+    """Export endpoint for the whole data of a conference."""
+
+    # The exports have the email addresses of the participants.
+    method_decorators = [with_conference, login_required]
+
+    def get(self, conference: ConferenceRef, slug: str, dataset: str) -> Response:
+        """Stream the proposals, panels or participants of the conference.
+
+        :param dataset: "proposals", "panels" or "participants".
+        """
+        if dataset not in DATASETS:
+            abort(404)
+        fmt = request.args.get("format", "csv")
+        if fmt not in FORMATS:
+            return {"errors": {"format": [f"Must be one of: {', '.join(FORMATS)}."]}}, 400
+
+        # The session of the request stays open until the response is sent.
+        chunks = export_conference(get_session(), conference.id, dataset, fmt)
+        return Response(
+            stream_with_context(chunks),
+            mimetype=FORMATS[fmt].mimetype,
+            headers={"Content-Disposition": f'attachment; filename="{export_filename(slug, dataset, fmt)}"'},
+        )
+
+
+class JobStatus(Resource):
+    """Background job endpoint."""
 
-            raw_data = request.json
-            schema = NewPanelSchema()
-            data = schema.load(raw_data)
+    # The results hold the draft programs of the conferences.
+    method_decorators = [login_required]
 
-            print(data)
-            return "success"
+    def get(self, job_id: str) -> dict:
+        """Return the progress of a job, and its result once it is done."""
+        state = get_runner().get(job_id)
+        if state is None:
+            abort(404)
+        return state
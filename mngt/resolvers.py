@@ -0,0 +1,72 @@
+"""Resolution of the conference slug in the URLs.
+
+Every conference page and API resource is addressed by the conference slug.
+The conference is looked up once and kept in the app cache, shared by the
+workers, so the handlers receive it without querying the database.
+"""
+from datetime import datetime
+from functools import wraps
+from typing import Any, Callable, NamedTuple, Optional
+
+from flask import abort, current_app
+from sqlalchemy import select
+
+from .cache import get_cache
+from .db import get_session
+from .models import Conference
+
+
+class ConferenceRef(NamedTuple):
+    """A read-only snapshot of a conference row."""
+
+    id: int
+    slug: str
+    name: str
+    description: str
+    begin: datetime
+    end: datetime
+    created: datetime
+    modified: datetime
+
+
+_COLUMNS = [getattr(Conference, field) for field in ConferenceRef._fields]
+
+
+def _key(slug: str) -> str:
+    return f"conference:{slug}"
+
+
+def resolve_conference(slug: str) -> Optional[ConferenceRef]:
+    """Return the conference with the given slug, None if it does not exist."""
+    cache = get_cache()
+    conference = cache.get(_key(slug))
+    if conference is None:
+        row = get_session().execute(select(*_COLUMNS).where(Conference.slug == slug)).first()
+        if row is None:
+            # Misses are not cached so a new conference is visible right away.
+            return None
+        conference = ConferenceRef(*row)
+        cache.set(_key(slug), conference, current_app.config.get("CONFERENCE_CACHE_TTL", 60))
+    return conference
+
+
+def invalidate_conference(slug: str) -> None:
+    """Forget the cached conference, in every worker, after it was modified."""
+    get_cache().delete(_key(slug))
+
+
+def with_conference(view: Callable) -> Callable:
+    """Pass the conference of the `slug` URL argument to the view as `conference`.
+
+    The request is aborted with 404 if there is no such conference.
+    """
+
+    @wraps(view)
+    def wrapper(*args, **kwargs) -> Any:
+        conference = resolve_conference(kwargs["slug"])
+        if conference is None:
+            abort(404)
+        return view(*args, conference=conference, **kwargs)
+
+    return wrapper
+
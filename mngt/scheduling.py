@@ -0,0 +1,367 @@
+"""Panel scheduling and conflict detection.
+
+A panel occupies its room (the meeting URL) and its presenters from `start`
+for `duration` minutes. Two panels conflict when they share the room or a
+presenter and their time slots overlap.
+
+The slots of a conference are indexed in interval trees, one per room and one
+per presenter, so checking a single panel costs O(log n + k) for k conflicts.
+The report for the whole conference is a single sweep over the slots sorted by
+their start.
+
+Each process keeps the schedules it loaded between requests, see
+`editing_schedule`, so a panel is checked and added in O(log n) rather than
+the schedule being read from the database on every write.
+"""
+import heapq
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Dict, FrozenSet, Hashable, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from flask import current_app
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from .cache import TTLCache
+from .fragment_cache import fragment_generation, invalidate_fragments
+from .models import Panel, Participation
+
+ROOM = "room"
+PRESENTER = "presenter"
+
+
+class _Node:
+    __slots__ = ("start", "end", "key", "max_end", "height", "left", "right")
+
+    def __init__(self, start: datetime, end: datetime, key: Hashable) -> None:
+        self.start = start
+        self.end = end
+        self.key = key
+        self.max_end = end
+        self.height = 1
+        self.left: Optional["_Node"] = None
+        self.right: Optional["_Node"] = None
+
+
+def _height(node: Optional[_Node]) -> int:
+    return node.height if node is not None else 0
+
+
+def _update(node: _Node) -> None:
+    node.height = 1 + max(_height(node.left), _height(node.right))
+    node.max_end = node.end
+    for child in (node.left, node.right):
+        if child is not None and child.max_end > node.max_end:
+            node.max_end = child.max_end
+
+
+def _rotate_right(node: _Node) -> _Node:
+    pivot = node.left
+    node.left, pivot.right = pivot.right, node
+    _update(node)
+    _update(pivot)
+    return pivot
+
+
+def _rotate_left(node: _Node) -> _Node:
+    pivot = node.right
+    node.right, pivot.left = pivot.left, node
+    _update(node)
+    _update(pivot)
+    return pivot
+
+
+def _rebalance(node: _Node) -> _Node:
+    _update(node)
+    balance = _height(node.left) - _height(node.right)
+    if balance > 1:
+        if _height(node.left.left) < _height(node.left.right):
+            node.left = _rotate_left(node.left)
+        return _rotate_right(node)
+    if balance < -1:
+        if _height(node.right.right) < _height(node.right.left):
+            node.right = _rotate_right(node.right)
+        return _rotate_left(node)
+    return node
+
+
+class IntervalTree:
+    """A set of half-open time intervals [start, end), each identified by a key.
+
+    An AVL tree ordered by (start, key) where every node also knows the latest
+    end of its subtree, so subtrees that end before a query starts are skipped.
+    """
+
+    def __init__(self) -> None:
+        self._root: Optional[_Node] = None
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def insert(self, start: datetime, end: datetime, key: Hashable) -> None:
+        """Add an interval. The (start, key) pair must not be in the tree already."""
+        self._root = self._insert(self._root, _Node(start, end, key))
+        self._size += 1
+
+    def _insert(self, node: Optional[_Node], new: _Node) -> _Node:
+        if node is None:
+            return new
+        if (new.start, new.key) < (node.start, node.key):
+            node.left = self._insert(node.left, new)
+        else:
+            node.right = self._insert(node.right, new)
+        return _rebalance(node)
+
+    def remove(self, start: datetime, key: Hashable) -> None:
+        """Remove the interval added with `start` and `key`.
+
+        :raises KeyError: when there is no such interval.
+        """
+        self._root = self._remove(self._root, start, key)
+        self._size -= 1
+
+    def _remove(self, node: Optional[_Node], start: datetime, key: Hashable) -> Optional[_Node]:
+        if node is None:
+            raise KeyError(key)
+        if (start, key) < (node.start, node.key):
+            node.left = self._remove(node.left, start, key)
+        elif (start, key) > (node.start, node.key):
+            node.right = self._remove(node.right, start, key)
+        else:
+            if node.left is None:
+                return node.right
+            if node.right is None:
+                return node.left
+            successor = node.right
+            while successor.left is not None:
+                successor = successor.left
+            node.start, node.end, node.key = successor.start, successor.end, successor.key
+            node.right = self._remove(node.right, successor.start, successor.key)
+        return _rebalance(node)
+
+    def overlapping(self, start: datetime, end: datetime) -> List[Hashable]:
+        """Return the keys of the intervals overlapping [start, end), ordered by start."""
+        found: List[Hashable] = []
+        stack: List[Tuple[_Node, bool]] = [(self._root, False)] if self._root is not None else []
+        # In-order walk that prunes subtrees ending too early or starting too late.
+        while stack:
+            node, visited = stack.pop()
+            if visited:
+                if node.start < end and start < node.end:
+                    found.append(node.key)
+                continue
+            if node.max_end <= start:
+                continue
+            if node.right is not None and node.start < end:
+                stack.append((node.right, False))
+            stack.append((node, True))
+            if node.left is not None:
+                stack.append((node.left, False))
+        return found
+
+
+class PanelSlot(NamedTuple):
+    """The time slot of a panel and what it occupies."""
+
+    id: Optional[int]
+    name: str
+    start: datetime
+    end: datetime
+    room: Optional[str]
+    presenters: FrozenSet[int]
+
+
+class Conflict(NamedTuple):
+    """Two panels using the same room, or the same presenter, at the same time."""
+
+    kind: str
+    first: PanelSlot
+    second: PanelSlot
+    presenter_id: Optional[int] = None
+
+
+def panel_end(start: datetime, duration: Optional[int]) -> datetime:
+    """Return the end of a panel starting at `start` and lasting `duration` minutes."""
+    return start + timedelta(minutes=duration or 0)
+
+
+def _room(url: Optional[str]) -> Optional[str]:
+    url = (url or "").strip()
+    return url or None
+
+
+def make_slot(
+    panel_id: Optional[int],
+    name: str,
+    start: datetime,
+    duration: Optional[int],
+    url: Optional[str],
+    presenters: Iterable[int] = (),
+) -> PanelSlot:
+    """Return the slot of a panel from its columns."""
+    return PanelSlot(panel_id, name, start, panel_end(start, duration), _room(url), frozenset(presenters))
+
+
+class Schedule:
+    """The indexed slots of a conference."""
+
+    def __init__(self, slots: Iterable[PanelSlot] = ()) -> None:
+        self._slots: Dict[int, PanelSlot] = {}
+        self._rooms: Dict[str, IntervalTree] = defaultdict(IntervalTree)
+        self._presenters: Dict[int, IntervalTree] = defaultdict(IntervalTree)
+        for slot in slots:
+            self.add(slot)
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def __contains__(self, panel_id: int) -> bool:
+        return panel_id in self._slots
+
+    def __iter__(self) -> Iterator[PanelSlot]:
+        return iter(self._slots.values())
+
+    def get(self, panel_id: int) -> Optional[PanelSlot]:
+        """Return the slot of a panel, None if it is not scheduled."""
+        return self._slots.get(panel_id)
+
+    def _trees(self, slot: PanelSlot) -> Iterator[Tuple[str, Optional[int], IntervalTree]]:
+        if slot.room is not None:
+            yield ROOM, None, self._rooms[slot.room]
+        for presenter_id in sorted(slot.presenters):
+            yield PRESENTER, presenter_id, self._presenters[presenter_id]
+
+    def add(self, slot: PanelSlot) -> None:
+        """Index a panel. A panel that is already scheduled is moved."""
+        if slot.id in self._slots:
+            self.remove(slot.id)
+        self._slots[slot.id] = slot
+        for _, _, tree in self._trees(slot):
+            tree.insert(slot.start, slot.end, slot.id)
+
+    def remove(self, panel_id: int) -> None:
+        """Drop a panel from the schedule."""
+        slot = self._slots.pop(panel_id)
+        for _, _, tree in self._trees(slot):
+            tree.remove(slot.start, slot.id)
+
+    def conflicts_with(self, slot: PanelSlot) -> List[Conflict]:
+        """Return the conflicts `slot` would have with the other panels.
+
+        The panel itself is ignored, so an edited panel can be checked before
+        its new slot replaces the old one.
+        """
+        conflicts = []
+        for kind, presenter_id, tree in self._trees(slot):
+            for other_id in tree.overlapping(slot.start, slot.end):
+                if other_id != slot.id:
+                    conflicts.append(Conflict(kind, slot, self._slots[other_id], presenter_id))
+        return conflicts
+
+    def report(self) -> List[Conflict]:
+        """Return every conflict of the conference, ordered by time.
+
+        One sweep over the slots by start time. Each room and presenter keeps a
+        heap of the slots still running, which are the conflicts of the next
+        slot starting there.
+        """
+        running: Dict[Tuple[str, Hashable], List[Tuple[datetime, int]]] = defaultdict(list)
+        conflicts = []
+        for slot in sorted(self._slots.values(), key=lambda s: (s.start, s.id)):
+            resources = [(ROOM, slot.room)] if slot.room is not None else []
+            resources.extend((PRESENTER, presenter_id) for presenter_id in sorted(slot.presenters))
+            for kind, resource in resources:
+                heap = running[kind, resource]
+                while heap and heap[0][0] <= slot.start:
+                    heapq.heappop(heap)
+                presenter_id = resource if kind == PRESENTER else None
+                for _, other_id in sorted(heap, key=lambda item: self._slots[item[1]].start):
+                    conflicts.append(Conflict(kind, self._slots[other_id], slot, presenter_id))
+                heapq.heappush(heap, (slot.end, slot.id))
+        return conflicts
+
+
+def load_schedule(session: Session, conference_id: int) -> Schedule:
+    """Build the schedule of a conference with two column-only queries."""
+    presenters: Dict[int, List[int]] = defaultdict(list)
+    participation_stmt = (
+        select(Participation.c.panel_id, Participation.c.participant_id)
+        .join(Panel, Panel.id == Participation.c.panel_id)
+        .where(Panel.conference_id == conference_id)
+    )
+    for panel_id, participant_id in session.execute(participation_stmt):
+        presenters[panel_id].append(participant_id)
+
+    panel_stmt = select(Panel.id, Panel.name, Panel.start, Panel.duration, Panel.url).where(
+        Panel.conference_id == conference_id
+    )
+    return Schedule(
+        make_slot(panel_id, name, start, duration, url, presenters.get(panel_id, ()))
+        for panel_id, name, start, duration, url in session.execute(panel_stmt)
+        if start is not None
+    )
+
+
+class _Schedules:
+    """The schedules loaded by the process, by conference and fragment generation.
+
+    Every write moves the generation of its conference on, so a write of any
+    worker makes the others load the schedule again. Schedules are mutated in
+    place, `lock` is held while one is used.
+    """
+
+    def __init__(self, maxsize: int = 64, ttl: float = 3600) -> None:
+        self.entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.lock = threading.Lock()
+
+    def load(self, session: Session, conference_id: int, generation: int) -> Schedule:
+        schedule = self.entries.get((conference_id, generation))
+        if schedule is None:
+            schedule = load_schedule(session, conference_id)
+            self.entries.set((conference_id, generation), schedule)
+        return schedule
+
+
+def _schedules() -> _Schedules:
+    return current_app.extensions.setdefault("schedules", _Schedules())
+
+
+@contextmanager
+def reading_schedule(session: Session, conference_id: int) -> Iterator[Schedule]:
+    """Yield the schedule of a conference, which must not be changed."""
+    schedules = _schedules()
+    with schedules.lock:
+        yield schedules.load(session, conference_id, fragment_generation(conference_id))
+
+
+@contextmanager
+def editing_schedule(session: Session, conference_id: int) -> Iterator[Schedule]:
+    """Yield the schedule of a conference for a write of its panels.
+
+    The block checks the panels against the schedule, commits the write and
+    applies it to the schedule. The cached pages of the conference are then
+    invalidated (see `invalidate_fragments`), and the schedule is kept for the
+    new generation unless another write came in between.
+    """
+    schedules = _schedules()
+    with schedules.lock:
+        generation = fragment_generation(conference_id)
+        schedule = schedules.load(session, conference_id, generation)
+        # Dropped until the block succeeded, it may be half-changed otherwise.
+        schedules.entries.delete((conference_id, generation))
+        yield schedule
+        if invalidate_fragments(conference_id) == generation + 1:
+            schedules.entries.set((conference_id, generation + 1), schedule)
+
+
+def describe(conflict: Conflict) -> str:
+    """Return a human readable description of a conflict."""
+    if conflict.kind == ROOM:
+        return f"Panel {conflict.first.name!r} and {conflict.second.name!r} use the same room at the same time."
+    return (
+        f"Panel {conflict.first.name!r} and {conflict.second.name!r} have the same presenter "
+        f"(participant #{conflict.presenter_id}) at the same time."
+    )
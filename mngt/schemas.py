@@ -1,12 +1,16 @@
 """Schema for the API endpoints."""
-from marshmallow import Schema, fields
+from datetime import timezone
+
+from marshmallow import (
+    Schema, ValidationError, fields, validate, validates_schema
+)
 
 
 class PresentationSchema(Schema):
     """Schema for the presetntation."""
 
-    participant_id = fields.Int()
-    role = fields.Str()
+    participant_id = fields.Int(required=True)
+    role = fields.Str(load_default="presenter")
     order = fields.Int()
 
 
@@ -14,8 +18,77 @@ class NewPanelSchema(Schema):
     """Schema for the panel."""
 
     name = fields.Str(required=True)
-    start = fields.DateTime(required=True)
-    duration = fields.Int(required=True)
-    gap = fields.Int(required=True)
+    # Panels are stored in naive UTC, a start with an offset is converted to it.
+    start = fields.NaiveDateTime(required=True, timezone=timezone.utc)
+    duration = fields.Int(required=True, validate=validate.Range(min=1))
+    gap = fields.Int(required=True, validate=validate.Range(min=0))
+    url = fields.Str(load_default=None, allow_none=True)
+
+    presentations = fields.Nested(PresentationSchema(many=True), load_default=list)
+
+    @validates_schema
+    def validate_gap(self, data: dict, **kwargs) -> None:
+        """Check that the gap between presentations fits in the panel."""
+        if data["gap"] >= data["duration"]:
+            raise ValidationError("The gap must be shorter than the duration of the panel.", "gap")
+
+
+class PanelAssemblySchema(Schema):
+    """Schema for drafting the panels of a conference."""
+
+    presentations_per_panel = fields.Int(load_default=4, validate=validate.Range(min=1))
+    presentation_minutes = fields.Int(load_default=20, validate=validate.Range(min=1))
+    gap = fields.Int(load_default=5, validate=validate.Range(min=0))
+    break_minutes = fields.Int(load_default=15, validate=validate.Range(min=0))
+    rooms = fields.Int(load_default=1, validate=validate.Range(min=1))
+    group_by_topic = fields.Bool(load_default=True)
+    save = fields.Bool(load_default=False)
+
+
+PROPOSAL_BATCH_LIMIT = 1000
+
+
+class NewProposalSchema(Schema):
+    """Schema for a new proposal."""
+
+    author_id = fields.Int(required=True)
+    title = fields.Str(required=True, validate=validate.Length(min=1, max=300))
+    type = fields.Str(required=True, validate=validate.Length(min=1, max=200))
+    abstract = fields.Str(required=True)
+
+
+class ProposalUpdateSchema(Schema):
+    """Schema for the changes to a proposal."""
+
+    proposal_id = fields.Int(required=True)
+    author_id = fields.Int()
+    title = fields.Str(validate=validate.Length(min=1, max=300))
+    type = fields.Str(validate=validate.Length(min=1, max=200))
+    abstract = fields.Str()
+
+    @validates_schema
+    def validate_changes(self, data: dict, **kwargs) -> None:
+        """Check that something changes."""
+        if len(data) < 2:
+            raise ValidationError("Give at least one field to update.")
+
+
+class ProposalBatchSchema(Schema):
+    """Schema for the proposals to create, update and delete at once."""
+
+    create = fields.Nested(
+        NewProposalSchema(many=True), load_default=list, validate=validate.Length(max=PROPOSAL_BATCH_LIMIT)
+    )
+    update = fields.Nested(
+        ProposalUpdateSchema(many=True), load_default=list, validate=validate.Length(max=PROPOSAL_BATCH_LIMIT)
+    )
+    delete = fields.List(fields.Int(), load_default=list, validate=validate.Length(max=PROPOSAL_BATCH_LIMIT))
 
-    presentations = fields.Nested(PresentationSchema(many=True))
+    @validates_schema
+    def validate_unique(self, data: dict, **kwargs) -> None:
+        """Check that each proposal is updated and deleted at most once."""
+        updated = [item["proposal_id"] for item in data["update"]]
+        if len(set(updated)) != len(updated):
+            raise ValidationError("A proposal can only be updated once per batch.", "update")
+        if len(set(data["delete"])) != len(data["delete"]):
+            raise ValidationError("A proposal can only be deleted once per batch.", "delete")
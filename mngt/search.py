@@ -0,0 +1,311 @@
+"""Full-text search over proposals and participants.
+
+SQLite databases get FTS5 tables kept in sync by triggers, PostgreSQL gets
+GIN indexes over `to_tsvector` expressions. Other databases fall back to the
+unindexed `LIKE` search.
+"""
+import re
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import and_, func, literal_column, or_, select, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session, joinedload, load_only
+from sqlalchemy.sql import column, table
+
+from .models import Participant, Proposal
+
+_TERM = re.compile(r"\w+", re.UNICODE)
+
+proposal_search = table(
+    "proposal_search", column("rowid"), column("conference_id"), column("rank")
+)
+participant_search = table(
+    "participant_search", column("rowid"), column("conference_id"), column("rank")
+)
+
+# Denormalized author columns of a proposal, from its participant row `p`.
+_SQLITE_PROPOSAL_ROW = """
+SELECT pr.id, pr.title, pr.abstract,
+       trim(coalesce(p.first_name, '') || ' ' || coalesce(p.last_name, '')),
+       p.affiliation, pr.conference_id
+FROM proposal AS pr LEFT JOIN participant AS p ON p.id = pr.author_id
+"""
+
+_SQLITE_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS proposal_search USING fts5(
+        title, abstract, author, affiliation, conference_id UNINDEXED,
+        tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+    )
+    """,
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS participant_search USING fts5(
+        first_name, last_name, affiliation, conference_id UNINDEXED,
+        tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS proposal_search_ai AFTER INSERT ON proposal
+    WHEN coalesce(new.is_deleted, 0) = 0
+    BEGIN
+        INSERT INTO proposal_search (rowid, title, abstract, author, affiliation, conference_id)
+        {_SQLITE_PROPOSAL_ROW} WHERE pr.id = new.id;
+    END
+    """,
+    # Soft-deleted proposals leave the index, restored ones come back.
+    f"""
+    CREATE TRIGGER IF NOT EXISTS proposal_search_au AFTER UPDATE ON proposal
+    BEGIN
+        DELETE FROM proposal_search WHERE rowid = old.id;
+        INSERT INTO proposal_search (rowid, title, abstract, author, affiliation, conference_id)
+        {_SQLITE_PROPOSAL_ROW} WHERE pr.id = new.id AND coalesce(new.is_deleted, 0) = 0;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS proposal_search_ad AFTER DELETE ON proposal
+    BEGIN
+        DELETE FROM proposal_search WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS participant_search_ai AFTER INSERT ON participant
+    BEGIN
+        INSERT INTO participant_search (rowid, first_name, last_name, affiliation, conference_id)
+        VALUES (new.id, new.first_name, new.last_name, new.affiliation, new.conference_id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS participant_search_au AFTER UPDATE ON participant
+    BEGIN
+        DELETE FROM participant_search WHERE rowid = old.id;
+        INSERT INTO participant_search (rowid, first_name, last_name, affiliation, conference_id)
+        VALUES (new.id, new.first_name, new.last_name, new.affiliation, new.conference_id);
+        UPDATE proposal_search
+        SET author = trim(coalesce(new.first_name, '') || ' ' || coalesce(new.last_name, '')),
+            affiliation = new.affiliation
+        WHERE rowid IN (SELECT id FROM proposal WHERE author_id = new.id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS participant_search_ad AFTER DELETE ON participant
+    BEGIN
+        DELETE FROM participant_search WHERE rowid = old.id;
+    END
+    """,
+]
+
+_SQLITE_REBUILD = [
+    "DELETE FROM proposal_search",
+    f"""
+    INSERT INTO proposal_search (rowid, title, abstract, author, affiliation, conference_id)
+    {_SQLITE_PROPOSAL_ROW} WHERE coalesce(pr.is_deleted, 0) = 0
+    """,
+    "DELETE FROM participant_search",
+    """
+    INSERT INTO participant_search (rowid, first_name, last_name, affiliation, conference_id)
+    SELECT id, first_name, last_name, affiliation, conference_id FROM participant
+    """,
+]
+
+# The insert triggers, dropped while bulk loading.
+_SQLITE_INSERT_TRIGGERS = ["proposal_search_ai", "participant_search_ai"]
+
+# Index the rows added by a bulk load, the ones above the ids it started from.
+_SQLITE_INDEX_NEW_ROWS = [
+    f"""
+    INSERT INTO proposal_search (rowid, title, abstract, author, affiliation, conference_id)
+    {_SQLITE_PROPOSAL_ROW} WHERE pr.id > :proposal_id AND coalesce(pr.is_deleted, 0) = 0
+    """,
+    """
+    INSERT INTO participant_search (rowid, first_name, last_name, affiliation, conference_id)
+    SELECT id, first_name, last_name, affiliation, conference_id FROM participant WHERE id > :participant_id
+    """,
+]
+
+# The document of each table, shared by the index definition and the queries
+# so PostgreSQL can match them up.
+_PG_PROPOSAL_DOCUMENT = "to_tsvector('simple', coalesce(title, '') || ' ' || coalesce(abstract, ''))"
+_PG_PARTICIPANT_DOCUMENT = (
+    "to_tsvector('simple', coalesce(first_name, '') || ' ' || coalesce(last_name, '') "
+    "|| ' ' || coalesce(affiliation, ''))"
+)
+
+_PG_DDL = [
+    f"CREATE INDEX IF NOT EXISTS ix_proposal_search ON proposal USING GIN ({_PG_PROPOSAL_DOCUMENT})",
+    f"CREATE INDEX IF NOT EXISTS ix_participant_search ON participant USING GIN ({_PG_PARTICIPANT_DOCUMENT})",
+]
+
+
+def install_search_index(conn: Connection) -> None:
+    """Create the search tables/indexes and triggers if they do not exist."""
+    if conn.dialect.name == "sqlite":
+        for ddl in _SQLITE_DDL:
+            conn.execute(text(ddl))
+    elif conn.dialect.name == "postgresql":
+        for ddl in _PG_DDL:
+            conn.execute(text(ddl))
+
+
+def rebuild_search_index(conn: Connection) -> None:
+    """Repopulate the SQLite search tables from the source tables.
+
+    PostgreSQL indexes are maintained by the database itself.
+    """
+    install_search_index(conn)
+    if conn.dialect.name == "sqlite":
+        for stmt in _SQLITE_REBUILD:
+            conn.execute(text(stmt))
+
+
+@contextmanager
+def bulk_indexing(conn: Connection) -> Iterator[None]:
+    """Index the proposals and participants inserted in the block all at once at its end.
+
+    Maintaining the SQLite index row by row costs about three times as much
+    as indexing the new rows in one statement. Only inserts are supported:
+    the new rows must have higher ids than the existing ones, and nothing
+    may be updated or deleted in the block.
+    """
+    if conn.dialect.name != "sqlite":
+        yield
+        return
+
+    proposal_id = conn.execute(select(func.coalesce(func.max(Proposal.id), 0))).scalar()
+    participant_id = conn.execute(select(func.coalesce(func.max(Participant.id), 0))).scalar()
+    for trigger in _SQLITE_INSERT_TRIGGERS:
+        conn.execute(text(f"DROP TRIGGER IF EXISTS {trigger}"))
+    yield
+    for stmt in _SQLITE_INDEX_NEW_ROWS:
+        conn.execute(text(stmt), {"proposal_id": proposal_id, "participant_id": participant_id})
+    install_search_index(conn)
+
+
+def terms(query: Optional[str]) -> List[str]:
+    """Split the user query into search terms."""
+    if query is None:
+        return []
+    return _TERM.findall(query)
+
+
+def _fts5_query(terms: List[str]) -> str:
+    """Every term must match, the last one may be incomplete (type-ahead)."""
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def _tsquery(terms: List[str]) -> str:
+    return " & ".join(f"{term}:*" for term in terms)
+
+
+def _dialect(session: Session) -> str:
+    return session.get_bind().dialect.name
+
+
+def search_proposals(session: Session, conference_id: int, query: Optional[str], limit: int) -> List[Proposal]:
+    """Return the best matching, non-deleted proposals of a conference.
+
+    The title, abstract, author names and affiliation are searched, and every
+    word is matched as a prefix.
+    """
+    query_terms = terms(query)
+    if not query_terms:
+        return []
+
+    # Only what the results show.
+    stmt = (
+        select(Proposal)
+        .options(
+            load_only(Proposal.id, Proposal.short_title),
+            joinedload(Proposal.author).load_only(Participant.first_name, Participant.last_name),
+        )
+        .where(Proposal.conference_id == conference_id)
+        .where(Proposal.is_deleted == False)  # noqa: E712
+        .limit(limit)
+    )
+
+    dialect = _dialect(session)
+    if dialect == "sqlite":
+        stmt = (
+            stmt.join(proposal_search, proposal_search.c.rowid == Proposal.id)
+            .where(literal_column("proposal_search").op("MATCH")(_fts5_query(query_terms)))
+            .where(proposal_search.c.conference_id == conference_id)
+            .order_by(proposal_search.c.rank)
+        )
+    elif dialect == "postgresql":
+        tsquery = func.to_tsquery("simple", _tsquery(query_terms))
+        proposal_document = literal_column(_PG_PROPOSAL_DOCUMENT)
+        participant_document = literal_column(_PG_PARTICIPANT_DOCUMENT)
+        matching_authors = select(Participant.id).where(participant_document.op("@@")(tsquery))
+        stmt = stmt.where(
+            or_(proposal_document.op("@@")(tsquery), Proposal.author_id.in_(matching_authors))
+        ).order_by(func.ts_rank(proposal_document, tsquery).desc(), Proposal.id)
+    else:
+        conditions = [
+            or_(
+                Proposal.title.contains(term),
+                Proposal.abstract.contains(term),
+                Participant.first_name.contains(term),
+                Participant.last_name.contains(term),
+                Participant.affiliation.contains(term),
+            )
+            for term in query_terms
+        ]
+        stmt = stmt.join(Proposal.author).where(and_(*conditions)).order_by(Proposal.created.desc())
+
+    return session.execute(stmt).unique().scalars().all()
+
+
+def search_participants(
+    session: Session, conference_id: int, query: Optional[str], limit: int
+) -> List[Participant]:
+    """Return the best matching participants of a conference by name or affiliation."""
+    query_terms = terms(query)
+    if not query_terms:
+        return []
+
+    stmt = (
+        select(Participant)
+        .options(load_only(Participant.first_name, Participant.last_name))
+        .where(Participant.conference_id == conference_id)
+        .limit(limit)
+    )
+
+    dialect = _dialect(session)
+    if dialect == "sqlite":
+        stmt = (
+            stmt.join(participant_search, participant_search.c.rowid == Participant.id)
+            .where(literal_column("participant_search").op("MATCH")(_fts5_query(query_terms)))
+            .where(participant_search.c.conference_id == conference_id)
+            .order_by(participant_search.c.rank)
+        )
+    elif dialect == "postgresql":
+        tsquery = func.to_tsquery("simple", _tsquery(query_terms))
+        document = literal_column(_PG_PARTICIPANT_DOCUMENT)
+        stmt = stmt.where(document.op("@@")(tsquery)).order_by(
+            func.ts_rank(document, tsquery).desc(), Participant.id
+        )
+    else:
+        conditions = [
+            or_(
+                Participant.first_name.contains(term),
+                Participant.last_name.contains(term),
+                Participant.affiliation.contains(term),
+            )
+            for term in query_terms
+        ]
+        stmt = stmt.where(and_(*conditions)).order_by(Participant.last_name, Participant.first_name)
+
+    return session.execute(stmt).scalars().all()
+
+
+@click.command("rebuild-search-index")
+@with_appcontext
+def rebuild_search_index_command() -> None:
+    """Recreate the full-text search index from the database content."""
+    from .db import get_engine
+
+    with get_engine().begin() as conn:
+        rebuild_search_index(conn)
+    click.echo("Rebuilt the search index.")
@@ -0,0 +1,277 @@
+"""Synthetic conferences for benchmarks and capacity planning.
+
+The data has the shapes of the COTS data: participants with a name and an
+affiliation, proposals (papers, panels, roundtables) with a title and an
+abstract a few sentences long, and panels of three to five presenters in the
+rooms of the conference. Every panel has a room and time slot of its own, and
+nobody presents twice at the same time. The same seed always gives the same
+rows.
+
+Everything is written with batched Core inserts with precomputed primary
+keys, so nothing is read back, and the text is drawn from pools of
+pregenerated sentences. The search index is filled once at the end rather
+than row by row (see `mngt.search.bulk_indexing`).
+"""
+import math
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Iterator, List, NamedTuple, Optional, Sequence, Set
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import func, insert, select
+from sqlalchemy.engine import Connection, Engine
+
+from .counters import invalidate_counts, recount
+from .models import Conference, Panel, Participant, Participation, Proposal
+from .search import bulk_indexing
+
+_WORDS = (
+    "language culture identity migration border religion ritual music film media memory heritage "
+    "gender politics economy trade education health urban rural community history literature art "
+    "network tourism ecology river forest village city nation state power knowledge monastery "
+    "kingdom chronicle temple labor market family youth cinema television novel poetry dance "
+    "agriculture rice water climate development democracy protest military monarchy buddhism "
+    "islam christianity spirit medicine food cuisine diaspora refugee ethnicity minority highland"
+).split()
+_FIRST_NAMES = (
+    "Somchai Malee Anan Ploy Kittisak Nok Jan Water Bobby Dao Arun Mali Chai Fah Niran Siri Pim "
+    "Thanawat Wanida Ekkachai Kanya Maria John Akira Mei Ahmad Sarah David Linh Minh Ratana"
+).split()
+_LAST_NAMES = (
+    "Saetang Wong Srisuk Chaiyaporn Boonmee Rattana Thongdee Suwan Kaewmanee Dressler Smith "
+    "Tanaka Nguyen Rahman Keyes Jackson Phongpaichit Winichakul Baker Reynolds Hewison Tran"
+).split()
+# A conference lasts 3 days of 6 slots, 90 minute panels with 15 minute breaks.
+_DAYS, _SLOTS_PER_DAY, _SLOT_MINUTES = 3, 6, 105
+_AFFILIATIONS = [
+    f"{kind} {place}"
+    for kind in ("University of", "Institute of Asian Studies,", "Department of Anthropology,")
+    for place in ("Chiang Mai", "Hamburg", "Wisconsin", "Ohio", "Kyoto", "Singapore", "Bangkok", "Leiden")
+]
+PROPOSAL_TYPES = ("paper", "panel", "roundtable")
+
+
+class SeedSizes(NamedTuple):
+    """How much data is generated, in total over the conferences."""
+
+    conferences: int = 1
+    participants: int = 1000
+    proposals: int = 2000
+    panels: int = 100
+
+
+ProgressCallback = Callable[[str, int], None]
+
+
+class _Text:
+    """Pools of random sentences, reused to build titles and abstracts cheaply."""
+
+    def __init__(self, rng: random.Random, size: int = 4096) -> None:
+        self.rng = rng
+        self.titles = [self._sentence(rng.randint(4, 14)) for _ in range(size)]
+        sentences = [self._sentence(rng.randint(8, 20)) + "." for _ in range(size)]
+        # Every run of 3 to 9 consecutive sentences is an abstract.
+        self.abstracts = [" ".join(sentences[i:i + n]) for i in range(size - 9) for n in range(3, 10)]
+
+    def _sentence(self, words: int) -> str:
+        return " ".join(self.rng.choice(_WORDS) for _ in range(words)).capitalize()
+
+    def title(self) -> str:
+        return self.titles[int(self.rng.random() * len(self.titles))]
+
+    def abstract(self) -> str:
+        return self.abstracts[int(self.rng.random() * len(self.abstracts))]
+
+
+def _split(total: int, parts: int) -> List[int]:
+    """Split `total` into `parts` near-equal integers."""
+    return [total // parts + (1 if i < total % parts else 0) for i in range(parts)]
+
+
+def _batches(rows: Iterator[dict], size: int) -> Iterator[List[dict]]:
+    batch: List[dict] = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _next_id(conn: Connection, column: object) -> int:
+    return (conn.execute(select(func.max(column))).scalar() or 0) + 1
+
+
+def generate(
+    engine: Engine,
+    sizes: SeedSizes,
+    seed: int = 0,
+    batch_size: int = 10000,
+    progress: Optional[ProgressCallback] = None,
+) -> List[int]:
+    """Create the synthetic conferences and return their ids.
+
+    The conferences are called "synthetic-<seed>-<n>", generating the same seed twice fails on their slugs.
+
+    :param progress: Called with the table and the number of rows written to it so far.
+    """
+    rng = random.Random(seed)
+    text = _Text(rng)
+
+    def pick(choices: Sequence[str]) -> str:
+        # Cheaper than rng.choice, which matters for half a million rows.
+        return choices[int(rng.random() * len(choices))]
+    now = datetime(2021, 6, 1)
+
+    def report(table: str, count: int) -> None:
+        if progress is not None:
+            progress(table, count)
+
+    with engine.begin() as conn, bulk_indexing(conn):
+        conference_ids = []
+        participant_id = _next_id(conn, Participant.id)
+        proposal_id = _next_id(conn, Proposal.id)
+        panel_id = _next_id(conn, Panel.id)
+
+        shares = zip(
+            _split(sizes.participants, sizes.conferences),
+            _split(sizes.proposals, sizes.conferences),
+            _split(sizes.panels, sizes.conferences),
+        )
+        for n, (participants, proposals, panels) in enumerate(shares, 1):
+            begin = datetime(2021, 11, 12, 9) + timedelta(days=365 * (n - 1))
+            end = begin + timedelta(days=_DAYS - 1, minutes=_SLOTS_PER_DAY * _SLOT_MINUTES)
+            conference_id = conn.execute(
+                insert(Conference).values(
+                    name=f"Synthetic {seed}-{n}",
+                    slug=f"synthetic-{seed}-{n}",
+                    description=f"Synthetic conference {n} generated from seed {seed}",
+                    begin=begin,
+                    end=end,
+                    created=now,
+                    modified=now,
+                )
+            ).inserted_primary_key[0]
+            conference_ids.append(conference_id)
+            first_participant = participant_id
+
+            def participant_rows() -> Iterator[dict]:
+                for i in range(participant_id, participant_id + participants):
+                    yield {
+                        "id": i,
+                        "conference_id": conference_id,
+                        "email": f"participant{i}@synthetic-{seed}.example.org",
+                        "first_name": pick(_FIRST_NAMES),
+                        "last_name": pick(_LAST_NAMES),
+                        "affiliation": pick(_AFFILIATIONS),
+                        "created": now,
+                        "modified": now,
+                    }
+
+            written = 0
+            for batch in _batches(participant_rows(), batch_size):
+                conn.execute(insert(Participant), batch)
+                written += len(batch)
+                report("participant", written)
+            participant_id += participants
+
+            def proposal_rows() -> Iterator[dict]:
+                for i in range(proposal_id, proposal_id + proposals):
+                    created = now + timedelta(seconds=int(rng.random() * 90 * 86400))
+                    yield {
+                        "id": i,
+                        "conference_id": conference_id,
+                        "author_id": first_participant + int(rng.random() * participants) if participants else None,
+                        "title": text.title(),
+                        "type": pick(PROPOSAL_TYPES),
+                        "abstract": text.abstract(),
+                        "is_deleted": rng.random() < 0.02,
+                        "created": created,
+                        "modified": created,
+                    }
+
+            written = 0
+            for batch in _batches(proposal_rows(), batch_size):
+                conn.execute(insert(Proposal), batch)
+                written += len(batch)
+                report("proposal", written)
+            proposal_id += proposals
+
+            # Every room is used in every slot before the next slot, with as many
+            # rooms (8 at least) as it takes to fit the panels in the conference.
+            rooms = max(8, math.ceil(panels / (_DAYS * _SLOTS_PER_DAY)))
+            panel_rows, participation_rows = [], []
+            busy: Set[int] = set()
+            for i in range(panels):
+                slot, room = divmod(i, rooms)
+                day, slot_of_day = divmod(slot, _SLOTS_PER_DAY)
+                if room == 0:
+                    busy = set()
+                panel_rows.append(
+                    {
+                        "id": panel_id + i,
+                        "conference_id": conference_id,
+                        "name": f"{text.title()[:150]}",
+                        "start": begin + timedelta(days=day, minutes=_SLOT_MINUTES * slot_of_day),
+                        "duration": 90,
+                        "gap": 5,
+                        "url": f"https://zoom.example.org/synthetic-{seed}-{n}/room-{room + 1}",
+                        "created": now,
+                        "modified": now,
+                    }
+                )
+                # Presenters of the other panels of the slot are not available.
+                presenters: List[int] = []
+                wanted = min(rng.randint(3, 5), participants - len(busy))
+                while len(presenters) < wanted:
+                    p = int(rng.random() * participants)
+                    if p not in busy:
+                        busy.add(p)
+                        presenters.append(p)
+                participation_rows.extend(
+                    {
+                        "panel_id": panel_id + i,
+                        "participant_id": first_participant + p,
+                        "role": "presenter",
+                        "order": order,
+                    }
+                    for order, p in enumerate(presenters, 1)
+                )
+            for start in range(0, len(panel_rows), batch_size):
+                conn.execute(insert(Panel), panel_rows[start:start + batch_size])
+                report("panel", min(start + batch_size, len(panel_rows)))
+            for start in range(0, len(participation_rows), batch_size):
+                conn.execute(insert(Participation), participation_rows[start:start + batch_size])
+            panel_id += panels
+
+            recount(conn, conference_id)
+    invalidate_counts()
+    return conference_ids
+
+
+@click.command("seed-synthetic")
+@click.option("--conferences", default=1, show_default=True, help="Conferences to create.")
+@click.option("--participants", default=1000, show_default=True, help="Participants, over all conferences.")
+@click.option("--proposals", default=2000, show_default=True, help="Proposals, over all conferences.")
+@click.option("--panels", default=100, show_default=True, help="Panels, over all conferences.")
+@click.option("--seed", default=0, show_default=True, help="The same seed generates the same data.")
+@click.option("--batch-size", default=10000, show_default=True, help="Rows per insert.")
+@with_appcontext
+def seed_synthetic_command(
+    conferences: int, participants: int, proposals: int, panels: int, seed: int, batch_size: int
+) -> None:
+    """Generate synthetic conferences, e.g. --participants 100000 --proposals 500000 --panels 10000."""
+    from .db import get_engine
+
+    started = time.perf_counter()
+
+    def progress(table: str, count: int) -> None:
+        click.echo(f"\r{table}: {count} rows", nl=False)
+
+    ids = generate(
+        get_engine(), SeedSizes(conferences, participants, proposals, panels), seed, batch_size, progress
+    )
+    click.echo(f"\rCreated conferences {ids} in {time.perf_counter() - started:.1f}s")
@@ -0,0 +1,84 @@
+"""Serialization of the API responses.
+
+The API selects the columns of the fields it returns rather than ORM objects,
+and the client can ask for fewer with a sparse fieldset, e.g.
+`?fields=proposal_id,title`. The responses are encoded with orjson when it is
+installed, with the json module of the standard library otherwise.
+"""
+import json
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence
+
+from flask import Response, make_response, request
+from sqlalchemy.engine import Row
+from sqlalchemy.sql import ColumnElement
+
+from .models import Proposal
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+PROPOSAL_FIELDS: Dict[str, ColumnElement] = {
+    "proposal_id": Proposal.id,
+    "title": Proposal.title,
+    "short_title": Proposal.short_title,
+    "type": Proposal.type,
+    "abstract": Proposal.abstract,
+    "author_id": Proposal.author_id,
+    "created": Proposal.created,
+    "modified": Proposal.modified,
+}
+
+
+def sparse_fields(available: Mapping[str, ColumnElement], default: Sequence[str]) -> List[str]:
+    """Return the fields of the `fields` query argument, or the default ones without it.
+
+    An empty `fields=` asks for every available field.
+
+    :param available: The columns of the fields that can be asked for, by name.
+    :raises ValueError: when a field is not available.
+    """
+    value = request.args.get("fields")
+    if value is None:
+        return list(default)
+    fields = list(dict.fromkeys(name.strip() for name in value.split(",") if name.strip()))
+    if not fields:
+        return list(available)
+    unknown = [name for name in fields if name not in available]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}. Choose from {', '.join(available)}.")
+    return fields
+
+
+def field_columns(available: Mapping[str, ColumnElement], fields: Sequence[str]) -> List[ColumnElement]:
+    """Return the columns to select for the fields, labelled with their names."""
+    return [available[name].label(name) for name in fields]
+
+
+def rows_as_dicts(rows: Iterable[Row], fields: Sequence[str]) -> List[dict]:
+    """Return the fields of the rows selected with `field_columns`."""
+    return [{name: row._mapping[name] for name in fields} for row in rows]
+
+
+def _default(value: Any) -> str:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def dumps(data: Any) -> bytes:
+    """Encode the data as JSON, datetimes in ISO 8601."""
+    if orjson is not None:
+        # marshmallow reports the errors of list items under integer keys.
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, default=_default, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def output_json(data: Any, code: int, headers: Optional[dict] = None) -> Response:
+    """Flask-RESTful representation of the responses as JSON, with `dumps`."""
+    response = make_response(dumps(data) + b"\n", code)
+    response.headers.extend(headers or {})
+    response.mimetype = "application/json"
+    return response
@@ -0,0 +1,76 @@
+"""Gunicorn worker settings and their consistency with the database pool.
+
+The sync worker handles one request at a time, so `-w 2` serves at most two
+requests at once and a slow OAuth round trip or search blocks a whole
+worker. The supported concurrent modes are:
+
+- "gthread": each worker runs `threads` requests in threads. Waiting on the
+  network or the database releases the GIL, so the other threads go on.
+- "gevent": each worker runs up to `worker_connections` requests in
+  greenlets (15 by default, the default database pool). Needs the gevent
+  package, which patches the standard library.
+
+Every concurrent request of a worker may hold a pooled connection, so the
+pool of the worker (`DATABASE_POOL_SIZE` + `DATABASE_MAX_OVERFLOW`) has to be
+large enough, otherwise requests queue for a connection, then fail after
+the pool timeout. `gunicorn.conf.py` refuses to start when it is not.
+"""
+import importlib.util
+import os
+from typing import List, NamedTuple
+
+WORKER_CLASSES = ("sync", "gthread", "gevent")
+
+
+class WorkerSettings(NamedTuple):
+    """How many workers gunicorn runs and how many requests each one serves at once."""
+
+    workers: int
+    worker_class: str
+    threads: int
+    worker_connections: int
+
+    @property
+    def concurrency(self) -> int:
+        """The number of requests a worker serves at the same time."""
+        if self.worker_class == "gthread":
+            return self.threads
+        if self.worker_class == "gevent":
+            return self.worker_connections
+        return 1
+
+
+def worker_settings_from_env() -> WorkerSettings:
+    """Return the worker settings of `GUNICORN_*` environment variables."""
+    return WorkerSettings(
+        workers=int(os.getenv("GUNICORN_WORKERS", "2")),
+        worker_class=os.getenv("GUNICORN_WORKER_CLASS", "gthread"),
+        threads=int(os.getenv("GUNICORN_THREADS", "8")),
+        worker_connections=int(os.getenv("GUNICORN_WORKER_CONNECTIONS", "15")),
+    )
+
+
+def check_worker_settings(settings: WorkerSettings, pool_size: int, max_overflow: int) -> List[str]:
+    """Return what is wrong with the worker settings, nothing if they are fine.
+
+    :param pool_size: The `pool_size` of the engine of each worker.
+    :param max_overflow: The `max_overflow` of the engine of each worker.
+    """
+    problems = []
+    if settings.worker_class not in WORKER_CLASSES:
+        problems.append(f"Unknown worker class {settings.worker_class!r}, use one of {', '.join(WORKER_CLASSES)}.")
+        return problems
+    if settings.worker_class == "gevent" and importlib.util.find_spec("gevent") is None:
+        problems.append("The gevent worker class needs the gevent package, pip install gevent.")
+    if settings.workers < 1 or settings.concurrency < 1:
+        problems.append("There must be at least one worker serving at least one request.")
+
+    connections = pool_size + max_overflow
+    if connections < settings.concurrency:
+        setting = "GUNICORN_THREADS" if settings.worker_class == "gthread" else "GUNICORN_WORKER_CONNECTIONS"
+        problems.append(
+            f"Each worker serves {settings.concurrency} requests at once but its database pool only has "
+            f"{connections} connections (DATABASE_POOL_SIZE {pool_size} + DATABASE_MAX_OVERFLOW {max_overflow}). "
+            f"Lower {setting} or raise the pool."
+        )
+    return problems
@@ -0,0 +1,50 @@
+let proposalList = document.querySelector(".proposal-list");
+let newPanelList = document.querySelector(".new-panel-proposal-list");
+let drake = dragula([proposalList, newPanelList], {
+  accepts: function (el, target, source, sibling) {
+    // Prevent dropping back to the search result list.
+    if (
+      Array.from(target.classList).includes("proposal-list") &&
+      Array.from(source.classList).includes("new-panel-proposal-list")
+    ) {
+      return false;
+    }
+
+    // Prevent same ID to be dropped into the target.
+    if (
+      Array.from(target.classList).includes("new-panel-proposal-list")
+    ) {
+      let counter = new Map();
+      for (let item of target.children) {
+        if (counter.has(item.dataset.id)) {
+          const oldValue = counter.get(item.dataset.id);
+          counter.set(item.dataset.id, oldValue + 1);
+        } else {
+          counter.set(item.dataset.id, 1);
+        }
+      }
+      if (
+        counter.has(el.dataset.id) &&
+        counter.get(el.dataset.id) !== 1
+      ) {
+        return false;
+      }
+    }
+
+    return true;
+  },
+  removeOnSpill: true, // cannot be used when copy is true.
+  invalid: function (el, handle) {
+    // Prevent dragging of the empty result indicator.
+    if (Array.from(el.classList).includes("not-found")) {
+      return true;
+    }
+    return false;
+  },
+});
+
+// Low level API.
+drake.on("remove", function (el, container, source) {
+  console.log("remove");
+  console.log(el);
+});
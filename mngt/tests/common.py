@@ -1,16 +1,31 @@
 import os
 import tempfile
+from contextlib import contextmanager
+from datetime import datetime, timedelta
 
 import pytest
+from sqlalchemy import event
 
 from mngt import create_app
-from mngt.db import init_db
+from mngt.counters import recount
+from mngt.db import dispose_engines, get_engine, init_db
+from mngt.models import Conference, Panel, Participant, Proposal
+
 
 @pytest.fixture
 def client():
     """Return a fixture for client."""
     db_fd, db_path = tempfile.mkstemp()
-    app = create_app({"TESTING": True, "SQLALCHEMY_DATABASE_URI": f"sqlite+pysqlite:///{db_path}"})
+    app = create_app(
+        {
+            "TESTING": True,
+            "SECRET_KEY": "testing",
+            "LOGIN_DISABLED": True,
+            "WTF_CSRF_ENABLED": False,
+            "ENTRY_PER_PAGE": 10,
+            "SQLALCHEMY_DATABASE_URI": f"sqlite+pysqlite:///{db_path}",
+        }
+    )
 
     with app.test_client() as client:
         with app.app_context():
@@ -18,5 +33,54 @@ def client():
 
         yield client
 
+    dispose_engines()
     os.close(db_fd)
-    os.unlink(db_path)
\ No newline at end of file
+    os.unlink(db_path)
+
+
+def seed_conference(session, proposals: int = 0, panels: int = 0, slug: str = "cots-2021") -> Conference:
+    """Create a conference with a participant per proposal and participants on each panel."""
+    now = datetime.utcnow()
+    conf = Conference(name=slug, slug=slug, begin=now, end=now + timedelta(days=1), created=now, modified=now)
+    authors = []
+    for i in range(proposals):
+        author = Participant(
+            email=f"{slug}-{i}@example.com", first_name=f"First{i}", last_name=f"Last{i}", conference=conf
+        )
+        authors.append(author)
+        session.add(
+            Proposal(
+                conference=conf, author=author, title=f"Proposal {i}", type="paper", abstract="Lorem ipsum",
+                created=now + timedelta(seconds=i), modified=now, is_deleted=False,
+            )
+        )
+    for i in range(panels):
+        session.add(
+            Panel(
+                conference=conf, name=f"Panel {i}", start=now + timedelta(hours=i), duration=60, gap=5,
+                participants=authors[:3], created=now, modified=now,
+            )
+        )
+    session.add(conf)
+    session.flush()
+    recount(session, conf.id)
+    session.commit()
+    return conf
+
+
+@contextmanager
+def assert_max_queries(app, maximum: int):
+    """Fail if the block runs more than `maximum` SQL statements."""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = get_engine()
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    assert len(statements) <= maximum, f"{len(statements)} queries:\n" + "\n".join(statements)
@@ -0,0 +1,103 @@
+import time
+from datetime import datetime, timedelta
+
+from common import client, seed_conference  # noqa: F401
+
+from mngt.assembly import AssemblyOptions, ProposalItem, assemble, assemble_conference, save_program
+from mngt.cache import SQLiteBackend
+from mngt.db import get_session
+from mngt.jobs import JobRunner
+from mngt.models import Conference, Panel
+from mngt.scheduling import load_schedule
+
+
+def test_assemble_respects_the_window_and_the_presenters():
+    topics = ["angkor temple history", "rice farming economy", "bangkok urban migration"]
+    proposals = [ProposalItem(i, topics[i % 3], None, i % 7) for i in range(60)]
+    begin = datetime(2021, 11, 12, 9)
+    end = begin + timedelta(hours=8)
+    options = AssemblyOptions(presentations_per_panel=3, presentation_minutes=20, gap=5, break_minutes=10, rooms=2)
+
+    program = assemble(proposals, begin, end, options)
+
+    placed = [pid for panel in program.panels for pid in panel.proposal_ids]
+    assert sorted(placed + program.unscheduled) == list(range(60))
+    busy = {}
+    for panel in program.panels:
+        assert begin <= panel.start and panel.start + timedelta(minutes=panel.duration) <= end
+        assert len(set(panel.presenter_ids)) == len(panel.presenter_ids) <= 3
+        for presenter_id in panel.presenter_ids:
+            assert (panel.start, presenter_id) not in busy
+            busy[panel.start, presenter_id] = panel.name
+        # Every panel is about a single topic.
+        assert len({proposals[pid].title for pid in panel.proposal_ids}) == 1
+    # 8 hours hold 6 slots of 70 + 10 minutes with 2 rooms, the rest does not fit.
+    assert len(program.panels) == 12
+    assert len(program.unscheduled) == 60 - len(placed) > 0
+
+
+def test_assembly_job_creates_the_panels(client):  # noqa: F811
+    with client.application.app_context():
+        seed_conference(get_session(), proposals=10)
+
+    res = client.post(
+        "/api/v1/conferences/cots-2021/panels/assemble", json={"presentations_per_panel": 4, "save": True}
+    )
+    assert res.status_code == 202
+    job_url = res.headers["Location"]
+    for _ in range(100):
+        job = client.get(job_url).get_json()
+        if job["status"] in ("done", "failed"):
+            break
+        time.sleep(0.05)
+
+    assert job["status"] == "done"
+    assert job["progress"] == {"done": 10, "total": 10}
+    assert [len(p["proposal_ids"]) for p in job["result"]["panels"]] == [4, 4, 2]
+    with client.application.app_context():
+        session = get_session()
+        assert session.query(Panel).count() == 3
+        assert session.query(Conference).one().panel_count == 3
+
+    res = client.post("/api/v1/conferences/cots-2021/panels/assemble", json={"rooms": 0})
+    assert res.status_code == 400
+
+
+def test_assembly_keeps_the_existing_panels(client):  # noqa: F811
+    options = AssemblyOptions(presentations_per_panel=2, break_minutes=0, rooms=2)
+    with client.application.app_context():
+        session = get_session()
+        # Two panels of the first three authors, one after the other.
+        conf = seed_conference(session, proposals=10, panels=2)
+
+        program = assemble_conference(session, conf.id, options)
+        placed = sorted(pid for panel in program.panels for pid in panel.proposal_ids)
+        assert placed == list(range(4, 11))
+        assert save_program(session, conf.id, program) == 4
+        session.commit()
+
+        schedule = load_schedule(session, conf.id)
+        assert len(schedule) == 6 and schedule.report() == []
+        assert {slot.room for slot in schedule if slot.room} == {"room-1", "room-2"}
+        # Everyone presents already, a second draft is empty.
+        assert assemble_conference(session, conf.id, options).panels == []
+
+
+def test_jobs_are_shared_by_the_workers(client, tmp_path):  # noqa: F811
+    # Two workers of a host, sharing the cache file.
+    runners = [JobRunner(client.application, SQLiteBackend(str(tmp_path / "cache.db"))) for _ in range(2)]
+    job = runners[0].submit("answer", lambda job: {"answer": 42})
+    for _ in range(100):
+        state = runners[1].get(job.id)
+        if state["status"] == "done":
+            break
+        time.sleep(0.05)
+    assert state["result"] == {"answer": 42}
+    assert runners[1].get("unknown") is None
+
+
+def test_assembly_requires_login(client):  # noqa: F811
+    client.application.config["LOGIN_DISABLED"] = False
+    res = client.post("/api/v1/conferences/cots-2021/panels/assemble", json={"save": True})
+    assert res.status_code in (302, 401)
+    assert client.get("/api/v1/jobs/unknown").status_code in (302, 401)
@@ -0,0 +1,118 @@
+import time
+
+import pytest
+from common import client, seed_conference  # noqa: F401
+from sqlalchemy.orm import Session
+
+from mngt.cache import Cache, LocalBackend, RedisBackend, SQLiteBackend
+from mngt.counters import bump_counters, conference_counts
+from mngt.db import get_engine, get_session
+from mngt.fragment_cache import invalidate_fragments
+
+
+class FakeRedisServer:
+    """The few Redis commands the cache uses, for clients in one process."""
+
+    def __init__(self):
+        self.data = {}
+        self.subscribers = []
+
+
+class FakePubSub:
+    def __init__(self, server):
+        self.server = server
+        self.messages = []
+
+    def subscribe(self, channel):
+        self.server.subscribers.append((channel, self.messages))
+
+    def get_message(self, timeout=0):
+        return {"type": "message", "data": self.messages.pop(0)} if self.messages else None
+
+
+class FakeRedis:
+    def __init__(self, server):
+        self.server = server
+
+    def get(self, key):
+        value, expires = self.server.data.get(key, (None, None))
+        return value if expires is None or expires > time.time() else None
+
+    def set(self, key, value, ex=None):
+        self.server.data[key] = (value, time.time() + ex if ex else None)
+
+    def delete(self, key):
+        self.server.data.pop(key, None)
+
+    def incr(self, key):
+        value = int(self.get(key) or 0) + 1
+        self.server.data[key] = (str(value).encode(), None)
+        return value
+
+    def publish(self, channel, message):
+        for subscribed, messages in self.server.subscribers:
+            if subscribed == channel:
+                messages.append(message.encode())
+
+    def pubsub(self, ignore_subscribe_messages=False):
+        return FakePubSub(self.server)
+
+
+@pytest.fixture(params=["sqlite", "redis"])
+def two_workers(request, tmp_path):
+    """Two caches on the same shared backend, one per worker."""
+    if request.param == "sqlite":
+        path = str(tmp_path / "cache.db")
+        return Cache(SQLiteBackend(path)), Cache(SQLiteBackend(path))
+    server = FakeRedisServer()
+    return Cache(RedisBackend(FakeRedis(server))), Cache(RedisBackend(FakeRedis(server)))
+
+
+def test_invalidations_reach_every_worker(two_workers):
+    first, second = two_workers
+    first.sync(), second.sync()
+
+    first.set("conference:cots-2021", {"name": "COTS"}, ttl=60)
+    assert second.get("conference:cots-2021") == {"name": "COTS"}
+    assert second.generation("fragments:1") == 0
+
+    first.delete("conference:cots-2021")
+    assert first.bump("fragments:1") == 1
+    # The second worker still has its own copies until it reads the events.
+    assert second.get("conference:cots-2021") == {"name": "COTS"}
+    second.sync()
+    assert second.get("conference:cots-2021") is None
+    assert second.generation("fragments:1") == 1
+
+
+def test_local_backend_evicts_entries_but_not_generations():
+    cache = Cache(LocalBackend(maxsize=2))
+    cache.bump("fragments:1")
+    for key in "abc":
+        cache.set(key, key.upper())
+    assert (cache.get("a"), cache.get("c")) == (None, "C")
+    assert cache.generation("fragments:1") == 1
+
+
+@pytest.mark.parametrize("backend", ["local", "sqlite", "redis"])
+def test_backends_count_with_integers(backend, tmp_path):
+    backend = {
+        "local": lambda: LocalBackend(),
+        "sqlite": lambda: SQLiteBackend(str(tmp_path / "cache.db")),
+        "redis": lambda: RedisBackend(FakeRedis(FakeRedisServer())),
+    }[backend]()
+    assert [backend.incr("generation:counts") for _ in range(3)] == [1, 2, 3]
+
+
+def test_counts_are_not_cached_before_the_commit(client):  # noqa: F811
+    with client.application.app_context():
+        conference_id = seed_conference(get_session(), proposals=2).id
+        writer = Session(get_engine(), future=True)
+        bump_counters(writer, conference_id, proposals=1)
+        # A request reading the counters while the write is not committed yet.
+        assert conference_counts(get_session(), conference_id).proposals == 2
+        get_session().rollback()
+        writer.commit()
+        writer.close()
+        invalidate_fragments(conference_id)
+        assert conference_counts(get_session(), conference_id).proposals == 3
@@ -0,0 +1,55 @@
+import gzip
+import json
+
+from common import client, seed_conference  # noqa: F401
+
+from mngt.assets import build_assets
+from mngt.db import get_session
+
+
+def test_compress_responses(client):  # noqa: F811
+    with client.application.app_context():
+        seed_conference(get_session(), proposals=25)
+
+    rv = client.get("/api/v1/conferences/cots-2021/proposals", headers={"Accept-Encoding": "gzip"})
+    assert rv.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in rv.headers["Vary"]
+    assert json.loads(gzip.decompress(rv.data))["result"]["proposals"]
+
+    assert "Content-Encoding" not in client.get("/api/v1/conferences/cots-2021/proposals").headers
+    # Below COMPRESS_MIN_SIZE.
+    rv = client.get("/api/v1/conferences/cots-2021/proposals/3?fields=title", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in rv.headers
+
+    rv = client.get("/api/v1/conferences/cots-2021/export/proposals", headers={"Accept-Encoding": "gzip"})
+    assert rv.is_streamed
+    assert rv.headers["Content-Encoding"] == "gzip"
+    assert len(gzip.decompress(rv.data).decode().splitlines()) == 26
+
+
+def test_fingerprinted_bundles(client, tmp_path):  # noqa: F811
+    static = tmp_path / "static"
+    static.mkdir()
+    (static / "a.css").write_text("/* Cards. */\n.card {\n    color: red;\n}\n")
+    (static / "a.js").write_text("// Greet.\nfunction hello() {\n    return 1;\n}\n")
+    manifest = build_assets(str(tmp_path / "dist"), str(static), {"app.css": ["a.css"], "app.js": ["a.js"]})
+
+    assert manifest["app.css"].startswith("app.") and manifest["app.css"].endswith(".css")
+    assert (tmp_path / "dist" / manifest["app.css"]).read_text() == ".card{color:red}\n"
+    assert (tmp_path / "dist" / manifest["app.js"]).read_text() == "function hello() {\nreturn 1;\n}\n"
+    assert json.loads((tmp_path / "dist" / "manifest.json").read_text()) == manifest
+
+    app = client.application
+    app.config["ASSETS_DIR"] = str(tmp_path / "dist")
+    app.extensions.pop("assets", None)
+    page = client.get("/").get_data(as_text=True)
+    assert f'href="/assets/{manifest["app.css"]}"' in page
+    assert "cdn.jsdelivr.net" not in page
+
+    rv = client.get(f"/assets/{manifest['app.css']}", headers={"Accept-Encoding": "gzip"})
+    assert rv.headers["Content-Encoding"] == "gzip"
+    assert rv.mimetype == "text/css"
+    assert rv.cache_control.max_age == 31536000
+    assert "immutable" in rv.headers["Cache-Control"]
+    assert gzip.decompress(rv.data) == b".card{color:red}\n"
+    rv.close()
@@ -1,5 +1,236 @@
-from common import client
+import re
+from datetime import datetime
 
-def test_empty_db(client):
+import pytest
+from common import assert_max_queries, client, seed_conference  # noqa: F401
+from sqlalchemy import select
+
+from mngt.db import get_session
+from mngt.fragment_cache import invalidate_fragments
+from mngt.models import Conference, Panel, Participation, Proposal
+
+
+def test_empty_db(client):  # noqa: F811
     res = client.get("/")
     assert b"MNGT" in res.data
+
+
+@pytest.mark.parametrize(
+    "url, maximum",
+    [
+        ("/conferences", 2),
+        ("/conferences/cots-2021", 3),
+        ("/conferences/cots-2021/proposals", 3),
+        ("/conferences/cots-2021/proposals/1", 3),
+        ("/conferences/cots-2021/panels", 3),
+        ("/conferences/cots-2021/panels/1", 4),
+        ("/conferences/cots-2021/search_proposal?q=proposal", 2),
+        ("/api/v1/conferences/cots-2021/proposals", 3),
+    ],
+)
+def test_views_run_a_bounded_number_of_queries(client, url, maximum):  # noqa: F811
+    with client.application.app_context():
+        seed_conference(get_session(), proposals=20, panels=20)
+
+    with assert_max_queries(client.application, maximum):
+        res = client.get(url)
+    assert res.status_code == 200
+
+
+def test_api_cursor_pagination_walks_every_proposal(client):  # noqa: F811
+    with client.application.app_context():
+        seed_conference(get_session(), proposals=25)
+
+    pages, url = [], "/api/v1/conferences/cots-2021/proposals?total=true"
+    while url:
+        data = client.get(url).get_json()
+        pages.append([p["title"] for p in data["result"]["proposals"]])
+        url = data["next"]
+    assert [len(p) for p in pages] == [10, 10, 5]
+    assert sum(pages, []) == [f"Proposal {i}" for i in reversed(range(25))]
+
+    data = client.get(client.get(data["prev"]).get_json()["prev"]).get_json()
+    assert [p["title"] for p in data["result"]["proposals"]] == pages[0]
+    assert data["prev"] is None
+
+    assert client.get("/api/v1/conferences/cots-2021/proposals?total=true").get_json()["total"] == 25
+    client.get("/conferences/cots-2021/proposals/3/delete")
+    assert client.get("/api/v1/conferences/cots-2021/proposals?total=true").get_json()["total"] == 24
+
+
+def test_malformed_cursor_is_rejected(client):  # noqa: F811
+    with client.application.app_context():
+        seed_conference(get_session(), proposals=1)
+
+    assert client.get("/conferences/cots-2021/proposals?cursor=garbage").status_code == 400
+
+
+def test_cursor_keeps_its_sort(client):  # noqa: F811
+    with client.application.app_context():
+        seed_conference(get_session(), proposals=25)
+
+    page = client.get("/conferences/cots-2021/proposals?order_by=title").get_data(as_text=True)
+    cursor = re.search(r'cursor=([\w-]+)[^"]*order_by=title', page).group(1)
+    # As the redirect after a deletion does, without the sort.
+    page = client.get(f"/conferences/cots-2021/proposals?cursor={cursor}").get_data(as_text=True)
+    assert "Proposal 19" in page and "Proposal 14" not in page
+    res = client.get(f"/conferences/cots-2021/proposals?cursor={cursor}&order_by=created")
+    assert res.status_code == 400
+
+
+def test_conference_list_cursor_keeps_its_sort(client):  # noqa: F811
+    with client.application.app_context():
+        # Created last first, so the names sort against the start dates.
+        for i in reversed(range(15)):
+            seed_conference(get_session(), slug=f"conf-{i:02}")
+
+    page = client.get("/conferences?order_by=name").get_data(as_text=True)
+    cursor = re.search(r'cursor=([\w-]+)[^"]*order_by=name', page).group(1)
+    # As the "back to list" links do, without the sort.
+    page = client.get(f"/conferences?cursor={cursor}").get_data(as_text=True)
+    assert "conf-10" in page and "conf-09" not in page
+    assert client.get(f"/conferences?cursor={cursor}&order_by=start").status_code == 400
+
+
+def test_conference_is_resolved_from_the_cache(client):  # noqa: F811
+    with client.application.app_context():
+        seed_conference(get_session(), proposals=1)
+
+    assert client.get("/conferences/cots-2021/proposals/1").status_code == 200
+    with assert_max_queries(client.application, 2):
+        assert client.get("/conferences/cots-2021/proposals/1").status_code == 200
+
+    res = client.post(
+        "/conferences/cots-2021/edit",
+        data={
+            "name": "Renamed",
+            "description": "Renamed conference",
+            "begin": "2021-06-01T09:00",
+            "end": "2021-06-03T17:00",
+        },
+    )
+    assert res.status_code == 302
+    assert b"Renamed" in client.get("/conferences/cots-2021").data
+
+
+def test_counters_follow_writes_and_order_the_list(client):  # noqa: F811
+    with client.application.app_context():
+        session = get_session()
+        seed_conference(session, proposals=2, slug="small")
+        seed_conference(session, proposals=3, slug="big")
+
+    res = client.get("/conferences?order_by=number-of-proposal")
+    assert res.data.index(b"big") < res.data.index(b"small")
+
+    assert client.get("/conferences/small/proposals/1/delete").status_code == 302
+    assert client.get("/conferences/small/proposals/1/delete").status_code == 302
+    res = client.post(
+        "/conferences/small/panels/new",
+        data={"name": "Panel", "start": "2021-06-01T09:00", "duration": 60, "gap": 5, "url": ""},
+    )
+    assert res.status_code == 302
+
+    with client.application.app_context():
+        conference = get_session().query(Conference).filter(Conference.slug == "small").one()
+        assert (conference.proposal_count, conference.panel_count, conference.participant_count) == (1, 1, 2)
+
+
+def test_new_panel_api_creates_panels_and_participations(client):  # noqa: F811
+    with client.application.app_context():
+        seed_conference(get_session(), proposals=3)
+
+    def panel(name, start, participant_ids):
+        return {
+            "name": name, "start": start, "duration": 60, "gap": 5, "url": "https://zoom/1",
+            "presentations": [{"participant_id": pid} for pid in participant_ids],
+        }
+
+    payload = [panel("Morning", "2021-11-12T09:00:00", [1, 2]), panel("Late", "2021-11-12T09:30:00", [3])]
+    with assert_max_queries(client.application, 8):
+        res = client.post("/api/v1/conferences/cots-2021/panels/new", json=payload)
+    assert res.status_code == 201
+    assert res.get_json()["panels"] == [1, 2]
+    assert len(res.get_json()["conflicts"]) == 1
+
+    with client.application.app_context():
+        session = get_session()
+        rows = session.execute(
+            select(Participation.c.panel_id, Participation.c.participant_id, Participation.c.order)
+            .order_by(Participation.c.id)
+        ).all()
+        assert rows == [(1, 1, 1), (1, 2, 2), (2, 3, 1)]
+        assert session.query(Conference).one().panel_count == 2
+
+    res = client.post("/api/v1/conferences/cots-2021/panels/new", json=panel("Single", "2021-11-13T09:00:00", [99]))
+    assert res.status_code == 400
+
+    # 08:00 in UTC+1 is 07:00 UTC, before "Morning"; 11:15+01:00 overlaps "Late" only.
+    url = "/api/v1/conferences/cots-2021/panels/new"
+    res = client.post(url, json=panel("Early", "2021-11-12T08:00:00+01:00", [1]))
+    assert res.status_code == 201 and res.get_json()["conflicts"] == []
+    res = client.post(url, json=panel("Aware", "2021-11-12T11:15:00+01:00", [2]))
+    assert res.status_code == 201
+    assert len(res.get_json()["conflicts"]) == 1
+    with client.application.app_context():
+        assert get_session().get(Panel, 3).start == datetime(2021, 11, 12, 7)
+
+    client.application.config["LOGIN_DISABLED"] = False
+    res = client.post(url, json=panel("Anonymous", "2021-11-14T09:00:00", []))
+    assert res.status_code in (302, 401)
+
+
+def test_unchanged_pages_are_answered_with_304(client):  # noqa: F811
+    with client.application.app_context():
+        seed_conference(get_session(), proposals=3)
+
+    url = "/conferences/cots-2021/proposals"
+    res = client.get(url)
+    etag, last_modified = res.headers["ETag"], res.headers["Last-Modified"]
+    assert res.headers["Cache-Control"] == "private, no-cache"
+
+    with assert_max_queries(client.application, 1):
+        res = client.get(url, headers={"If-None-Match": etag})
+    assert res.status_code == 304 and res.data == b""
+    res = client.get(url, headers={"If-Modified-Since": last_modified})
+    assert res.status_code == 304
+
+    assert client.get("/conferences/cots-2021/proposals/1/delete").status_code == 302
+    client.get("/conferences/cots-2021/proposals")  # Shows the flashed message.
+    res = client.get(url, headers={"If-None-Match": etag})
+    assert res.status_code == 200 and res.headers["ETag"] != etag
+
+    api_url = "/api/v1/conferences/cots-2021/proposals/2"
+    etag = client.get(api_url).headers["ETag"]
+    assert client.get(api_url, headers={"If-None-Match": etag}).status_code == 304
+
+
+def test_renaming_an_author_changes_the_proposal_pages(client):  # noqa: F811
+    with client.application.app_context():
+        seed_conference(get_session(), proposals=3)
+
+    urls = ["/conferences/cots-2021/proposals", "/conferences/cots-2021/proposals/2"]
+    etags = [client.get(url).headers["ETag"] for url in urls]
+    with client.application.app_context():
+        session = get_session()
+        author = session.get(Proposal, 2).author
+        author.first_name, author.modified = "Renamed", datetime.utcnow()
+        session.commit()
+        invalidate_fragments(author.conference_id)
+
+    for url, etag in zip(urls, etags):
+        res = client.get(url, headers={"If-None-Match": etag})
+        assert res.status_code == 200 and b"Renamed" in res.data, url
+
+
+def test_listings_do_not_load_long_text(client):  # noqa: F811
+    with client.application.app_context():
+        seed_conference(get_session(), proposals=5, panels=2)
+
+    for url in ("/conferences/cots-2021/proposals", "/conferences/cots-2021/panels",
+                "/conferences/cots-2021/search_proposal?q=proposal"):
+        with assert_max_queries(client.application, 3) as statements:
+            assert client.get(url).status_code == 200
+        assert not any("abstract" in s or "panel.url" in s for s in statements), url
+
+    with assert_max_queries(client.application, 3) as statements:
+        assert b"Lorem ipsum" in client.get("/conferences/cots-2021/proposals/1").data
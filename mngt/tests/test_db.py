@@ -1,7 +1,14 @@
 import os
+from datetime import datetime
 from pathlib import Path
 
 import pytest
+from common import client  # noqa: F401
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from mngt.db import get_engine, get_session
+from mngt.models import Conference, ImportWatermark, Participant, Proposal
 
 BASEDIR = os.path.abspath(os.path.dirname(__file__))
 
@@ -10,3 +17,169 @@ BASEDIR = os.path.abspath(os.path.dirname(__file__))
 def cots2021_proposals_file() -> Path:
     """Return path to the COTS 2021 data file."""
     return Path(BASEDIR) / "cots2021-proposals.xlsx"
+
+
+def test_engine_is_shared_across_requests(client):  # noqa: F811
+    """The engine is built once per process, not once per request."""
+    with client.application.app_context():
+        engine = get_engine()
+    client.get("/")
+    with client.application.app_context():
+        assert get_engine() is engine
+
+
+@pytest.fixture
+def responses_file(tmp_path) -> Path:
+    """Return path to a small Google Form export."""
+    from openpyxl import Workbook
+
+    from mngt.importer import INDIVIDUAL_PROPOSAL, PANEL_PROPOSAL, ROUNDTABLE_PROPOSAL
+
+    wb = Workbook()
+    ws = wb.active
+    ws.append(["Timestamp", "Email Address", "First name", "Last name", "Affiliation", "Type"])
+    ws.append([datetime(2021, 8, 1, 10), "a@example.com", "Ann", "A", "Uni", INDIVIDUAL_PROPOSAL, "Title A\nAbstract A"])
+    ws.append([datetime(2021, 8, 2, 10), "b@example.com", "Ben", "B", None, PANEL_PROPOSAL, None, "Panel B",
+               "x", "y", "Abstracts B"])
+    ws.append([None, None, None])
+    ws.append([datetime(2021, 8, 3, 10), "a@example.com", "Ann", "A", "Uni", ROUNDTABLE_PROPOSAL, None, None,
+               None, None, None, "Roundtable. With names"])
+    path = tmp_path / "responses.xlsx"
+    wb.save(path)
+    return path
+
+
+def test_import_cots2021_proposals(client, responses_file):  # noqa: F811
+    from mngt.importer import import_cots2021_proposals
+
+    with client.application.app_context():
+        assert import_cots2021_proposals(responses_file, chunk_size=2) == (3, 0, 0, 0)
+
+        session = get_session()
+        assert session.query(Participant).count() == 2
+        proposals = session.query(Proposal).order_by(Proposal.id).all()
+        assert [p.title for p in proposals] == ["Title A", "Panel B", "Roundtable"]
+        assert [p.author.email for p in proposals] == ["a@example.com", "b@example.com", "a@example.com"]
+        assert [p.short_title for p in proposals] == [p.title for p in proposals]
+
+
+def test_short_title_is_stored_when_the_title_is_written(client):  # noqa: F811
+    with client.application.app_context():
+        session = get_session()
+        proposal = Proposal(title="Shared Legacies. The Legendary History of Angkor")
+        session.add(proposal)
+        session.commit()
+        assert proposal.short_title == "Shared Legacies"
+
+        proposal.title = "Angkor\nand its genesis"
+        session.commit()
+        assert session.execute(select(Proposal.short_title)).scalar() == "Angkor"
+
+
+def test_reimport_only_writes_changes(client, responses_file):  # noqa: F811
+    from openpyxl import load_workbook
+
+    from mngt.importer import import_cots2021_proposals
+
+    with client.application.app_context():
+        import_cots2021_proposals(responses_file)
+        assert import_cots2021_proposals(responses_file) == (0, 0, 3, 0)
+
+        wb = load_workbook(responses_file)
+        ws = wb.active
+        ws["H3"] = "Panel B, revised"
+        ws.append([datetime(2021, 8, 4, 10), "c@example.com", "Cai", "C", "Uni", ws["F2"].value, "Title C"])
+        wb.save(responses_file)
+
+        # Responses older than the watermark are not looked at.
+        assert import_cots2021_proposals(responses_file, incremental=True) == (1, 0, 1, 2)
+        assert import_cots2021_proposals(responses_file) == (0, 1, 3, 0)
+
+        session = get_session()
+        conference = session.query(Conference).one()
+        assert (conference.proposal_count, conference.participant_count) == (4, 3)
+        assert session.query(Participant).count() == 3
+        titles = [p.title for p in session.query(Proposal).order_by(Proposal.id)]
+        assert titles == ["Title A", "Panel B, revised", "Roundtable", "Title C"]
+        watermark = session.query(ImportWatermark).one()
+        assert watermark.last_timestamp == datetime(2021, 8, 4, 10)
+
+
+# The schema created by init-db before migrations existed.
+BASELINE_SCHEMA = [
+    "CREATE TABLE conference (id INTEGER PRIMARY KEY, created DATETIME, modified DATETIME, name VARCHAR(50) UNIQUE, "
+    "slug VARCHAR(60) UNIQUE, description VARCHAR(250), begin DATETIME, \"end\" DATETIME)",
+    "CREATE TABLE participant (id INTEGER PRIMARY KEY, email VARCHAR(350) UNIQUE, created DATETIME, "
+    "modified DATETIME, conference_id INTEGER REFERENCES conference (id), first_name VARCHAR(250), "
+    "last_name VARCHAR(250), affiliation VARCHAR(300))",
+    "CREATE TABLE proposal (id INTEGER PRIMARY KEY, conference_id INTEGER REFERENCES conference (id), "
+    "created DATETIME, modified DATETIME, author_id INTEGER REFERENCES participant (id), title VARCHAR(300), "
+    "type VARCHAR(200), abstract TEXT, is_deleted BOOLEAN)",
+    "CREATE TABLE panel (id INTEGER PRIMARY KEY, conference_id INTEGER REFERENCES conference (id), "
+    "created DATETIME, modified DATETIME, name VARCHAR(200), start DATETIME, duration INTEGER, gap INTEGER, "
+    "url VARCHAR(4096))",
+    "CREATE TABLE participation (id INTEGER PRIMARY KEY, panel_id INTEGER REFERENCES panel (id), "
+    "participant_id INTEGER REFERENCES participant (id), role VARCHAR(150), \"order\" INTEGER)",
+    "INSERT INTO conference (id, name, slug) VALUES (1, 'COTS 2021', 'cots-2021')",
+    "INSERT INTO participant (id, email, first_name, last_name, conference_id) VALUES (1, 'a@example.com', 'Ann', "
+    "'A', 1)",
+    "INSERT INTO proposal (id, conference_id, author_id, title, is_deleted) VALUES (1, 1, 1, 'Angkor', 0)",
+]
+
+
+def test_migrations_upgrade_a_baseline_database(tmp_path):
+    from sqlalchemy import create_engine, inspect, text
+
+    from mngt.migrations import LATEST_VERSION, current_version, upgrade
+    from mngt.models import Base
+    from mngt.search import search_proposals
+
+    engine = create_engine(f"sqlite+pysqlite:///{tmp_path / 'old.db'}", future=True)
+    with engine.begin() as conn:
+        for stmt in BASELINE_SCHEMA:
+            conn.execute(text(stmt))
+
+    assert len(upgrade(engine)) == LATEST_VERSION
+    assert upgrade(engine) == []
+
+    inspector = inspect(engine)
+    with engine.connect() as conn:
+        assert current_version(conn) == LATEST_VERSION
+    for table in Base.metadata.sorted_tables:
+        columns = {c["name"] for c in inspector.get_columns(table.name)}
+        assert columns == set(table.columns.keys())
+        indexes = {i["name"] for i in inspector.get_indexes(table.name)}
+        assert {i.name for i in table.indexes} <= indexes
+
+    with Session(engine, future=True) as session:
+        assert [p.title for p in search_proposals(session, 1, "ang", 10)] == ["Angkor"]
+        assert session.get(Proposal, 1).short_title == "Angkor"
+        conference = session.get(Conference, 1)
+        assert (conference.proposal_count, conference.panel_count, conference.participant_count) == (1, 0, 1)
+    engine.dispose()
+
+
+def test_init_db_upgrades_an_existing_database(tmp_path):
+    from sqlalchemy import create_engine, inspect, text
+
+    from mngt import create_app
+    from mngt.db import dispose_engines, init_db
+    from mngt.migrations import LATEST_VERSION, current_version, upgrade
+
+    url = f"sqlite+pysqlite:///{tmp_path / 'old.db'}"
+    engine = create_engine(url, future=True)
+    with engine.begin() as conn:
+        for stmt in BASELINE_SCHEMA:
+            conn.execute(text(stmt))
+    engine.dispose()
+
+    app = create_app({"TESTING": True, "SECRET_KEY": "testing", "SQLALCHEMY_DATABASE_URI": url})
+    with app.app_context():
+        init_db()
+        engine = get_engine()
+        assert {"short_title", "source_key"} <= {c["name"] for c in inspect(engine).get_columns("proposal")}
+        with engine.connect() as conn:
+            assert current_version(conn) == LATEST_VERSION
+        assert upgrade(engine) == []
+        assert get_session().get(Proposal, 1).short_title == "Angkor"
+    dispose_engines()
@@ -0,0 +1,79 @@
+import csv
+import io
+import json
+
+from common import client, seed_conference  # noqa: F401
+from openpyxl import load_workbook
+
+from mngt.db import get_session
+
+
+def test_export_proposals(client):  # noqa: F811
+    with client.application.app_context():
+        seed_conference(get_session(), proposals=25)
+
+    rv = client.get("/api/v1/conferences/cots-2021/export/proposals")
+    assert rv.status_code == 200
+    assert rv.is_streamed
+    assert rv.headers["Content-Disposition"] == 'attachment; filename="cots-2021-proposals.csv"'
+    rows = list(csv.DictReader(io.StringIO(rv.get_data(as_text=True))))
+    assert [row["title"] for row in rows] == [f"Proposal {i}" for i in range(25)]
+    assert rows[3]["author_last_name"] == "Last3"
+
+    rv = client.get("/api/v1/conferences/cots-2021/export/proposals?format=ndjson")
+    lines = [json.loads(line) for line in rv.get_data(as_text=True).splitlines()]
+    assert len(lines) == 25
+    assert lines[0]["author_email"] == "cots-2021-0@example.com"
+
+    rv = client.get("/api/v1/conferences/cots-2021/export/proposals?format=xlsx")
+    sheet = load_workbook(io.BytesIO(rv.data), read_only=True)["proposals"]
+    values = list(sheet.values)
+    assert values[0][:2] == ("proposal_id", "title")
+    assert len(values) == 26
+
+
+def test_export_panels(client):  # noqa: F811
+    with client.application.app_context():
+        seed_conference(get_session(), proposals=3, panels=2)
+
+    rv = client.get("/api/v1/conferences/cots-2021/export/panels")
+    rows = list(csv.DictReader(io.StringIO(rv.get_data(as_text=True))))
+    # A row per panelist.
+    assert [(row["name"], row["last_name"]) for row in rows] == [
+        (f"Panel {i}", f"Last{j}") for i in range(2) for j in range(3)
+    ]
+
+    assert client.get("/api/v1/conferences/cots-2021/export/rooms").status_code == 404
+    assert client.get("/api/v1/conferences/cots-2021/export/panels?format=pdf").status_code == 400
+    assert client.get("/api/v1/conferences/nope/export/panels").status_code == 404
+
+
+def test_export_quotes_formulas(client):  # noqa: F811
+    with client.application.app_context():
+        session = get_session()
+        conf = seed_conference(session, proposals=2)
+        conf.proposals[0].title = '=HYPERLINK("http://example.com")'
+        conf.proposals[1].title = "-1"
+        session.commit()
+
+    rv = client.get("/api/v1/conferences/cots-2021/export/proposals")
+    rows = list(csv.DictReader(io.StringIO(rv.get_data(as_text=True))))
+    assert [row["title"] for row in rows] == ['\'=HYPERLINK("http://example.com")', "'-1"]
+
+    rv = client.get("/api/v1/conferences/cots-2021/export/proposals?format=xlsx")
+    values = list(load_workbook(io.BytesIO(rv.data), read_only=True)["proposals"].values)
+    assert values[1][1] == '\'=HYPERLINK("http://example.com")'
+    assert values[1][0] == 1
+
+    rv = client.get("/api/v1/conferences/cots-2021/export/proposals?format=ndjson")
+    assert json.loads(rv.get_data(as_text=True).splitlines()[0])["title"].startswith("=")
+
+
+def test_export_requires_login(client):  # noqa: F811
+    with client.application.app_context():
+        seed_conference(get_session(), proposals=1)
+
+    client.application.config["LOGIN_DISABLED"] = False
+    rv = client.get("/api/v1/conferences/cots-2021/export/participants")
+    assert rv.status_code in (302, 401)
+    assert b"example.com" not in rv.data
@@ -0,0 +1,18 @@
+from common import assert_max_queries, client, seed_conference  # noqa: F401
+
+from mngt.db import get_session
+
+
+def test_search_results_are_cached_until_a_proposal_is_written(client):  # noqa: F811
+    with client.application.app_context():
+        seed_conference(get_session(), proposals=3)
+
+    res = client.get("/conferences/cots-2021/search_proposal?q=Proposal")
+    assert res.data.count(b"Proposal") == 3
+    # The same search typed differently is the same fragment.
+    with assert_max_queries(client.application, 0):
+        assert client.get("/conferences/cots-2021/search_proposal?q=+proposal").data == res.data
+
+    assert client.get("/conferences/cots-2021/proposals/1/delete").status_code == 302
+    res = client.get("/conferences/cots-2021/search_proposal?q=proposal")
+    assert res.data.count(b"Proposal") == 2
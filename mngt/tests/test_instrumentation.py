@@ -0,0 +1,31 @@
+import json
+import logging
+
+from common import client, seed_conference  # noqa: F401
+
+from mngt.db import get_session
+
+
+def test_server_timing_reports_the_queries(client):  # noqa: F811
+    with client.application.app_context():
+        seed_conference(get_session(), proposals=3)
+    client.application.config["SERVER_TIMING"] = True
+
+    res = client.get("/conferences/cots-2021/proposals")
+    db, app = res.headers["Server-Timing"].split(", ")
+    assert db.startswith("db;dur=") and db.endswith('desc="3 queries"')
+    assert app.startswith("app;dur=")
+
+
+def test_slow_queries_are_logged(client, caplog):  # noqa: F811
+    with client.application.app_context():
+        seed_conference(get_session(), proposals=3)
+    client.application.config["SLOW_QUERY_THRESHOLD_MS"] = 0
+
+    with caplog.at_level(logging.INFO, logger="mngt.instrumentation"):
+        client.get("/conferences/cots-2021/proposals")
+
+    records = [json.loads(r.getMessage()) for r in caplog.records if r.name == "mngt.instrumentation"]
+    assert [r["event"] for r in records] == ["slow_query"] * 3 + ["request"]
+    assert records[-1]["queries"] == 3
+    assert records[-1]["endpoint"] == "conferences.list_proposals"
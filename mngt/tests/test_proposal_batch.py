@@ -0,0 +1,76 @@
+from common import assert_max_queries, client, seed_conference  # noqa: F401
+from sqlalchemy import select
+
+from mngt.db import get_session
+from mngt.models import Conference, Proposal
+from mngt.search import search_proposals
+
+
+def test_proposal_batch(client):  # noqa: F811
+    with client.application.app_context():
+        conf = seed_conference(get_session(), proposals=5)
+        conference_id, ids = conf.id, [p.id for p in conf.proposals]
+        author_id = conf.proposals[0].author_id
+
+    batch = {
+        "create": [
+            {"author_id": author_id, "title": f"New proposal {i}", "type": "paper", "abstract": "Batch"}
+            for i in range(3)
+        ],
+        "update": [
+            {"proposal_id": ids[0], "title": "Renamed"},
+            {"proposal_id": ids[1], "abstract": "Changed", "type": "roundtable"},
+            {"proposal_id": 9999, "title": "Missing"},
+        ],
+        "delete": [ids[2], ids[3], 9999],
+    }
+    # Resolving, the checks, one insert, two updates, the delete and the counters.
+    with assert_max_queries(client.application, 10) as statements:
+        rv = client.post("/api/v1/conferences/cots-2021/proposals/batch", json=batch)
+    assert rv.status_code == 200, statements
+    assert [item["status"] for item in rv.json["create"]] == ["created"] * 3
+    assert [item["status"] for item in rv.json["update"]] == ["updated", "updated", "not_found"]
+    assert [item["status"] for item in rv.json["delete"]] == ["deleted", "deleted", "not_found"]
+
+    with client.application.app_context():
+        session = get_session()
+        created = [item["proposal_id"] for item in rv.json["create"]]
+        titles = session.execute(select(Proposal.title).where(Proposal.id.in_(created)).order_by(Proposal.id))
+        assert titles.scalars().all() == ["New proposal 0", "New proposal 1", "New proposal 2"]
+        renamed = session.get(Proposal, ids[0])
+        assert (renamed.title, renamed.short_title) == ("Renamed", "Renamed")
+        assert session.get(Proposal, ids[1]).type == "roundtable"
+        assert session.get(Proposal, ids[2]).is_deleted
+        assert session.get(Conference, conference_id).proposal_count == 5 + 3 - 2
+        assert [p.title for p in search_proposals(session, conference_id, "renamed", 10)] == ["Renamed"]
+
+
+def test_proposal_batch_validation(client):  # noqa: F811
+    with client.application.app_context():
+        seed_conference(get_session(), proposals=1)
+        seed_conference(get_session(), proposals=1, slug="other")
+        other_author = get_session().execute(
+            select(Proposal.author_id).join(Conference).where(Conference.slug == "other")
+        ).scalar()
+
+    url = "/api/v1/conferences/cots-2021/proposals/batch"
+    rv = client.post(url, json={"create": [{"author_id": other_author, "title": "T", "type": "paper", "abstract": ""}]})
+    assert rv.status_code == 400
+    assert "author_id" in rv.json["errors"]
+
+    rv = client.post(url, json={"create": [{"title": "T"}], "update": [{"proposal_id": 1}]})
+    assert rv.status_code == 400
+    assert set(rv.json["errors"]["create"]["0"]) == {"author_id", "type", "abstract"}
+    assert rv.json["errors"]["update"]["0"]["_schema"]
+
+
+def test_proposal_batch_requires_login(client):  # noqa: F811
+    with client.application.app_context():
+        conf = seed_conference(get_session(), proposals=2)
+        ids = [p.id for p in conf.proposals]
+
+    client.application.config["LOGIN_DISABLED"] = False
+    rv = client.post("/api/v1/conferences/cots-2021/proposals/batch", json={"delete": ids})
+    assert rv.status_code in (302, 401)
+    with client.application.app_context():
+        assert not any(get_session().get(Proposal, i).is_deleted for i in ids)
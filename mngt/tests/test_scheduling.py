@@ -0,0 +1,111 @@
+import random
+from datetime import datetime, timedelta
+
+from common import client, seed_conference  # noqa: F401
+
+from mngt import scheduling
+from mngt.db import get_session
+from mngt.fragment_cache import invalidate_fragments
+from mngt.scheduling import PRESENTER, ROOM, IntervalTree, Schedule, make_slot
+
+T0 = datetime(2021, 11, 12, 9)
+
+
+def _overlaps(a, b):
+    return a[0] < b[1] and b[0] < a[1]
+
+
+def test_interval_tree_matches_a_linear_scan():
+    rng = random.Random(7)
+    tree, intervals = IntervalTree(), {}
+    for key in range(300):
+        start = T0 + timedelta(minutes=rng.randrange(0, 5000))
+        intervals[key] = (start, start + timedelta(minutes=rng.randrange(1, 180)))
+        tree.insert(*intervals[key], key)
+    for key in rng.sample(sorted(intervals), 100):
+        tree.remove(intervals.pop(key)[0], key)
+    assert len(tree) == 200
+
+    for _ in range(200):
+        start = T0 + timedelta(minutes=rng.randrange(-100, 5100))
+        query = (start, start + timedelta(minutes=rng.randrange(1, 240)))
+        expected = {key for key, interval in intervals.items() if _overlaps(interval, query)}
+        assert set(tree.overlapping(*query)) == expected
+
+
+def test_report_finds_room_and_presenter_conflicts():
+    def at(hour, minutes):
+        return T0 + timedelta(hours=hour), minutes
+
+    schedule = Schedule(
+        [
+            make_slot(1, "A", *at(0, 60), "https://zoom/1", [10]),
+            make_slot(2, "B", *at(0.5, 60), "https://zoom/1", [11]),
+            make_slot(3, "C", *at(1, 60), "https://zoom/2", [10, 11]),
+            make_slot(4, "D", *at(2, 60), "https://zoom/2", [10]),
+        ]
+    )
+    report = [(c.kind, c.first.id, c.second.id, c.presenter_id) for c in schedule.report()]
+    assert report == [(ROOM, 1, 2, None), (PRESENTER, 2, 3, 11)]
+
+    # Moving D onto C is checked against the index without rescanning.
+    moved = make_slot(4, "D", *at(1.5, 60), "https://zoom/2", [10])
+    assert [(c.kind, c.second.id) for c in schedule.conflicts_with(moved)] == [(ROOM, 3), (PRESENTER, 3)]
+    schedule.add(moved)
+    assert len(schedule.report()) == 4
+
+
+def test_panel_form_checks_the_gap_and_warns_about_overlaps(client):  # noqa: F811
+    with client.application.app_context():
+        seed_conference(get_session())
+
+    panel = {"name": "Panel", "start": "2021-11-12T09:00", "duration": 60, "gap": 60, "url": "https://zoom/1"}
+    res = client.post("/conferences/cots-2021/panels/new", data=panel)
+    assert b"The gap must be shorter" in res.data
+
+    panel["gap"] = 5
+    assert client.post("/conferences/cots-2021/panels/new", data=panel).status_code == 302
+    res = client.post("/conferences/cots-2021/panels/new", data=dict(panel, name="Other"), follow_redirects=True)
+    assert b"use the same room at the same time" in res.data
+
+    res = client.get("/conferences/cots-2021/panels/conflicts")
+    assert b"1 conflicts among 2 panels" in res.data
+
+
+def test_schedule_is_kept_between_writes(client, monkeypatch):  # noqa: F811
+    with client.application.app_context():
+        seed_conference(get_session())
+    loads = []
+    monkeypatch.setattr(scheduling, "load_schedule", lambda *args: loads.append(args) or Schedule())
+
+    panel = {"name": "Panel", "start": "2021-11-12T09:00", "duration": 60, "gap": 5, "url": "https://zoom/1"}
+    for name in ("A", "B", "C"):
+        res = client.post("/conferences/cots-2021/panels/new", data=dict(panel, name=name), follow_redirects=True)
+    assert len(loads) == 1
+    # C overlaps A and B, which only the cached schedule knows about.
+    assert res.data.count(b"use the same room at the same time") == 2
+    # Moving A away leaves B and C.
+    res = client.post("/conferences/cots-2021/panels/1/edit", data=dict(panel, start="2021-11-13T09:00"))
+    assert res.status_code == 302
+    assert b"1 conflicts among 3 panels" in client.get("/conferences/cots-2021/panels/conflicts").data
+
+    # Any other write reloads it, it may have come from another worker.
+    with client.application.app_context():
+        invalidate_fragments(1)
+    client.get("/conferences/cots-2021/panels/conflicts")
+    assert len(loads) == 2
+
+
+def test_panels_of_another_conference_are_not_found(client):  # noqa: F811
+    with client.application.app_context():
+        seed_conference(get_session(), proposals=3, panels=1)
+        seed_conference(get_session(), proposals=3, panels=1, slug="other")
+
+    panel = {"name": "Moved", "start": "2021-11-12T09:00", "duration": 60, "gap": 5, "url": ""}
+    assert client.get("/conferences/cots-2021/panels/2").status_code == 404
+    # Not even a 304 for a client that claims to have it.
+    since = {"If-Modified-Since": "Fri, 01 Jan 2100 00:00:00 GMT"}
+    assert client.get("/conferences/cots-2021/panels/2", headers=since).status_code == 404
+    assert client.get("/conferences/cots-2021/panels/2/edit").status_code == 404
+    assert client.post("/conferences/cots-2021/panels/2/edit", data=panel).status_code == 404
+    assert client.get("/conferences/other/panels/2").status_code == 200
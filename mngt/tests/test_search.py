@@ -0,0 +1,65 @@
+from datetime import datetime
+
+from common import client  # noqa: F401
+from sqlalchemy import update
+
+from mngt.db import get_session
+from mngt.models import Conference, Participant, Proposal
+from mngt.search import search_participants, search_proposals
+
+
+def _seed(session):
+    conf = Conference(name="COTS 2021", slug="cots-2021", created=datetime.utcnow(), modified=datetime.utcnow())
+    author = Participant(
+        email="janrd@example.com", first_name="Jan R.", last_name="Dressler", affiliation="University of Hamburg",
+        conference=conf,
+    )
+    session.add_all(
+        [
+            Proposal(conference=conf, author=author, title="The Legendary History of Angkor", abstract="Chronicles"),
+            Proposal(conference=conf, author=author, title="Royal chronicles", abstract="Siamese sources"),
+        ]
+    )
+    session.commit()
+    return conf
+
+
+def test_search_proposals_by_prefix(client):  # noqa: F811
+    with client.application.app_context():
+        session = get_session()
+        conf = _seed(session)
+
+        titles = [p.title for p in search_proposals(session, conf.id, "Ang", 10)]
+        assert titles == ["The Legendary History of Angkor"]
+        # Author names, affiliation and abstract are searchable too.
+        assert len(search_proposals(session, conf.id, "dress hamb", 10)) == 2
+        assert len(search_proposals(session, conf.id, "siamese", 10)) == 1
+        assert len(search_proposals(session, conf.id, "chron", 1)) == 1
+        assert search_proposals(session, conf.id, "  ", 10) == []
+
+
+def test_search_index_follows_updates(client):  # noqa: F811
+    with client.application.app_context():
+        session = get_session()
+        conf = _seed(session)
+
+        session.execute(update(Proposal).where(Proposal.title == "Royal chronicles").values(is_deleted=True))
+        session.execute(update(Participant).values(last_name="Smith"))
+        session.commit()
+
+        assert [p.title for p in search_proposals(session, conf.id, "chronicles", 10)] == [
+            "The Legendary History of Angkor"
+        ]
+        assert len(search_proposals(session, conf.id, "smith", 10)) == 1
+        assert search_proposals(session, conf.id, "dressler", 10) == []
+        assert [a.last_name for a in search_participants(session, conf.id, "smi", 10)] == ["Smith"]
+
+
+def test_search_view(client):  # noqa: F811
+    with client.application.app_context():
+        _seed(get_session())
+
+    res = client.get("/conferences/cots-2021/search_proposal?q=angk")
+    assert b"Legendary History of Angkor" in res.data
+    res = client.get("/conferences/cots-2021/search_author?q=jan")
+    assert b"Dressler" in res.data
@@ -0,0 +1,54 @@
+from datetime import timedelta
+
+from common import client  # noqa: F401
+from sqlalchemy import create_engine, func, select
+
+from mngt.db import get_engine, get_session
+from mngt.models import Base, Conference, Panel, Participant, Participation, Proposal
+from mngt.scheduling import load_schedule
+from mngt.search import install_search_index, search_proposals
+from mngt.seeder import SeedSizes, generate
+
+
+def _rows(engine):
+    with engine.connect() as conn:
+        return {
+            table.name: conn.execute(select(table).order_by(*table.primary_key)).all()
+            for table in [model.__table__ for model in (Conference, Participant, Proposal, Panel)] + [Participation]
+        }
+
+
+def test_generate(client):  # noqa: F811
+    sizes = SeedSizes(conferences=2, participants=41, proposals=103, panels=9)
+    with client.application.app_context():
+        ids = generate(get_engine(), sizes, seed=7, batch_size=20)
+        session = get_session()
+
+        assert session.execute(select(func.count(Proposal.id))).scalar() == 103
+        assert session.execute(select(func.count(Panel.id))).scalar() == 9
+        conferences = session.execute(select(Conference).where(Conference.id.in_(ids))).scalars().all()
+        assert [c.slug for c in conferences] == ["synthetic-7-1", "synthetic-7-2"]
+        assert sum(c.participant_count for c in conferences) == 41
+        # The search index covers the generated rows.
+        title = session.execute(select(Proposal.title).where(Proposal.is_deleted.is_(False))).scalar()
+        assert search_proposals(session, ids[0], title, 200)
+
+        # The same seed generates the same rows in another database.
+        other = create_engine("sqlite+pysqlite://", future=True)
+        Base.metadata.create_all(other)
+        with other.begin() as conn:
+            install_search_index(conn)
+        generate(other, sizes, seed=7)
+        assert _rows(other) == _rows(get_engine())
+
+
+def test_generated_panels_do_not_conflict(client):  # noqa: F811
+    with client.application.app_context():
+        [conference_id] = generate(get_engine(), SeedSizes(1, 60, 10, 150), seed=3)
+        session = get_session()
+        conference = session.get(Conference, conference_id)
+        schedule = load_schedule(session, conference_id)
+        assert len(schedule) == 150
+        assert schedule.report() == []
+        starts = session.execute(select(func.min(Panel.start), func.max(Panel.start))).one()
+        assert conference.begin <= starts[0] and starts[1] + timedelta(minutes=90) <= conference.end
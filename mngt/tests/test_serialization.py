@@ -0,0 +1,38 @@
+import json
+from datetime import datetime
+
+from common import client, seed_conference  # noqa: F401
+
+from mngt import serialization
+from mngt.db import get_session
+
+
+def test_sparse_fieldsets(client):  # noqa: F811
+    with client.application.app_context():
+        seed_conference(get_session(), proposals=12)
+
+    data = client.get("/api/v1/conferences/cots-2021/proposals?fields=proposal_id,title").get_json()
+    assert data["result"]["proposals"][0] == {"proposal_id": 12, "title": "Proposal 11"}
+    # The next page keeps the fieldset.
+    data = client.get(data["next"]).get_json()
+    assert [set(p) for p in data["result"]["proposals"]] == [{"proposal_id", "title"}] * 2
+
+    data = client.get("/api/v1/conferences/cots-2021/proposals/3?fields=type,created").get_json()
+    assert set(data) == {"type", "created"}
+    assert datetime.fromisoformat(data["created"])
+
+    data = client.get("/api/v1/conferences/cots-2021/proposals/3?fields=").get_json()
+    assert set(data) == set(serialization.PROPOSAL_FIELDS)
+
+    rv = client.get("/api/v1/conferences/cots-2021/proposals?fields=title,password")
+    assert rv.status_code == 400
+    assert "password" in rv.get_json()["errors"]["fields"][0]
+
+
+def test_dumps_without_orjson(monkeypatch):
+    data = {"created": datetime(2021, 11, 12, 9, 30), "errors": {0: ["Missing"]}, "title": "Thaï"}
+    encoded = serialization.dumps(data)
+    monkeypatch.setattr(serialization, "orjson", None)
+    assert json.loads(serialization.dumps(data)) == json.loads(encoded) == {
+        "created": "2021-11-12T09:30:00", "errors": {"0": ["Missing"]}, "title": "Thaï"
+    }
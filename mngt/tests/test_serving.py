@@ -0,0 +1,19 @@
+from mngt.serving import WorkerSettings, check_worker_settings
+
+
+def test_threads_must_fit_in_the_database_pool():
+    settings = WorkerSettings(workers=2, worker_class="gthread", threads=8, worker_connections=100)
+    assert check_worker_settings(settings, pool_size=5, max_overflow=10) == []
+    assert "GUNICORN_THREADS" in check_worker_settings(settings, pool_size=2, max_overflow=2)[0]
+
+    sync = settings._replace(worker_class="sync")
+    assert sync.concurrency == 1 and check_worker_settings(sync, pool_size=1, max_overflow=0) == []
+    assert check_worker_settings(settings._replace(worker_class="tornado"), 5, 10)
+
+
+def test_greenlets_must_fit_in_the_database_pool():
+    settings = WorkerSettings(workers=2, worker_class="gevent", threads=1, worker_connections=100)
+    problems = check_worker_settings(settings, pool_size=5, max_overflow=10)
+    assert any("GUNICORN_WORKER_CONNECTIONS" in problem for problem in problems)
+    problems = check_worker_settings(settings._replace(worker_connections=15), pool_size=5, max_overflow=10)
+    assert not any("GUNICORN_WORKER_CONNECTIONS" in problem for problem in problems)
@@ -0,0 +1,326 @@
+"""Benchmark of the web and API endpoints, compared to a stored baseline.
+
+Seeds a synthetic conference (mngt.seeder) in a temporary SQLite database, then requests
+every endpoint many times and reports the latency percentiles, the SQL
+statements per request (from the Server-Timing header) and the throughput:
+
+    python scripts/benchmark.py --participants 2000 --proposals 5000 --panels 200
+
+The run fails when an endpoint runs more queries per request than in
+`scripts/benchmark_queries.json`, which is part of the repository since the
+counts do not depend on the machine, or when that file is missing. Update it
+with `--save-queries` when a change runs fewer (or, on purpose, more) queries.
+
+The run also fails when the median latency of an endpoint is slower than the
+latency baseline, `scripts/benchmark_baseline.json`, by more than
+`--tolerance` (and `--min-delta` ms). The tail percentiles are reported, but
+too noisy on a shared machine to fail a run. Latencies depend on the machine,
+so that baseline is not part of the repository: record it on the machine that
+runs the benchmark, with the same sizes, e.g. on the main branch before
+checking out a change:
+
+    python scripts/benchmark.py --save-baseline
+    git checkout my-change
+    python scripts/benchmark.py
+
+`--url` drives a running server (e.g. gunicorn) instead of the Flask test
+client, from `--concurrency` threads. The server needs SERVER_TIMING=True for
+the query counts, and the data of the run, e.g. from
+`flask seed-synthetic --participants 2000 --proposals 5000 --panels 200` on an
+empty database.
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+from mngt import create_app  # noqa: E402
+from mngt.db import get_engine, init_db  # noqa: E402
+from mngt.seeder import SeedSizes, generate  # noqa: E402
+
+BASELINE = os.path.join(ROOT, "scripts", "benchmark_baseline.json")
+QUERIES = os.path.join(ROOT, "scripts", "benchmark_queries.json")
+
+# Endpoints by name. The placeholders are filled per request, so detail pages
+# and searches do not all hit the same cached entry.
+ENDPOINTS = {
+    "conference list": "/conferences",
+    "conference detail": "/conferences/{slug}",
+    "proposal list": "/conferences/{slug}/proposals",
+    "proposal list by title": "/conferences/{slug}/proposals?order_by=title",
+    "proposal detail": "/conferences/{slug}/proposals/{proposal_id}",
+    "panel list": "/conferences/{slug}/panels",
+    "panel detail": "/conferences/{slug}/panels/{panel_id}",
+    "search proposals": "/conferences/{slug}/search_proposal?q={term}",
+    "search authors": "/conferences/{slug}/search_author?q={name}",
+    "api proposal list": "/api/v1/conferences/{slug}/proposals",
+    "api proposal detail": "/api/v1/conferences/{slug}/proposals/{proposal_id}",
+}
+
+_WORDS = (
+    "language culture identity migration border religion ritual music film media memory heritage "
+    "gender politics economy trade education health urban rural community history literature art "
+    "network tourism ecology river forest village city nation state power knowledge"
+).split()
+_LAST_NAMES = "Saetang Wong Srisuk Chaiyaporn Boonmee Rattana Thongdee Suwan Kaewmanee".split()
+_SERVER_TIMING = re.compile(r'desc="(\d+) queries"')
+
+
+class Sizes(NamedTuple):
+    """How big the synthetic conference is."""
+
+    participants: int
+    proposals: int
+    panels: int
+
+
+class Stats(NamedTuple):
+    """The measurements of an endpoint."""
+
+    p50: float
+    p95: float
+    p99: float
+    queries: float
+    throughput: float
+    errors: int
+
+
+def _slug(seed: int) -> str:
+    # The first conference generated by mngt.seeder with that seed.
+    return f"synthetic-{seed}-1"
+
+
+def _fill(template: str, rng: random.Random, sizes: Sizes, slug: str) -> str:
+    return template.format(
+        slug=slug,
+        proposal_id=rng.randint(1, max(sizes.proposals, 1)),
+        panel_id=rng.randint(1, max(sizes.panels, 1)),
+        term=rng.choice(_WORDS)[: rng.randint(3, 6)],
+        name=rng.choice(_LAST_NAMES)[: rng.randint(2, 5)],
+    )
+
+
+def _percentile(ordered: List[float], p: float) -> float:
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] if ordered else 0.0
+
+
+def _stats(samples: List[Tuple[float, Optional[int], bool]], elapsed: float) -> Stats:
+    latencies = sorted(latency * 1000 for latency, _, _ in samples)
+    queries = [count for _, count, _ in samples if count is not None]
+    return Stats(
+        p50=round(_percentile(latencies, 50), 3),
+        p95=round(_percentile(latencies, 95), 3),
+        p99=round(_percentile(latencies, 99), 3),
+        queries=round(sum(queries) / len(queries), 2) if queries else 0.0,
+        throughput=round(len(samples) / elapsed, 1) if elapsed else 0.0,
+        errors=sum(1 for _, _, failed in samples if failed),
+    )
+
+
+def _queries(header: Optional[str]) -> Optional[int]:
+    match = _SERVER_TIMING.search(header or "")
+    return int(match.group(1)) if match else None
+
+
+def _measure(request: Callable[[str], Tuple[int, Optional[str]]], paths: List[str], concurrency: int) -> Stats:
+    samples: List[Tuple[float, Optional[int], bool]] = []
+    lock = threading.Lock()
+    pending = iter(paths)
+
+    def client() -> None:
+        for path in pending:
+            started = time.perf_counter()
+            status, server_timing = request(path)
+            latency = time.perf_counter() - started
+            with lock:
+                samples.append((latency, _queries(server_timing), status != 200))
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return _stats(samples, time.perf_counter() - started)
+
+
+def run(
+    request: Callable[[str], Tuple[int, Optional[str]]], sizes: Sizes, args: argparse.Namespace
+) -> Dict[str, Stats]:
+    """Measure every endpoint."""
+    results = {}
+    for name, template in ENDPOINTS.items():
+        if args.only and not any(word in name for word in args.only):
+            continue
+        rng = random.Random(name)
+        # Warm up the caches and the connection pool.
+        for _ in range(3):
+            request(_fill(template, rng, sizes, _slug(args.seed)))
+        paths = [_fill(template, rng, sizes, _slug(args.seed)) for _ in range(args.iterations)]
+        results[name] = _measure(request, paths, args.concurrency)
+    return results
+
+
+def test_client_request(args: argparse.Namespace, sizes: Sizes) -> Callable[[str], Tuple[int, Optional[str]]]:
+    """Return a function requesting a path from a seeded app through the Flask test client."""
+    db_fd, db_path = tempfile.mkstemp(suffix=".db")
+    os.close(db_fd)
+    app = create_app(
+        {
+            "TESTING": True,
+            "SECRET_KEY": "benchmark",
+            "LOGIN_DISABLED": True,
+            "ENTRY_PER_PAGE": 10,
+            "SQLALCHEMY_DATABASE_URI": f"sqlite+pysqlite:///{db_path}",
+            "SERVER_TIMING": True,
+            "QUERY_LOG_SAMPLE_RATE": 0.0,
+            "SLOW_QUERY_THRESHOLD_MS": 60000,
+            "CACHE_BACKEND": "local",
+            "FRAGMENT_CACHE_TTL": 0 if args.cold else 300,
+        }
+    )
+    started = time.perf_counter()
+    with app.app_context():
+        init_db()
+        generate(get_engine(), SeedSizes(1, sizes.participants, sizes.proposals, sizes.panels), args.seed)
+    print(f"Seeded {sizes} in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+    local = threading.local()
+
+    def request(path: str) -> Tuple[int, Optional[str]]:
+        # A test client keeps cookies, one per thread.
+        if not hasattr(local, "client"):
+            local.client = app.test_client()
+        response = local.client.get(path)
+        return response.status_code, response.headers.get("Server-Timing")
+
+    return request
+
+
+def url_request(base_url: str) -> Callable[[str], Tuple[int, Optional[str]]]:
+    """Return a function requesting a path from a running server."""
+
+    def request(path: str) -> Tuple[int, Optional[str]]:
+        try:
+            with urllib.request.urlopen(base_url + path, timeout=30) as response:  # noqa: S310
+                response.read()
+                return response.status, response.headers.get("Server-Timing")
+        except OSError:
+            return 0, None
+
+    return request
+
+
+def load(path: str, sizes: Sizes, cold: bool) -> Optional[dict]:
+    """Return a baseline file, None when it is missing and {} when it was recorded with other settings."""
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        baseline = json.load(f)
+    if baseline.get("sizes") != sizes._asdict() or baseline.get("cold", False) != cold:
+        print(f"{path} was recorded with other settings, not comparing.", file=sys.stderr)
+        return {}
+    return baseline
+
+
+def save(path: str, sizes: Sizes, cold: bool, endpoints: dict) -> None:
+    """Write a baseline file."""
+    with open(path, "w") as f:
+        json.dump({"sizes": sizes._asdict(), "cold": cold, "endpoints": endpoints}, f, indent=2)
+        f.write("\n")
+    print(f"Saved the baseline to {path}", file=sys.stderr)
+
+
+def compare(
+    results: Dict[str, Stats], baseline: dict, queries: dict, tolerance: float, min_delta: float
+) -> List[str]:
+    """Return the regressions of the results against the latency and query baselines."""
+    regressions = []
+    for name, stats in results.items():
+        before_queries = queries.get("endpoints", {}).get(name)
+        if before_queries is not None and stats.queries > before_queries:
+            regressions.append(f"{name}: {stats.queries:g} queries per request, was {before_queries:g}")
+        before = baseline.get("endpoints", {}).get(name)
+        if before is not None:
+            limit = max(before["p50"] * (1 + tolerance), before["p50"] + min_delta)
+            if stats.p50 > limit:
+                regressions.append(f"{name}: p50 {stats.p50:.2f} ms, was {before['p50']:.2f} ms")
+        if stats.errors:
+            regressions.append(f"{name}: {stats.errors} requests failed")
+    return regressions
+
+
+def report(results: Dict[str, Stats], baseline: dict) -> None:
+    """Print the results next to the baseline p50."""
+    print(f"{'endpoint':<24} {'p50':>8} {'p95':>8} {'p99':>8} {'queries':>8} {'req/s':>8} {'base p50':>9}")
+    for name, stats in results.items():
+        before = baseline.get("endpoints", {}).get(name, {}).get("p50")
+        print(
+            f"{name:<24} {stats.p50:>8.2f} {stats.p95:>8.2f} {stats.p99:>8.2f} {stats.queries:>8g} "
+            f"{stats.throughput:>8.1f} {before if before is not None else '-':>9}"
+        )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Run the benchmark, return 1 on regressions or without a query baseline."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--participants", type=int, default=2000)
+    parser.add_argument("--proposals", type=int, default=5000)
+    parser.add_argument("--panels", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic data.")
+    parser.add_argument("--iterations", type=int, default=200, help="Requests per endpoint.")
+    parser.add_argument("--concurrency", type=int, default=1, help="Requests in flight at once.")
+    parser.add_argument("--only", action="append", help="Only the endpoints whose name contains this.")
+    parser.add_argument("--cold", action="store_true", help="Disable the fragment cache.")
+    parser.add_argument("--url", help="Benchmark a running server instead of the test client.")
+    parser.add_argument("--baseline", default=BASELINE, help="The latency baseline file.")
+    parser.add_argument("--save-baseline", action="store_true", help="Record the results as the latency baseline.")
+    parser.add_argument("--queries", default=QUERIES, help="The query baseline file.")
+    parser.add_argument("--save-queries", action="store_true", help="Record the queries per request as the baseline.")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="Allowed p50 slowdown, as a fraction.")
+    parser.add_argument("--min-delta", type=float, default=2.0, help="p50 slowdowns under this (ms) are noise.")
+    args = parser.parse_args(argv)
+
+    sizes = Sizes(args.participants, args.proposals, args.panels)
+    request = url_request(args.url.rstrip("/")) if args.url else test_client_request(args, sizes)
+    results = run(request, sizes, args)
+
+    baseline = load(args.baseline, sizes, args.cold)
+    if baseline is None and not args.save_baseline:
+        print(f"No latency baseline at {args.baseline}, record one with --save-baseline.", file=sys.stderr)
+    report(results, baseline or {})
+
+    if args.save_baseline or args.save_queries:
+        if args.save_baseline:
+            save(args.baseline, sizes, args.cold, {name: stats._asdict() for name, stats in results.items()})
+        if args.save_queries:
+            # A run of some endpoints (--only) keeps the counts of the others.
+            counts = dict((load(args.queries, sizes, args.cold) or {}).get("endpoints", {}))
+            counts.update((name, stats.queries) for name, stats in results.items())
+            save(args.queries, sizes, args.cold, counts)
+        return 0
+
+    queries = load(args.queries, sizes, args.cold)
+    if queries is None:
+        print(f"No query baseline at {args.queries}, record one with --save-queries.", file=sys.stderr)
+        return 1
+
+    regressions = compare(results, baseline or {}, queries, args.tolerance, args.min_delta)
+    for regression in regressions:
+        print(f"REGRESSION {regression}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
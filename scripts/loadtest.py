@@ -0,0 +1,168 @@
+"""Load test of the web server, to compare the gunicorn worker classes.
+
+Against a running server:
+
+    python scripts/loadtest.py --url http://localhost:5000 --path /conferences --concurrency 16
+
+Or start gunicorn with each worker class in turn (with gunicorn.conf.py and
+the environment of this shell) and compare them. `--latency` adds that many
+milliseconds of waiting to every request, standing for the time spent on the
+network (OAuth provider, remote database) that a concurrent worker overlaps:
+
+    python scripts/loadtest.py --compare sync gthread --latency 50 --concurrency 16
+
+With 2 sync workers the throughput stays near 2 / latency whatever the
+concurrency. gthread and gevent workers keep scaling up to workers x threads
+(or worker connections).
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from typing import Callable, List, NamedTuple, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class Result(NamedTuple):
+    """The outcome of a load test run."""
+
+    requests: int
+    errors: int
+    elapsed: float
+    latencies: List[float]
+
+    @property
+    def throughput(self) -> float:
+        """Requests per second."""
+        return self.requests / self.elapsed if self.elapsed else 0.0
+
+    def percentile(self, p: float) -> float:
+        """Return the latency percentile `p` (0-100) in milliseconds."""
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] * 1000
+
+
+def make_app() -> Callable:
+    """Return the app, delayed by LOADTEST_LATENCY_MS, for `gunicorn 'loadtest:make_app()'`."""
+    from mngt.wsgi import app
+
+    latency = float(os.getenv("LOADTEST_LATENCY_MS", "0")) / 1000
+
+    def delayed(environ: dict, start_response: Callable) -> object:
+        time.sleep(latency)
+        return app(environ, start_response)
+
+    return delayed
+
+
+def run(url: str, paths: List[str], concurrency: int, total: int) -> Result:
+    """Send `total` GET requests from `concurrency` threads, cycling over `paths`."""
+    latencies: List[float] = []
+    errors = 0
+    lock = threading.Lock()
+    counter = iter(range(total))
+
+    def client() -> None:
+        nonlocal errors
+        for i in counter:
+            started = time.perf_counter()
+            try:
+                with urllib.request.urlopen(url + paths[i % len(paths)], timeout=30) as response:  # noqa: S310
+                    response.read()
+                failed = False
+            except (urllib.error.URLError, OSError):
+                failed = True
+            with lock:
+                latencies.append(time.perf_counter() - started)
+                errors += failed
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return Result(total, errors, time.perf_counter() - started, latencies)
+
+
+def _wait_until_up(url: str, process: subprocess.Popen, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"gunicorn exited with {process.returncode}")
+        try:
+            urllib.request.urlopen(url + "/", timeout=1).read()  # noqa: S310
+            return
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.2)
+    raise SystemExit("gunicorn did not start")
+
+
+def serve_and_run(worker_class: str, args: argparse.Namespace) -> Result:
+    """Start gunicorn with a worker class, load test it, and stop it."""
+    env = dict(
+        os.environ,
+        GUNICORN_WORKER_CLASS=worker_class,
+        GUNICORN_BIND=f"127.0.0.1:{args.port}",
+        LOADTEST_LATENCY_MS=str(args.latency),
+        PYTHONPATH=os.pathsep.join([ROOT, os.path.join(ROOT, "scripts")]),
+    )
+    process = subprocess.Popen(  # noqa: S603
+        [sys.executable, "-m", "gunicorn", "loadtest:make_app()"],
+        cwd=ROOT,
+        env=env,
+        stdout=None if args.verbose else subprocess.DEVNULL,
+        stderr=None if args.verbose else subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{args.port}"
+    try:
+        _wait_until_up(url, process)
+        run(url, args.path, args.concurrency, args.concurrency)  # Warm up every worker.
+        return run(url, args.path, args.concurrency, args.requests)
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def report(label: str, result: Result) -> None:
+    """Print one line of results."""
+    print(
+        f"{label:<10} {result.requests:>6} requests {result.errors:>4} errors {result.throughput:>8.1f} req/s "
+        f"p50 {result.percentile(50):>7.1f} ms  p95 {result.percentile(95):>7.1f} ms  "
+        f"mean {statistics.mean(result.latencies) * 1000 if result.latencies else 0:>7.1f} ms"
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Run the load test."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:5000", help="The server to test.")
+    parser.add_argument("--path", action="append", help="Paths to request, in turn (default /).")
+    parser.add_argument("--concurrency", type=int, default=16, help="Requests in flight at once.")
+    parser.add_argument("--requests", type=int, default=400, help="Requests to send.")
+    parser.add_argument("--compare", nargs="+", metavar="WORKER_CLASS", help="Start gunicorn with each class.")
+    parser.add_argument("--latency", type=float, default=0, help="Milliseconds added to each request (--compare).")
+    parser.add_argument("--port", type=int, default=5055, help="Port of the servers started by --compare.")
+    parser.add_argument("--verbose", action="store_true", help="Show the gunicorn logs.")
+    args = parser.parse_args(argv)
+    args.path = args.path or ["/"]
+
+    if args.compare:
+        workers = os.getenv("GUNICORN_WORKERS", "2")
+        print(f"{workers} workers, {args.concurrency} concurrent clients, {args.latency:g} ms latency")
+        for worker_class in args.compare:
+            report(worker_class, serve_and_run(worker_class, args))
+    else:
+        report("server", run(args.url.rstrip("/"), args.path, args.concurrency, args.requests))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""Fill the database of DATABASE_URI with synthetic conferences.
+
+The same as `flask seed-synthetic`, without a Flask environment:
+
+    python scripts/seeder.py --participants 100000 --proposals 500000 --panels 10000 --seed 1
+
+The tables are created when they do not exist yet, and an existing database
+is brought up to date first (see `mngt.db.init_db`).
+"""
+import argparse
+import os
+import sys
+import time
+from typing import List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mngt import create_app  # noqa: E402
+from mngt.db import get_engine, init_db  # noqa: E402
+from mngt.seeder import SeedSizes, generate  # noqa: E402
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Generate the conferences."""
+    defaults = SeedSizes()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--conferences", type=int, default=defaults.conferences, help="Conferences to create.")
+    parser.add_argument("--participants", type=int, default=defaults.participants, help="Participants in total.")
+    parser.add_argument("--proposals", type=int, default=defaults.proposals, help="Proposals in total.")
+    parser.add_argument("--panels", type=int, default=defaults.panels, help="Panels in total.")
+    parser.add_argument("--seed", type=int, default=0, help="The same seed generates the same data.")
+    parser.add_argument("--batch-size", type=int, default=10000, help="Rows per insert.")
+    args = parser.parse_args(argv)
+
+    app = create_app()
+    started = time.perf_counter()
+    with app.app_context():
+        init_db()
+        ids = generate(
+            get_engine(),
+            SeedSizes(args.conferences, args.participants, args.proposals, args.panels),
+            args.seed,
+            args.batch_size,
+            lambda table, count: print(f"\r{table}: {count} rows", end="", file=sys.stderr),
+        )
+    print(f"\rCreated conferences {ids} in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()